@@ -0,0 +1,625 @@
+import sys
+import time
+from constants import *
+from tiles import BLOCK_TYPES
+from mesher import build_chunk_mesh, FACES
+from world import World
+from headless import HeadlessGame
+from lighting import MAX_LIGHT, SKY_SHIFT
+from collision import move_box, COLLIDABLE_IDS
+from raycast import raycast, raycast_many, FACE_OFFSETS
+from utils import AABB
+from player import Player, PlayerInput
+import random
+import math
+import asyncio
+from loadtest import run_load_test
+from generation import generate_blocks, generate_chunk, generate_heightmap, get_heightmap, block_index, CHUNK_VOLUME
+import numpy as np
+
+# Run from the voxels folder: python benchmarks.py [name ...]
+
+def create_world():
+  world = HeadlessGame(render_distance=2).start_world()
+  world.wait_for_generation()
+  return world
+
+def time_call(func, repeat: int):
+  best = None
+  for _ in range(repeat):
+    start_time = time.perf_counter()
+    func()
+    elapsed = time.perf_counter() - start_time
+    best = elapsed if best == None or elapsed < best else best
+  return best
+
+class ListVertexDrawer:
+  def __init__(self):
+    self.vertices = []
+    self.__color = (1.0, 1.0, 1.0, 1.0)
+
+  def color(self, r, g, b, a):
+    self.__color = (r, g, b, a)
+
+  def vertex_uv(self, x, y, z, u, v):
+    self.vertices.append((x, y, z, u, v) + self.__color)
+
+# True where the sky can't be seen straight up, the shading the legacy mesher used before light levels
+def is_lighted(world, x, y, z) -> bool:
+  chunk = world.get_chunk(x // 16, z // 16)
+  if chunk == None or y < 0 or y >= CHUNK_HEIGHT:
+    return True
+  return chunk.light.get(x % 16, y, z % 16) >> SKY_SHIFT < MAX_LIGHT
+
+# The per-voxel loop Chunk.rebuild_geometry used before the NumPy mesher, emitting into a list
+# instead of immediate mode GL so it runs without a window (its GL call overhead is not counted)
+def legacy_chunk_mesh(world, chunk, translucent):
+  vertex_drawer = ListVertexDrawer()
+
+  for y in range(CHUNK_HEIGHT):
+    for x in range(16):
+      for z in range(16):
+        bx = x + chunk.x * 16
+        by = y
+        bz = z + chunk.z * 16
+
+        tile = world.get_tile(bx, by, bz)
+        if tile < 1 or (tile == 7) != translucent:
+          continue
+
+        tile_type = BLOCK_TYPES[tile]
+        y1 = 0.9 if tile == 7 and world.get_tile(bx, by + 1, bz) != 7 else 1.0
+
+        for face_idx, ((dx, dy, dz), face_shade, txr_attr, corners) in enumerate(FACES):
+          temp_tile = world.get_tile(bx + dx, by + dy, bz + dz)
+          if tile == 8 or temp_tile == 0 or temp_tile == 8 or (temp_tile == 7 and tile != 7) or (face_idx == 1 and tile == 7 and temp_tile != 7):
+            light_multiplier = 1.0
+            if is_lighted(world, bx + dx, by + dy, bz + dz):
+              light_multiplier = 0.4
+
+            txr = getattr(tile_type, txr_attr)
+            u = (txr % 16) * 16
+            v = txr // 16 * 16
+
+            vertex_drawer.color(face_shade * light_multiplier, face_shade * light_multiplier, face_shade * light_multiplier, 1.0)
+            for cx, cy, cz, cu, cv in corners:
+              vertex_drawer.vertex_uv(bx + cx, by + cy * y1, bz + cz, (u + cu * 16) / 256.0, (v + cv * 16) / 256.0)
+
+  return vertex_drawer.vertices
+
+def bench_mesher(repeat: int = 3):
+  world = create_world()
+  chunks = list(world.chunks.values())[:8]
+
+  legacy_quads = 0
+  numpy_quads = 0
+
+  def run_legacy():
+    nonlocal legacy_quads
+    legacy_quads = 0
+    for chunk in chunks:
+      for translucent in (False, True):
+        legacy_quads += len(legacy_chunk_mesh(world, chunk, translucent)) // 4
+
+  def run_numpy():
+    nonlocal numpy_quads
+    numpy_quads = 0
+    for chunk in chunks:
+      blocks, light = world.get_neighbourhood(chunk.x, chunk.z)
+      for translucent in (False, True):
+        numpy_quads += build_chunk_mesh(blocks, light, chunk.x * 16, chunk.z * 16, translucent).quad_count
+
+  legacy_time = time_call(run_legacy, repeat) / len(chunks)
+  numpy_time = time_call(run_numpy, repeat) / len(chunks)
+
+  print(f"mesher: legacy {legacy_time * 1000:.2f} ms/chunk ({legacy_quads} quads)")
+  print(f"mesher: numpy  {numpy_time * 1000:.2f} ms/chunk ({numpy_quads} quads)")
+  print(f"mesher: {legacy_time / numpy_time:.1f}x faster")
+
+def bench_greedy(repeat: int = 3):
+  world = create_world()
+  neighbourhoods = [(chunk, world.get_neighbourhood(chunk.x, chunk.z)) for chunk in world.chunks.values()]
+
+  for greedy in (False, True):
+    quads = 0
+
+    def run():
+      nonlocal quads
+      quads = 0
+      for chunk, (blocks, light) in neighbourhoods:
+        quads += build_chunk_mesh(blocks, light, chunk.x * 16, chunk.z * 16, False, greedy).quad_count
+
+    elapsed = time_call(run, repeat) / len(neighbourhoods)
+    print(f"greedy={greedy}: {quads} solid quads on {len(neighbourhoods)} chunks, {elapsed * 1000:.2f} ms/chunk")
+
+# Small ints are shared objects, so the old list storage cost one pointer per tile plus the list
+# itself, along with a 256 entry list for the light heightmap that stood in for light levels
+def bench_memory():
+  world = create_world()
+  chunks = list(world.chunks.values())
+
+  list_size = 0
+  sections_size = 0
+  for chunk in chunks:
+    list_size += sys.getsizeof(chunk.get_blocks_array().reshape(-1).tolist()) + sys.getsizeof([0] * 256)
+    sections_size += chunk.get_memory_size()
+
+  print(f"memory: list storage {list_size // len(chunks)} bytes/chunk")
+  print(f"memory: sections     {sections_size // len(chunks)} bytes/chunk")
+  print(f"memory: {list_size / sections_size:.1f}x smaller")
+
+# The per-tile lookup World.get_tile did before it read chunk sections directly
+def legacy_get_tile(world, x: int, y: int, z: int):
+  chunk = world.get_chunk(x // 16, z // 16)
+  if chunk == None or y < 0 or y >= CHUNK_HEIGHT:
+    return 0
+  return chunk.get_tile(x % 16, y, z % 16)
+
+# Reads every tile of a chunk plus a one block border, like the mesher and collision loops do
+def bench_lookups(repeat: int = 3):
+  world = create_world()
+  coords = [(x, y, z) for x in range(-1, 17) for y in range(-1, CHUNK_HEIGHT + 1) for z in range(-1, 17)]
+
+  def run_legacy():
+    for x, y, z in coords:
+      legacy_get_tile(world, x, y, z)
+
+  def run_get_tile():
+    for x, y, z in coords:
+      world.get_tile(x, y, z)
+
+  def run_cursor():
+    tiles = world.cursor()
+    for x, y, z in coords:
+      tiles.get_tile(x, y, z)
+
+  def run_neighbourhood():
+    world.get_neighbourhood(0, 0)
+
+  for name, func in (("legacy get_tile", run_legacy), ("get_tile", run_get_tile), ("cursor", run_cursor), ("neighbourhood", run_neighbourhood)):
+    elapsed = time_call(func, repeat)
+    print(f"lookups: {name:<16} {len(coords) / elapsed / 1e6:8.2f} M lookups/s")
+
+LEGACY_HEIGHTMAPS: dict[tuple[int, int], list[int]] = {}
+
+# World.set_tile back when lighting was a heightmap: the column is scanned from the top on every
+# edit and border edits always rebuild the neighbouring chunk
+def legacy_set_tile(world, x: int, y: int, z: int, tile_id: int):
+  chunk = world.get_chunk(x // 16, z // 16)
+  if chunk == None or y < 0 or y >= CHUNK_HEIGHT:
+    return
+  lx = x % 16
+  lz = z % 16
+  chunk.set_tile(lx, y, lz, tile_id)
+  heightmap = LEGACY_HEIGHTMAPS.setdefault((chunk.x, chunk.z), [0] * 256)
+  for scan_y in range(CHUNK_HEIGHT - 1, -1, -1):
+    tile = chunk.get_tile(lx, scan_y, lz)
+    if tile != 0 and not BLOCK_TYPES[tile].allows_light_through:
+      heightmap[(lz * 16) + lx] = scan_y
+      break
+  for ox, oz, on_border in ((-1, 0, lx == 0), (1, 0, lx == 15), (0, -1, lz == 0), (0, 1, lz == 15)):
+    neighbour = world.get_chunk(x // 16 + ox, z // 16 + oz)
+    if on_border and neighbour != None:
+      neighbour.make_dirty()
+
+# Builds a 32x32 platform of planks in the air and then removes it, over four chunks. The light
+# engine's queued updates are run to the end after all the edits, and then again after every edit,
+# as when a player places blocks one at a time.
+def bench_set_tile(repeat: int = 3):
+  world = create_world()
+  edits = [(x, y, z, 5) for y in range(40, 44) for x in range(-16, 16) for z in range(-16, 16)]
+  edits += [(x, y, z, 0) for x, y, z, _ in edits]
+
+  def settle():
+    while world.light_engine.pending_count > 0:
+      world.light_engine.process(World.MAX_LIGHT_UPDATES_PER_TICK)
+
+  def count_rebuilds(set_tile):
+    for chunk in world.chunks.values():
+      chunk.clear_dirty()
+    rebuilds = 0
+    for x, y, z, tile_id in edits:
+      set_tile(x, y, z, tile_id)
+      settle()
+      for chunk in world.chunks.values():
+        if chunk.dirty:
+          rebuilds += 1
+          chunk.clear_dirty()
+    return rebuilds
+
+  def run(set_tile, settle_every_edit):
+    for x, y, z, tile_id in edits:
+      set_tile(x, y, z, tile_id)
+      if settle_every_edit:
+        settle()
+    settle()
+
+  for name, set_tile in (("legacy", lambda x, y, z, tile_id: legacy_set_tile(world, x, y, z, tile_id)), ("light engine", world.set_tile)):
+    elapsed = time_call(lambda: run(set_tile, False), repeat)
+    settled_elapsed = time_call(lambda: run(set_tile, True), 1)
+    print(f"set_tile: {name:<12} {len(edits) / elapsed:10.0f} edits/s, {len(edits) / settled_elapsed:10.0f} edits/s with light settled after each, {count_rebuilds(set_tile)} chunk rebuild requests")
+
+# Block light of every tile within reach of an emitter at (x, y, z), on the same chunks it was placed in
+def get_block_light_around(world, x: int, y: int, z: int) -> np.ndarray:
+  reach = np.arange(-MAX_LIGHT, MAX_LIGHT + 1)
+  xs, ys, zs = np.meshgrid(x + reach, y + reach, z + reach, indexing="ij")
+  return np.array([world.get_chunk(tx >> 4, tz >> 4).light.get(tx & 15, ty, tz & 15) & MAX_LIGHT for tx, ty, tz in zip(xs.ravel().tolist(), ys.ravel().tolist(), zs.ravel().tolist())]).reshape(xs.shape)
+
+# Lamps placed in the open air above the spawn chunks, across chunk borders. Their light has to fall
+# off by one per block walked away from them and be gone again once they are broken.
+def bench_light(repeat: int = 3):
+  world = create_world()
+  lamp = next(tile_id for tile_id, tile_type in BLOCK_TYPES.items() if tile_type.light_emission == MAX_LIGHT)
+  reach = np.abs(np.arange(-MAX_LIGHT, MAX_LIGHT + 1))
+  expected = np.maximum(MAX_LIGHT - (reach[:, None, None] + reach[None, :, None] + reach[None, None, :]), 0)
+
+  def settle():
+    while world.light_engine.pending_count > 0:
+      world.light_engine.process(World.MAX_LIGHT_UPDATES_PER_TICK)
+
+  x, y, z = 15, 100, 0
+  world.set_tile(x, y, z, lamp)
+  settle()
+  placed_wrong = int((get_block_light_around(world, x, y, z) != expected).sum())
+  world.set_tile(x, y, z, 0)
+  settle()
+  removed_wrong = int((get_block_light_around(world, x, y, z) != 0).sum())
+  print(f"light: falloff around a lamp {placed_wrong} tiles wrong, after breaking it {removed_wrong} tiles still lit")
+
+  lamps = [(x, 100, z) for x in range(-8, 24, 8) for z in range(-8, 24, 8)]
+
+  def run():
+    for x, y, z in lamps:
+      world.set_tile(x, y, z, lamp)
+    settle()
+    for x, y, z in lamps:
+      world.set_tile(x, y, z, 0)
+    settle()
+
+  elapsed = time_call(run, repeat)
+  print(f"light: {len(lamps)} lamps placed and broken in {elapsed * 1000:.1f} ms ({len(lamps) * 2 / elapsed:.0f} edits/s)")
+
+  # Lamps toggled in the air over four chunks, a batch every tick with one process() a tick as
+  # World.tick runs it. The light has to keep up, nothing may be left queued for the next tick.
+  rng = random.Random(1)
+  spots = [(x, y, z) for x in range(-16, 16, 2) for y in (80, 90, 100) for z in range(-16, 16, 2)]
+  placed = set()
+  ticks = 120
+  for per_tick in (8, 32, 128):
+    most_queued = 0
+    start_time = time.perf_counter()
+    for _ in range(ticks):
+      for spot in rng.sample(spots, per_tick):
+        if spot in placed:
+          world.set_tile(*spot, 0)
+          placed.discard(spot)
+        else:
+          world.set_tile(*spot, lamp)
+          placed.add(spot)
+      world.light_engine.process(World.MAX_LIGHT_UPDATES_PER_TICK)
+      most_queued = max(most_queued, world.light_engine.pending_count)
+    elapsed = time.perf_counter() - start_time
+    print(f"light: {per_tick:3d} lamp edits a tick {ticks * per_tick / elapsed:8.0f} edits/s, {elapsed / ticks * 1000:5.1f} ms/tick, at most {most_queued} updates left queued after a tick")
+
+  for spot in placed:
+    world.set_tile(*spot, 0)
+  world.light_engine.process(World.MAX_LIGHT_UPDATES_PER_TICK)
+  still_lit = sum(int(np.count_nonzero(chunk.light.to_array() & MAX_LIGHT)) for chunk in world.chunks.values())
+  print(f"light: {world.light_engine.pending_count} updates queued and {still_lit} tiles still lit once every lamp is broken")
+
+# Chunk.__tick_some_block before the scheduler, on the plain list of tiles chunks had back then: the
+# tiles were scanned in x, y, z order for the first tickable one every time
+def legacy_chunk_tick(blocks: list[int]):
+  for x in range(0, 16):
+    for y in range(0, CHUNK_HEIGHT):
+      for z in range(0, 16):
+        tile_id = blocks[(y * 16 + z) * 16 + x]
+        if tile_id == 0:
+          continue
+        if BLOCK_TYPES[tile_id].is_tickable:
+          return (x, y, z)
+  return None
+
+# Cost of a world tick's block ticks, first with nothing waiting on one, where the old World.tick
+# still scanned up to two chunks, then with a layer of sand falling onto the spawn chunks
+def bench_ticks(repeat: int = 3):
+  world = create_world()
+  chunk_blocks = [list(chunk.sections.to_bytes()) for chunk in world.chunks.values()]
+  ticks = 200
+
+  def run_legacy():
+    rng = random.Random(1)
+    for _ in range(ticks):
+      chunk_index = rng.randint(-15, len(chunk_blocks) - 1)
+      if chunk_index >= 0:
+        for _ in range(rng.randint(0, 2)):
+          legacy_chunk_tick(chunk_blocks[chunk_index])
+
+  def run_scheduler():
+    for _ in range(ticks):
+      world.tick_scheduler.process(World.MAX_SCHEDULED_TICKS_PER_TICK)
+
+  for name, func in (("legacy scan", run_legacy), ("scheduler", run_scheduler)):
+    elapsed = time_call(func, repeat)
+    print(f"ticks: {name:<12} {elapsed / ticks * 1e6:10.1f} us/tick")
+
+  sand = [(x, 100, z) for x in range(-8, 8) for z in range(-8, 8)]
+  for x, y, z in sand:
+    world.set_tile(x, y, z, 6)
+  tick_count = 0
+  start_time = time.perf_counter()
+  while world.tick_scheduler.pending_count > 0:
+    world.tick_scheduler.process(World.MAX_SCHEDULED_TICKS_PER_TICK)
+    tick_count += 1
+  elapsed = time.perf_counter() - start_time
+  landed = 0
+  for x, _, z in sand:
+    y = next(y for y in range(CHUNK_HEIGHT - 1, -1, -1) if world.get_tile(x, y, z) != 0)
+    landed += world.get_tile(x, y, z) == 6 and BLOCK_TYPES[world.get_tile(x, y - 1, z)].is_collidable
+  print(f"ticks: falling sand {elapsed / tick_count * 1e6:10.1f} us/tick over {tick_count} ticks, {landed} of {len(sand)} landed")
+
+# Drops a 4x4 pool of sources above the spawn chunks and lets the water run until it settles, then
+# removes the sources and lets it drain away again
+def bench_fluids():
+  world = create_world()
+  fluids = world.fluids
+
+  def settle():
+    steps = 0
+    updates = fluids.update_count
+    changes = fluids.change_count
+    start_time = time.perf_counter()
+    while fluids.pending_count > 0:
+      fluids.step()
+      steps += 1
+    elapsed = time.perf_counter() - start_time
+    return steps, fluids.update_count - updates, fluids.change_count - changes, elapsed
+
+  sources = [(x, 45, z) for x in range(-2, 2) for z in range(-2, 2)]
+  for name, tile_id in (("flood", 7), ("drain", 0)):
+    for x, y, z in sources:
+      world.set_tile(x, y, z, tile_id)
+    steps, updates, changes, elapsed = settle()
+    print(f"fluids: {name:<6} {steps:4d} steps, {changes:6d} tiles changed, {updates / elapsed:10.0f} updates/s")
+
+# World.get_cubes and the AABB clipping Player.move used before the collision module
+def legacy_move_box(world, box: tuple, xa: float, ya: float, za: float):
+  aabb = AABB(*box)
+  expanded = aabb.expand(xa, ya, za)
+  cubes = []
+  tiles = world.cursor()
+  for x in range(math.floor(expanded.x0), math.floor(expanded.x1 + 1)):
+    for y in range(max(int(expanded.y0), 0), min(int(expanded.y1 + 1), CHUNK_HEIGHT)):
+      for z in range(math.floor(expanded.z0), math.floor(expanded.z1 + 1)):
+        tile_id = tiles.get_tile(x, y, z)
+        if tile_id != 0 and tile_id != 7:
+          cubes.append(AABB(x, y, z, x + 1, y + 1, z + 1))
+  for cube in cubes:
+    ya = cube.clipYCollide(aabb, ya)
+  aabb.move(0.0, ya, 0.0)
+  for cube in cubes:
+    xa = cube.clipXCollide(aabb, xa)
+  aabb.move(xa, 0.0, 0.0)
+  for cube in cubes:
+    za = cube.clipZCollide(aabb, za)
+  aabb.move(0.0, 0.0, za)
+  return (aabb.x0, aabb.y0, aabb.z0, aabb.x1, aabb.y1, aabb.z1), xa, ya, za
+
+# Player sized boxes falling and walking around the spawn chunks, both ways of moving should agree
+def bench_collision(repeat: int = 3):
+  world = create_world()
+  rng = random.Random(1)
+  moves = []
+  for _ in range(5000):
+    x = rng.uniform(-16, 16)
+    y = rng.uniform(25, 40)
+    z = rng.uniform(-16, 16)
+    moves.append(((x - 0.3, y, z - 0.3, x + 0.3, y + 1.8, z + 0.3), rng.uniform(-0.5, 0.5), rng.uniform(-1, 0.2), rng.uniform(-0.5, 0.5)))
+
+  mismatches = 0
+  for box, xa, ya, za in moves:
+    new = move_box(world.cursor(), box, xa, ya, za)
+    old = legacy_move_box(world, box, xa, ya, za)
+    if any(abs(a - b) > 1e-9 for a, b in zip(new[0] + new[1:], old[0] + old[1:])):
+      mismatches += 1
+
+  for name, move in (("legacy", lambda box, xa, ya, za: legacy_move_box(world, box, xa, ya, za)), ("collision", lambda box, xa, ya, za: move_box(world.cursor(), box, xa, ya, za))):
+    elapsed = time_call(lambda: [move(*args) for args in moves], repeat)
+    print(f"collision: {name:<10} {len(moves) / elapsed:10.0f} moves/s")
+  print(f"collision: {mismatches} of {len(moves)} moves differ")
+
+# An entity and the player in the air with the same yaw and input should move the same way
+def check_entity_walk(world) -> float:
+  player = Player(world)
+  worst = 0.0
+  for rot_y, forward, strafe in ((0.0, 1.0, 0.0), (30.0, 1.0, 0.5), (135.0, -1.0, 1.0), (270.0, 0.0, -1.0)):
+    player.set_pos(8.0, 100.0, 8.0)
+    player.xd = player.yd = player.zd = 0.0
+    player.rot_y = rot_y
+    player.tick(PlayerInput(forward, strafe))
+    index = world.entities.spawn(8.0, 100.0, 8.0)
+    world.entities.rot_y[index] = rot_y
+    world.entities.walk[index] = (forward, strafe)
+    world.entities.tick()
+    velocity = world.entities.velocities[index]
+    worst = max(worst, abs(velocity[0] - player.xd), abs(velocity[2] - player.zd))
+    world.entities.remove(index)
+  return worst
+
+# Entities dropped over the spawn chunks walking around in random directions, most of them land and
+# keep bumping into the terrain
+def bench_entities(counts = (500, 2000, 5000), ticks: int = 120):
+  world = create_world()
+  print(f"entities: walking differs from the player's by {check_entity_walk(world):.2g} at most")
+  rng = np.random.default_rng(1)
+  for count in counts:
+    entities = world.entities
+    for index in range(entities.count):
+      entities.remove(index)
+    for _ in range(count):
+      index = entities.spawn(rng.uniform(-16, 32), rng.uniform(33, 45), rng.uniform(-16, 32))
+      entities.walk[index] = (1.0, rng.uniform(-1, 1))
+      entities.rot_y[index] = rng.uniform(0, 360)
+      entities.jump[index] = rng.random() < 0.2
+
+    start_time = time.perf_counter()
+    for _ in range(ticks):
+      entities.tick()
+    elapsed = (time.perf_counter() - start_time) / ticks
+    on_ground = int(entities.on_ground[:entities.count].sum())
+    print(f"entities: {count:5d} entities {elapsed * 1000:7.2f} ms/tick ({1 / elapsed:6.0f} ticks/s), {on_ground} on the ground")
+
+# Rays from above the spawn chunks in random directions, one at a time and all together, checked
+# against sampling each ray in tiny steps
+def bench_raycast(repeat: int = 3):
+  world = create_world()
+  rng = np.random.default_rng(1)
+  count = 5000
+  origins = np.stack([rng.uniform(-16, 32, count), rng.uniform(30, 40, count), rng.uniform(-16, 32, count)], axis=1)
+  directions = rng.normal(size=(count, 3))
+  reach = 7.0
+
+  hits = [raycast(world.cursor(), origin, direction, reach) for origin, direction in zip(origins.tolist(), directions.tolist())]
+  distances, cells, faces = raycast_many(world, origins, directions, reach)
+  mismatches = 0
+  tiles = world.cursor()
+  for i, hit in enumerate(hits):
+    batched = None if distances[i] == np.inf else (cells[i].tolist(), int(faces[i]), distances[i])
+    single = None if hit == None else ([hit.bx, hit.by, hit.bz], hit.face, hit.distance)
+    if (single == None) != (batched == None) or (single != None and (single[:2] != batched[:2] or abs(single[2] - batched[2]) > 1e-9)):
+      mismatches += 1
+    elif i < 500:
+      # The tile sampled just before the hit has to be on the other side of the hit face
+      unit = directions[i] / np.linalg.norm(directions[i])
+      cell_at = lambda t: np.floor(origins[i] + unit * t).astype(int).tolist()
+      sampled = next((t for t in np.arange(0.0, reach, 0.001) if COLLIDABLE_IDS[tiles.get_tile(*cell_at(t))]), None)
+      if (sampled == None) != (single == None):
+        mismatches += 1
+      elif single != None and (abs(single[2] - sampled) > 0.002 or (single[1] != -1 and np.subtract(cell_at(sampled - 0.001), single[0]).tolist() != list(FACE_OFFSETS[single[1]]))):
+        mismatches += 1
+
+  elapsed = time_call(lambda: [raycast(world.cursor(), origin, direction, reach) for origin, direction in zip(origins.tolist(), directions.tolist())], repeat)
+  print(f"raycast: single  {count / elapsed:10.0f} rays/s")
+  elapsed = time_call(lambda: raycast_many(world, origins, directions, reach), repeat)
+  print(f"raycast: batched {count / elapsed:10.0f} rays/s")
+  print(f"raycast: {mismatches} of {count} rays differ, {sum(hit != None for hit in hits)} hit something")
+
+# Terrain generation before the NumPy noise: a perlin_noise call per column (with the chunk
+# coordinates swapped the way it had them) and a random call per tile, no trees
+def legacy_generate_blocks(noise, cx: int, cz: int):
+  blocks = bytearray(CHUNK_VOLUME)
+  for x in range(16):
+    for z in range(16):
+      max_y = 31 + noise.noise([(x + cz * 16) / 256, z + (cx * 16) / 256]) * 6
+      for y in range(0, int(max_y)):
+        if y > 64:
+          continue
+        elif y == 0:
+          blocks[block_index(x, y, z)] = 9
+        elif y < 29:
+          blocks[block_index(x, y, z)] = 2 if random.randint(0, 17) - y < 1 else 3
+        elif y < 30:
+          blocks[block_index(x, y, z)] = 2
+        elif y == int(max_y) - 1:
+          blocks[block_index(x, y, z)] = 1
+        else:
+          blocks[block_index(x, y, z)] = 2
+  return blocks
+
+# Chunks generated per second over a 16x16 chunk area, with the heightmap cache cold and warm,
+# and checks that generating again gives the same blocks
+def bench_generation(repeat: int = 3):
+  from perlin_noise import PerlinNoise
+  keys = [(cx, cz) for cx in range(-8, 8) for cz in range(-8, 8)]
+  noise = PerlinNoise(octaves=2, seed=World.SEED)
+  legacy_keys = keys[:16]
+  elapsed = time_call(lambda: [legacy_generate_blocks(noise, cx, cz) for cx, cz in legacy_keys], 1)
+  print(f"generation: legacy          {len(legacy_keys) / elapsed:8.1f} chunks/s (blocks only)")
+
+  def cold():
+    get_heightmap.cache_clear()
+    for cx, cz in keys:
+      generate_blocks(World.SEED, cx, cz)
+  elapsed = time_call(cold, repeat)
+  print(f"generation: cold cache      {len(keys) / elapsed:8.1f} chunks/s (blocks only)")
+  elapsed = time_call(lambda: [generate_blocks(World.SEED, cx, cz) for cx, cz in keys], repeat)
+  print(f"generation: warm cache      {len(keys) / elapsed:8.1f} chunks/s (blocks only)")
+  elapsed = time_call(lambda: [generate_chunk(World.SEED, cx, cz) for cx, cz in keys], 1)
+  print(f"generation: with light      {len(keys) / elapsed:8.1f} chunks/s")
+
+  elapsed = time_call(lambda: generate_heightmap(World.SEED, -8, -8, 16, 16), repeat)
+  print(f"generation: region heightmap {len(keys) / elapsed:7.0f} chunk heightmaps/s")
+  region = generate_heightmap(World.SEED, -8, -8, 16, 16)
+  seams = sum(not np.array_equal(region[(cz + 8) * 16:(cz + 9) * 16, (cx + 8) * 16:(cx + 9) * 16], get_heightmap(World.SEED, cx, cz)) for cx, cz in keys)
+  get_heightmap.cache_clear()
+  differ = sum(generate_blocks(World.SEED, cx, cz) != generate_blocks(World.SEED, cx, cz) for cx, cz in keys)
+  print(f"generation: {differ} of {len(keys)} chunks differ when generated again, {seams} heightmaps differ from the region's")
+
+# The F3 overlay's text added to a sprite batch every frame, a glyph at a time like Font did before
+# its mesh cache, then through the cache with only the FPS and position lines changing
+def bench_text(frames: int = 300):
+  import types
+  from font import Font
+  from sprite_batch import SpriteBatch, BLEND_ALPHA, TEXT_LAYER
+  game = types.SimpleNamespace(sprite_batch=None)
+  font = Font(game)
+  def get_lines(frame: int):
+    return [GAME_VERSION, f"{60 + frame % 7} FPS", f"Position: {frame * 0.37:.2f}, 64.00, {frame * -0.21:.2f}", "Chunk: 3, -2",
+            "Quads: 48211 (130551 before merging)", "Chunks: 45 visible, 36 culled, 142 sections", "Draw calls: 611 world, 4 GUI (1304 quads)",
+            "Press F3 to show/hide debug", "Press 1-9 to select blocks", "Press F7 to reload textures", "Python 3.12.1", "Display: 700x450"]
+
+  def legacy_draw_text(batch, message: str, x: int, y: int, color: int):
+    for xx, yy, c in ((x + 1, y + 1, 0x000000), (x, y, color)):
+      for char in message:
+        if char == ' ':
+          xx += 8
+          continue
+        idx = font.chars.find(char)
+        u = (idx % 21) * 8
+        v = 48 + (idx // 21) * 8
+        batch.quad("gui.png", xx, yy, xx + 8, yy + 8, u / 256.0, v / 256.0, (u + 8) / 256.0, (v + 8) / 256.0, c, blend=BLEND_ALPHA, layer=TEXT_LAYER)
+        xx += 8
+
+  def legacy():
+    for frame in range(frames):
+      batch = SpriteBatch(None)
+      for i, line in enumerate(get_lines(frame)):
+        legacy_draw_text(batch, line, 1, 1 + i * 10, 0xFFFFFF)
+
+  def cached():
+    for frame in range(frames):
+      game.sprite_batch = SpriteBatch(None)
+      for i, line in enumerate(get_lines(frame)):
+        font.draw_text(line, 1, 1 + i * 10, 0xFFFFFF)
+
+  elapsed = time_call(legacy, 3)
+  print(f"text: per glyph  {elapsed / frames * 1000:6.3f} ms/frame")
+  elapsed = time_call(cached, 3)
+  print(f"text: cached     {elapsed / frames * 1000:6.3f} ms/frame ({font.cache_hits} hits, {font.cache_misses} misses)")
+
+# The loopback load test with more and more clients, see loadtest.py
+def bench_server(seconds: float = 5.0):
+  for client_count in (1, 4, 8):
+    asyncio.run(run_load_test(client_count, seconds, 3))
+
+BENCHMARKS = {
+  'mesher': bench_mesher,
+  'greedy': bench_greedy,
+  'memory': bench_memory,
+  'lookups': bench_lookups,
+  'set_tile': bench_set_tile,
+  'light': bench_light,
+  'ticks': bench_ticks,
+  'fluids': bench_fluids,
+  'collision': bench_collision,
+  'entities': bench_entities,
+  'raycast': bench_raycast,
+  'generation': bench_generation,
+  'text': bench_text,
+  'server': bench_server
+}
+
+if __name__ == "__main__":
+  names = sys.argv[1:] if len(sys.argv) > 1 else list(BENCHMARKS.keys())
+  for name in names:
+    BENCHMARKS[name]()
@@ -0,0 +1,137 @@
+import asyncio
+import queue
+import threading
+from constants import *
+from world import World
+from lighting import calculate_light
+from protocol import *
+
+# Connection to a server.py server. The socket is handled by an asyncio loop on a thread of its own,
+# received messages wait in a queue until the game's thread polls them.
+class ServerConnection:
+  CONNECT_TIMEOUT = 10.0
+
+  def __init__(self, host: str, port: int, name: str, render_distance: int):
+    self.__host = host
+    self.__port = port
+    self.__incoming = queue.SimpleQueue()
+    self.__loop = asyncio.new_event_loop()
+    self.__writer: asyncio.StreamWriter | None = None
+    self.__error: Exception | None = None
+    self.__connected = threading.Event()
+    self.__thread = threading.Thread(target=self.__run, args=(name, render_distance), daemon=True)
+    self.__thread.start()
+    if not self.__connected.wait(ServerConnection.CONNECT_TIMEOUT):
+      raise ConnectionError(f"Timed out connecting to {host}:{port}")
+    if self.__error != None:
+      raise ConnectionError(f"Couldn't connect to {host}:{port}: {self.__error}")
+
+  def __run(self, name: str, render_distance: int):
+    self.__loop.run_until_complete(self.__receive(name, render_distance))
+    self.__loop.close()
+
+  async def __receive(self, name: str, render_distance: int):
+    try:
+      reader, self.__writer = await asyncio.open_connection(self.__host, self.__port)
+    except OSError as e:
+      self.__error = e
+      self.__connected.set()
+      return
+
+    self.__writer.write(encode_message(LOGIN, LOGIN_FORMAT.pack(render_distance) + name.encode("utf-8")))
+    self.__connected.set()
+    try:
+      while True:
+        message = await read_message(reader)
+        if message is None:
+          break
+        self.__incoming.put(message)
+    except ConnectionError:
+      pass
+    finally:
+      # None tells poll() the connection is gone
+      self.__incoming.put(None)
+      self.__writer.close()
+
+  def send(self, data: bytes):
+    self.__loop.call_soon_threadsafe(self.__writer.write, data)
+
+  # Messages received since the last poll as (type, payload), None once the server disconnected
+  def poll(self) -> list[tuple[int, bytes] | None]:
+    messages = []
+    while True:
+      try:
+        messages.append(self.__incoming.get_nowait())
+      except queue.Empty:
+        return messages
+
+  def close(self):
+    if self.__thread.is_alive():
+      self.__loop.call_soon_threadsafe(self.__writer.close)
+      self.__thread.join(ServerConnection.CONNECT_TIMEOUT)
+
+# A world mirroring the one on a server. Chunks and tile changes come from the server and only light
+# is worked out here, tiles the player changes are sent to the server and shown straight away.
+class ClientWorld(World):
+  SIMULATED = False
+  # Ticks between the player's position being sent to the server
+  STATE_INTERVAL = 3
+
+  def __init__(self, game, connection: ServerConnection):
+    self.connection = connection
+    self.connected = True
+    self.server_tick = 0
+    self.__ticks = 0
+    super().__init__(game)
+
+  # The server decides which chunks are loaded, here only the render distance is kept track of
+  def update_loaded_chunks(self):
+    self.center = self.get_player_chunk()
+    self.render_distance = self.game.settings.render_distance
+
+  def process_jobs(self):
+    self.update_loaded_chunks()
+    for message in self.connection.poll():
+      if message is None:
+        self.connected = False
+        continue
+      self.__handle_message(*message)
+
+  def __handle_message(self, message_type: int, payload: bytes):
+    if message_type == CHUNK:
+      cx, cz, blocks, fluid = decode_chunk(payload)
+      self.unload_chunk((cx, cz))
+      self.add_chunk(cx, cz, blocks, calculate_light(blocks), fluid)
+    elif message_type == BLOCK_DELTAS:
+      cx, cz, indices, tiles, levels = decode_block_deltas(payload)
+      chunk = self.get_chunk(cx, cz)
+      if chunk is None:
+        return
+      for index, tile_id, level in zip(indices.tolist(), tiles.tolist(), levels.tolist()):
+        x = index & 15
+        y = index >> 8
+        z = (index >> 4) & 15
+        super().set_tile(cx * 16 + x, y, cz * 16 + z, tile_id)
+        chunk.set_fluid_level(x, y, z, level)
+    elif message_type == UNLOAD_CHUNK:
+      self.unload_chunk(CHUNK_KEY_FORMAT.unpack_from(payload))
+    elif message_type == TICK:
+      self.server_tick = TICK_FORMAT.unpack_from(payload)[0]
+    elif message_type == LOGIN_OK:
+      x, y, z, _ = LOGIN_OK_FORMAT.unpack_from(payload)
+      self.game.player.set_pos(x, y, z)
+
+  def set_tile(self, x: int, y: int, z: int, tile_id: int):
+    self.connection.send(encode_message(SET_TILE, SET_TILE_FORMAT.pack(x, y, z, tile_id)))
+    super().set_tile(x, y, z, tile_id)
+
+  def tick(self):
+    super().tick()
+    self.__ticks += 1
+    if self.__ticks % ClientWorld.STATE_INTERVAL == 0:
+      player = self.game.player
+      self.connection.send(encode_message(PLAYER_STATE, PLAYER_STATE_FORMAT.pack(player.x, player.y, player.z, player.rot_x, player.rot_y)))
+
+  def dispose(self):
+    self.connection.close()
+    super().dispose()
@@ -0,0 +1,89 @@
+import math
+import numpy as np
+from constants import *
+from tiles import BLOCK_TYPES
+
+# True for tiles that stop moving boxes, indexed by tile id
+COLLIDABLE = np.zeros(256, dtype=bool)
+for tile_id, tile_type in BLOCK_TYPES.items():
+  COLLIDABLE[tile_id] = tile_type.is_collidable
+COLLIDABLE_IDS: list[bool] = COLLIDABLE.tolist()
+
+# Boxes are (x0, y0, z0, x1, y1, z1) tuples. Moving one clips the movement against the tiles the box
+# would sweep through, one axis at a time in the order y, x, z, by walking the block grid from the
+# box outwards, so no box is made for the tiles and the walk stops at the first layer that blocks.
+
+# True if any tile in the integer range [x0, x1) x [y0, y1) x [z0, z1) is collidable
+def is_region_solid(tiles, x0: int, y0: int, z0: int, x1: int, y1: int, z1: int) -> bool:
+  y0 = max(y0, 0)
+  y1 = min(y1, CHUNK_HEIGHT)
+  get_tile = tiles.get_tile
+  for x in range(x0, x1):
+    for z in range(z0, z1):
+      for y in range(y0, y1):
+        if COLLIDABLE_IDS[get_tile(x, y, z)]:
+          return True
+  return False
+
+def clip_x(tiles, box: tuple, xa: float) -> float:
+  x0, y0, z0, x1, y1, z1 = box
+  ys = math.floor(y0)
+  ye = math.ceil(y1)
+  zs = math.floor(z0)
+  ze = math.ceil(z1)
+  if xa > 0.0:
+    for x in range(math.ceil(x1), math.ceil(x1 + xa)):
+      if is_region_solid(tiles, x, ys, zs, x + 1, ye, ze):
+        return x - x1
+  elif xa < 0.0:
+    for x in range(math.floor(x0) - 1, math.floor(x0 + xa) - 1, -1):
+      if is_region_solid(tiles, x, ys, zs, x + 1, ye, ze):
+        return x + 1 - x0
+  return xa
+
+def clip_y(tiles, box: tuple, ya: float) -> float:
+  x0, y0, z0, x1, y1, z1 = box
+  xs = math.floor(x0)
+  xe = math.ceil(x1)
+  zs = math.floor(z0)
+  ze = math.ceil(z1)
+  if ya > 0.0:
+    for y in range(math.ceil(y1), math.ceil(y1 + ya)):
+      if is_region_solid(tiles, xs, y, zs, xe, y + 1, ze):
+        return y - y1
+  elif ya < 0.0:
+    for y in range(math.floor(y0) - 1, math.floor(y0 + ya) - 1, -1):
+      if is_region_solid(tiles, xs, y, zs, xe, y + 1, ze):
+        return y + 1 - y0
+  return ya
+
+def clip_z(tiles, box: tuple, za: float) -> float:
+  x0, y0, z0, x1, y1, z1 = box
+  xs = math.floor(x0)
+  xe = math.ceil(x1)
+  ys = math.floor(y0)
+  ye = math.ceil(y1)
+  if za > 0.0:
+    for z in range(math.ceil(z1), math.ceil(z1 + za)):
+      if is_region_solid(tiles, xs, ys, z, xe, ye, z + 1):
+        return z - z1
+  elif za < 0.0:
+    for z in range(math.floor(z0) - 1, math.floor(z0 + za) - 1, -1):
+      if is_region_solid(tiles, xs, ys, z, xe, ye, z + 1):
+        return z + 1 - z0
+  return za
+
+# Moves the box by (xa, ya, za) as far as the tiles let it, returning the moved box and how far it
+# actually went along each axis. tiles is anything with get_tile(x, y, z), like a world's cursor().
+def move_box(tiles, box: tuple, xa: float, ya: float, za: float):
+  x0, y0, z0, x1, y1, z1 = box
+  ya = clip_y(tiles, box, ya)
+  y0 += ya
+  y1 += ya
+  xa = clip_x(tiles, (x0, y0, z0, x1, y1, z1), xa)
+  x0 += xa
+  x1 += xa
+  za = clip_z(tiles, (x0, y0, z0, x1, y1, z1), za)
+  z0 += za
+  z1 += za
+  return (x0, y0, z0, x1, y1, z1), xa, ya, za
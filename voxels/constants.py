@@ -1,3 +1,5 @@
 GAME_VERSION = "VOXELS ALPHA 0.0.2"
 CHUNK_HEIGHT = 128
-DEBUG_PRINTS = False
\ No newline at end of file
+DEBUG_PRINTS = False
+# x, y, z, u, v, r, g, b, a floats per vertex
+VERTEX_SIZE = 9
\ No newline at end of file
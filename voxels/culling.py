@@ -0,0 +1,37 @@
+import math
+import numpy as np
+
+# Fog factor at which a fogged pixel is within one step of the fog color
+FOG_CUTOFF = 1 / 255
+
+# Distance past which GL_EXP fog of the given density completely hides everything
+def get_fog_end(density: float) -> float:
+  return -math.log(FOG_CUTOFF) / density
+
+# The six planes bounding what the camera sees, taken from the GL projection and modelview matrices.
+# Planes are (a, b, c, d) with normals pointing inwards, so inside points have a*x + b*y + c*z + d >= 0.
+class Frustum:
+  def __init__(self, projection, modelview):
+    # GL hands matrices over column major, so reshaping them gives their transposes
+    clip = (np.asarray(modelview, dtype=np.float64).reshape(4, 4) @ np.asarray(projection, dtype=np.float64).reshape(4, 4)).T
+    planes = np.array([
+      clip[3] + clip[0], clip[3] - clip[0],
+      clip[3] + clip[1], clip[3] - clip[1],
+      clip[3] + clip[2], clip[3] - clip[2]
+    ])
+    self.planes = planes / np.linalg.norm(planes[:, :3], axis=1)[:, None]
+
+  # True for every box (rows of mins and maxs) that is at least partly inside the frustum
+  def get_visible_boxes(self, mins: np.ndarray, maxs: np.ndarray) -> np.ndarray:
+    normals = self.planes[:, :3]
+    # The corner of each box furthest along each plane's normal, if it is outside so is the box
+    corners = np.where(normals[None, :, :] >= 0, maxs[:, None, :], mins[:, None, :])
+    return ((corners * normals[None, :, :]).sum(axis=2) + self.planes[None, :, 3] >= 0).all(axis=1)
+
+  def is_box_visible(self, x0: float, y0: float, z0: float, x1: float, y1: float, z1: float) -> bool:
+    return bool(self.get_visible_boxes(np.array([[x0, y0, z0]]), np.array([[x1, y1, z1]]))[0])
+
+# Distance from a point to the closest point of every box, zero for boxes containing the point
+def get_box_distances(point, mins: np.ndarray, maxs: np.ndarray) -> np.ndarray:
+  point = np.asarray(point, dtype=np.float64)
+  return np.linalg.norm(point - np.clip(point, mins, maxs), axis=1)
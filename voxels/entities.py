@@ -0,0 +1,176 @@
+import math
+import numpy as np
+from collision import move_box, COLLIDABLE
+
+# Movement constants shared by the player and every other entity, per tick
+GRAVITY = 0.005
+JUMP_SPEED = 0.12
+GROUND_SPEED = 0.02
+AIR_SPEED = 0.005
+WATER_SPEED_FACTOR = 0.4
+HORIZONTAL_DRAG = 0.91
+VERTICAL_DRAG = 0.98
+GROUND_FRICTION = 0.8
+
+# Velocity added by walking input (forward, strafe) along a yaw in degrees, the way Player.move_relative
+# does it. The player passes -forward as move_relative's za, walking forward is towards -z at yaw 0.
+def get_walk_velocity(forward, strafe, rot_y, speed):
+  xa = np.asarray(strafe, dtype=np.float64)
+  za = -np.asarray(forward, dtype=np.float64)
+  dist = xa * xa + za * za
+  scale = np.where(dist >= 0.01, speed / np.sqrt(np.maximum(dist, 0.01)), 0.0)
+  xa = xa * scale
+  za = za * scale
+  rot = np.asarray(rot_y, dtype=np.float64) * math.pi / 180.0
+  sin = np.sin(rot)
+  cos = np.cos(rot)
+  return xa * cos - za * sin, za * cos + xa * sin
+
+# Every entity in a world other than the player, stored as one NumPy array per property with a row per
+# entity so a tick moves all of them together. Rows of removed entities are reused by later spawns.
+# Positions are the centre of the bottom of the entity's box.
+class Entities:
+  def __init__(self, world, capacity: int = 64):
+    self.world = world
+    self.count = 0
+    self.__free: list[int] = []
+    self.alive = np.zeros(capacity, dtype=bool)
+    self.positions = np.zeros((capacity, 3), dtype=np.float64)
+    self.old_positions = np.zeros((capacity, 3), dtype=np.float64)
+    self.velocities = np.zeros((capacity, 3), dtype=np.float64)
+    # Width and height of each entity's box
+    self.sizes = np.zeros((capacity, 2), dtype=np.float64)
+    self.on_ground = np.zeros(capacity, dtype=bool)
+    self.rot_y = np.zeros(capacity, dtype=np.float64)
+    # Input for the next tick: forward and strafe from -1 to 1, and whether to jump
+    self.walk = np.zeros((capacity, 2), dtype=np.float64)
+    self.jump = np.zeros(capacity, dtype=bool)
+
+  def __len__(self) -> int:
+    return int(self.alive[:self.count].sum())
+
+  def __grow(self):
+    capacity = len(self.alive) * 2
+    for name in ("alive", "positions", "old_positions", "velocities", "sizes", "on_ground", "rot_y", "walk", "jump"):
+      array = getattr(self, name)
+      grown = np.zeros((capacity,) + array.shape[1:], dtype=array.dtype)
+      grown[:len(array)] = array
+      setattr(self, name, grown)
+
+  def spawn(self, x: float, y: float, z: float, width: float = 0.6, height: float = 1.8) -> int:
+    if len(self.__free) > 0:
+      index = self.__free.pop()
+    else:
+      if self.count == len(self.alive):
+        self.__grow()
+      index = self.count
+      self.count += 1
+
+    self.alive[index] = True
+    self.positions[index] = (x, y, z)
+    self.old_positions[index] = (x, y, z)
+    self.velocities[index] = 0.0
+    self.sizes[index] = (width, height)
+    self.on_ground[index] = False
+    self.rot_y[index] = 0.0
+    self.walk[index] = 0.0
+    self.jump[index] = False
+    return index
+
+  def remove(self, index: int):
+    if self.alive[index]:
+      self.alive[index] = False
+      self.__free.append(index)
+
+  def get_boxes(self, indices: np.ndarray) -> np.ndarray:
+    positions = self.positions[indices]
+    half_width = self.sizes[indices, 0] / 2
+    return np.stack([
+      positions[:, 0] - half_width, positions[:, 1], positions[:, 2] - half_width,
+      positions[:, 0] + half_width, positions[:, 1] + self.sizes[indices, 1], positions[:, 2] + half_width
+    ], axis=1)
+
+  # Clips every box's move along one axis (0, 1, 2 for x, y, z) against the tiles, like
+  # collision.clip_x/y/z do for one box. Moves of at most a block can only reach one layer of tiles,
+  # so all the layers are looked up in one go.
+  def __clip_axis(self, boxes: np.ndarray, deltas: np.ndarray, axis: int) -> np.ndarray:
+    positive = deltas > 0.0
+    layers = np.where(positive, np.ceil(boxes[:, axis + 3]), np.floor(boxes[:, axis]) - 1)
+    reaches = np.where(positive, np.ceil(boxes[:, axis + 3] + deltas) > layers, np.floor(boxes[:, axis] + deltas) <= layers)
+    candidates = np.flatnonzero(reaches)
+    if len(candidates) == 0:
+      return deltas
+
+    a, b = [other for other in range(3) if other != axis]
+    a_lows = np.floor(boxes[candidates, a]).astype(np.int64)
+    b_lows = np.floor(boxes[candidates, b]).astype(np.int64)
+    a_extents = np.ceil(boxes[candidates, a + 3]).astype(np.int64) - a_lows
+    b_extents = np.ceil(boxes[candidates, b + 3]).astype(np.int64) - b_lows
+    a_offsets, b_offsets = np.meshgrid(np.arange(a_extents.max()), np.arange(b_extents.max()), indexing="ij")
+    a_offsets = a_offsets.ravel()
+    b_offsets = b_offsets.ravel()
+
+    coords = [None, None, None]
+    coords[axis] = np.repeat(layers[candidates].astype(np.int64), len(a_offsets))
+    coords[a] = (a_lows[:, None] + a_offsets[None, :]).ravel()
+    coords[b] = (b_lows[:, None] + b_offsets[None, :]).ravel()
+    inside = (a_offsets[None, :] < a_extents[:, None]) & (b_offsets[None, :] < b_extents[:, None])
+    tiles = self.world.get_tiles(coords[0], coords[1], coords[2]).reshape(inside.shape)
+    blocked = candidates[(COLLIDABLE[tiles] & inside).any(axis=1)]
+
+    deltas = deltas.copy()
+    deltas[blocked] = np.where(positive[blocked], layers[blocked] - boxes[blocked, axis + 3], layers[blocked] + 1 - boxes[blocked, axis])
+    return deltas
+
+  # One fixed step for every entity: walking input, gravity, collision and drag, with the same
+  # numbers as the player
+  def tick(self):
+    indices = np.flatnonzero(self.alive[:self.count])
+    if len(indices) == 0:
+      return
+    self.old_positions[indices] = self.positions[indices]
+    positions = self.positions[indices]
+    velocities = self.velocities[indices]
+    on_ground = self.on_ground[indices]
+
+    in_water = self.world.get_tiles(np.floor(positions[:, 0]).astype(np.int64), np.floor(positions[:, 1]).astype(np.int64), np.floor(positions[:, 2]).astype(np.int64)) == 7
+    speed = np.where(on_ground, GROUND_SPEED, AIR_SPEED) * np.where(in_water, WATER_SPEED_FACTOR, 1.0)
+    walk = self.walk[indices]
+    walk_x, walk_z = get_walk_velocity(walk[:, 0], walk[:, 1], self.rot_y[indices], speed)
+    velocities[:, 0] += walk_x
+    velocities[:, 2] += walk_z
+    velocities[:, 1] = np.where(self.jump[indices] & on_ground, JUMP_SPEED, velocities[:, 1]) - GRAVITY
+
+    # Moves of up to a block on every axis are clipped as a batch in the same y, x, z order as move_box,
+    # anything faster goes through move_box on its own
+    boxes = self.get_boxes(indices)
+    moved = velocities.copy()
+    batchable = (np.abs(velocities) <= 1.0).all(axis=1)
+    batched = np.flatnonzero(batchable)
+    batch_boxes = boxes[batched]
+    for axis in (1, 0, 2):
+      deltas = self.__clip_axis(batch_boxes, moved[batched, axis], axis)
+      moved[batched, axis] = deltas
+      batch_boxes[:, axis] += deltas
+      batch_boxes[:, axis + 3] += deltas
+
+    fast = np.flatnonzero(~batchable)
+    if len(fast) > 0:
+      tiles = self.world.cursor()
+      for i in fast.tolist():
+        _, xa, ya, za = move_box(tiles, tuple(boxes[i].tolist()), velocities[i, 0], velocities[i, 1], velocities[i, 2])
+        moved[i] = (xa, ya, za)
+
+    positions += moved
+    clipped = moved != velocities
+    on_ground = clipped[:, 1] & (velocities[:, 1] < 0.0)
+    velocities[clipped] = 0.0
+    velocities[:, 0] *= HORIZONTAL_DRAG
+    velocities[:, 1] *= VERTICAL_DRAG
+    velocities[:, 2] *= HORIZONTAL_DRAG
+    velocities[on_ground, 0] *= GROUND_FRICTION
+    velocities[on_ground, 2] *= GROUND_FRICTION
+
+    self.positions[indices] = positions
+    self.velocities[indices] = velocities
+    self.on_ground[indices] = on_ground
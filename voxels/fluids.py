@@ -0,0 +1,161 @@
+import numpy as np
+from constants import *
+
+WATER = 7
+# Flow levels go from 0 for source tiles to MAX_LEVEL for the last tile water reaches sideways.
+# Water with water on top of it is FALLING, it spreads sideways like a source once it lands.
+MAX_LEVEL = 7
+FALLING = 8
+# Ticks between fluid steps
+FLOW_INTERVAL = 5
+
+# Height of a water tile's top face per level when nothing is on top of it
+FLUID_HEIGHTS = np.array([0.9 - 0.1 * (level & MAX_LEVEL) for level in range(16)], dtype=np.float32)
+
+HORIZONTAL = ((0, 0, -1), (0, 0, 1), (-1, 0, 0), (1, 0, 0))
+NEIGHBOURS = ((0, -1, 0), (0, 1, 0)) + HORIZONTAL
+
+# Moves water around in steps. Positions whose water might change are kept in a frontier set and
+# every step works out the new state of all of them from the world as it was before the step, then
+# applies the changes together. Chunks are marked dirty once per step rather than once per tile.
+class FluidSimulator:
+  # Positions looked at per step, the rest wait for the next one
+  MAX_UPDATES_PER_STEP = 8192
+
+  def __init__(self, world):
+    self.world = world
+    self.__frontier: set[tuple[int, int, int]] = set()
+    self.__ticks = 0
+    # Positions looked at and tiles changed since the simulator was created
+    self.update_count = 0
+    self.change_count = 0
+
+  @property
+  def pending_count(self) -> int:
+    return len(self.__frontier)
+
+  def __get(self, x: int, y: int, z: int) -> tuple[int, int]:
+    chunk = self.world.chunks.get((x >> 4, z >> 4))
+    if chunk is None or y < 0 or y >= CHUNK_HEIGHT:
+      return -1, 0
+    lx = x & 15
+    lz = z & 15
+    return chunk.sections.get(lx, y, lz), chunk.fluid.get(lx, y, lz)
+
+  # Something changed at (x, y, z), so water there and around it may have to move
+  def on_tile_changed(self, x: int, y: int, z: int):
+    frontier = self.__frontier
+    frontier.add((x, y, z))
+    for dx, dy, dz in NEIGHBOURS:
+      frontier.add((x + dx, y + dy, z + dz))
+
+  # Water in a loaded chunk that can flow somewhere, and flowing water that may have lost what fed it
+  def add_chunk(self, chunk):
+    tiles = chunk.get_blocks_array()
+    water = tiles == WATER
+    if not water.any():
+      return
+
+    air = tiles == 0
+    flows = np.zeros_like(water)
+    flows[1:] |= water[1:] & air[:-1]
+    flows[:, 1:] |= water[:, 1:] & air[:, :-1]
+    flows[:, :-1] |= water[:, :-1] & air[:, 1:]
+    flows[:, :, 1:] |= water[:, :, 1:] & air[:, :, :-1]
+    flows[:, :, :-1] |= water[:, :, :-1] & air[:, :, 1:]
+    # Water on the chunk's sides may flow into the chunks next to it
+    flows[:, (0, 15), :] |= water[:, (0, 15), :]
+    flows[:, :, (0, 15)] |= water[:, :, (0, 15)]
+    flows |= water & (chunk.fluid.to_array() != 0)
+
+    ys, zs, xs = np.nonzero(flows)
+    for x, y, z in zip((xs + chunk.x * 16).tolist(), ys.tolist(), (zs + chunk.z * 16).tolist()):
+      self.on_tile_changed(x, y, z)
+
+  # What the tile at (x, y, z) becomes, as (tile, level), or None if it stays as it is
+  def __get_target(self, x: int, y: int, z: int, tile: int, level: int) -> tuple[int, int] | None:
+    if tile != 0 and tile != WATER:
+      return None
+    if tile == WATER and level == 0:
+      return None
+
+    if self.__get(x, y + 1, z)[0] == WATER:
+      return WATER, FALLING
+
+    best = FALLING
+    for dx, _, dz in HORIZONTAL:
+      neighbour, neighbour_level = self.__get(x + dx, y, z + dz)
+      if neighbour != WATER:
+        continue
+      spread = 0 if neighbour_level == FALLING else neighbour_level
+      if spread + 1 >= best:
+        continue
+      # Water only spreads sideways off something it can't fall through
+      below, below_level = self.__get(x + dx, y - 1, z + dz)
+      if below == 0 or (below == WATER and below_level != 0):
+        continue
+      best = spread + 1
+
+    if best <= MAX_LEVEL:
+      return WATER, best
+    return 0, 0
+
+  # Runs a step every FLOW_INTERVAL ticks, returns how many tiles changed
+  def tick(self) -> int:
+    self.__ticks += 1
+    if self.__ticks % FLOW_INTERVAL != 0 or len(self.__frontier) == 0:
+      return 0
+    return self.step()
+
+  def step(self) -> int:
+    frontier = self.__frontier
+    if len(frontier) <= FluidSimulator.MAX_UPDATES_PER_STEP:
+      positions = frontier
+      self.__frontier = set()
+    else:
+      positions = set()
+      for _ in range(FluidSimulator.MAX_UPDATES_PER_STEP):
+        positions.add(frontier.pop())
+    self.update_count += len(positions)
+
+    changes = []
+    for x, y, z in positions:
+      tile, level = self.__get(x, y, z)
+      if tile == -1:
+        continue
+      target = self.__get_target(x, y, z, tile, level)
+      if target != None and target != (tile, level):
+        changes.append((x, y, z, tile, target))
+
+    world = self.world
+    chunks = world.chunks
+    changed_chunks: set[tuple[int, int]] = set()
+    for x, y, z, old_tile, (tile, level) in changes:
+      world.set_fluid_tile(x, y, z, tile, level)
+      self.on_tile_changed(x, y, z)
+
+      cx = x >> 4
+      cz = z >> 4
+      lx = x & 15
+      lz = z & 15
+
+      # Meshes next door draw against border tiles
+      if lx == 0:
+        changed_chunks.add((cx - 1, cz))
+      elif lx == 15:
+        changed_chunks.add((cx + 1, cz))
+      if lz == 0:
+        changed_chunks.add((cx, cz - 1))
+      elif lz == 15:
+        changed_chunks.add((cx, cz + 1))
+
+    for key in changed_chunks:
+      chunk = chunks.get(key)
+      if chunk != None:
+        chunk.make_dirty()
+
+    self.change_count += len(changes)
+    return len(changes)
+
+  def clear(self):
+    self.__frontier.clear()
@@ -1,33 +1,61 @@
-from OpenGL.GL import *
-import json
+from collections import OrderedDict
+from constants import *
+from sprite_batch import BLEND_ALPHA, TEXT_LAYER
+from resources import load_json
+import numpy as np
 
 class Font:
+  # Text meshes kept for strings drawn again, the least recently drawn go first
+  MESH_CACHE_SIZE = 256
+
   def __init__(self, game):
     self.game = game
-    with open("res/font.json", "r", encoding="utf-8") as f:
-      self.chars = "".join(json.load(f))
+    self.chars = "".join(load_json("font.json"))
+    # Glyph index of every character, the first one wins like str.find
+    self.glyphs: dict[str, int] = {}
+    for idx, char in enumerate(self.chars):
+      self.glyphs.setdefault(char, idx)
+    self.__meshes: OrderedDict[tuple[str, int, float, bool], np.ndarray] = OrderedDict()
+    self.cache_hits = 0
+    self.cache_misses = 0
 
   def draw_text(self, message: str, x: int, y: int, color: int, align = 0.0, shadow=True):
-    if shadow:
-      self.__draw_text(message, x + 1, y + 1, 0x000000, align)
-    self.__draw_text(message, x, y, color, align)
+    self.game.sprite_batch.mesh("gui.png", self.get_mesh(message, color, align, shadow), x, y, blend=BLEND_ALPHA, layer=TEXT_LAYER)
 
-  def __draw_text(self, message: str, x: int, y: int, color: int, align: float):
-    glColor4f((color >> 16 & 0xFF) / 255.0, (color >> 8 & 0xFF) / 255.0, (color & 0xFF) / 255.0, 1.0)
-    glEnable(GL_BLEND)
-    glBlendFunc(GL_SRC_ALPHA, GL_ONE_MINUS_SRC_ALPHA)
-    self.game.texture_manager.get("gui.png").bind()
+  # Vertices of the text drawn at (0, 0), the shadow's before the text's so it ends up below it
+  def get_mesh(self, message: str, color: int, align: float = 0.0, shadow: bool = True) -> np.ndarray:
+    key = (message, color, align, shadow)
+    mesh = self.__meshes.get(key)
+    if mesh is not None:
+      self.__meshes.move_to_end(key)
+      self.cache_hits += 1
+      return mesh
+
+    self.cache_misses += 1
+    quads = []
+    if shadow:
+      self.__add_quads(quads, message, 1, 1, 0x000000, align)
+    self.__add_quads(quads, message, 0, 0, color, align)
+    mesh = np.array(quads, dtype=np.float32).reshape(-1, VERTEX_SIZE)
+    mesh.flags.writeable = False
 
-    glBegin(GL_QUADS)
+    self.__meshes[key] = mesh
+    if len(self.__meshes) > Font.MESH_CACHE_SIZE:
+      self.__meshes.popitem(last=False)
+    return mesh
 
+  def __add_quads(self, quads: list, message: str, x: int, y: int, color: int, align: float):
+    r = (color >> 16 & 0xFF) / 255.0
+    g = (color >> 8 & 0xFF) / 255.0
+    b = (color & 0xFF) / 255.0
     xx = x - (len(message) * 8) * align
 
     for char in message:
       if char == ' ':
         xx += 8
         continue
-      
-      idx = self.chars.find(char)
+
+      idx = self.glyphs.get(char, -1)
 
       u = (idx % 21) * 8
       v = 48 + (idx // 21) * 8
@@ -37,17 +65,11 @@ class Font:
       u1 = (u + 8) / 256.0
       v1 = (v + 8) / 256.0
 
-      glTexCoord2f(u0, v0)
-      glVertex3f(xx, y, 0)
-      glTexCoord2f(u0, v1)
-      glVertex3f(xx, y + 8, 0)
-      glTexCoord2f(u1, v1)
-      glVertex3f(xx + 8, y + 8, 0)
-      glTexCoord2f(u1, v0)
-      glVertex3f(xx + 8, y, 0)
+      quads.extend((
+        xx, y, 0.0, u0, v0, r, g, b, 1.0,
+        xx, y + 8, 0.0, u0, v1, r, g, b, 1.0,
+        xx + 8, y + 8, 0.0, u1, v1, r, g, b, 1.0,
+        xx + 8, y, 0.0, u1, v0, r, g, b, 1.0
+      ))
 
       xx += 8
-
-    glEnd()
-
-    glDisable(GL_BLEND)
\ No newline at end of file
@@ -0,0 +1,148 @@
+from functools import lru_cache
+import numpy as np
+from constants import *
+from region import read_region_chunk
+from lighting import calculate_light
+
+# Blocks per noise lattice cell, and how far the terrain goes above and below its base height
+NOISE_SCALE = 128
+TERRAIN_HEIGHT = 31
+TERRAIN_AMPLITUDE = 6
+# Heightmaps kept per worker process, enough for a few render distances worth of chunks
+HEIGHTMAP_CACHE_SIZE = 1024
+
+# A well mixed 32 bit hash of integer arrays (the finaliser of MurmurHash3)
+def hash_ints(seed: int, *values: np.ndarray) -> np.ndarray:
+  h = np.full(np.broadcast(*values).shape, seed & 0xFFFFFFFF, dtype=np.uint64)
+  for value in values:
+    h = (h ^ (np.asarray(value, dtype=np.int64).astype(np.uint64) & 0xFFFFFFFF)) * 0x9E3779B1 & 0xFFFFFFFF
+    h ^= h >> 16
+    h = h * 0x85EBCA6B & 0xFFFFFFFF
+    h ^= h >> 13
+    h = h * 0xC2B2AE35 & 0xFFFFFFFF
+    h ^= h >> 16
+  return h
+
+# 2D gradient (Perlin) noise at arrays of coordinates in lattice units, roughly within -0.7 to 0.7.
+# Every lattice point's gradient comes from hashing its coordinates with the seed, so any point
+# gets the same value whichever chunk or region asks for it.
+def gradient_noise(seed: int, xs: np.ndarray, zs: np.ndarray) -> np.ndarray:
+  x0 = np.floor(xs)
+  z0 = np.floor(zs)
+  fx = xs - x0
+  fz = zs - z0
+  x0 = x0.astype(np.int64)
+  z0 = z0.astype(np.int64)
+
+  def corner(ox: int, oz: int) -> np.ndarray:
+    angles = hash_ints(seed, x0 + ox, z0 + oz).astype(np.float64) * (2 * np.pi / 2 ** 32)
+    return np.cos(angles) * (fx - ox) + np.sin(angles) * (fz - oz)
+
+  u = fx * fx * fx * (fx * (fx * 6 - 15) + 10)
+  v = fz * fz * fz * (fz * (fz * 6 - 15) + 10)
+  top = corner(0, 0) + (corner(1, 0) - corner(0, 0)) * u
+  bottom = corner(0, 1) + (corner(1, 1) - corner(0, 1)) * u
+  return top + (bottom - top) * v
+
+# Terrain height of every column of a rectangle of chunks as a (chunks_z * 16, chunks_x * 16) array
+# indexed [z, x], one noise evaluation for all of them
+def generate_heightmap(seed: int, cx: int, cz: int, chunks_x: int = 1, chunks_z: int = 1) -> np.ndarray:
+  zs, xs = np.mgrid[cz * 16:(cz + chunks_z) * 16, cx * 16:(cx + chunks_x) * 16]
+  heights = TERRAIN_HEIGHT + gradient_noise(seed, xs / NOISE_SCALE, zs / NOISE_SCALE) * TERRAIN_AMPLITUDE
+  return heights.astype(np.int64)
+
+# The heightmap of one chunk, kept around as chunks far away get unloaded and generated again
+@lru_cache(maxsize=HEIGHTMAP_CACHE_SIZE)
+def get_heightmap(seed: int, cx: int, cz: int) -> np.ndarray:
+  heights = generate_heightmap(seed, cx, cz)
+  heights.setflags(write=False)
+  return heights
+
+# Random numbers for everything placed in a chunk, the same every time the chunk is generated
+def get_chunk_rng(seed: int, cx: int, cz: int) -> np.random.Generator:
+  return np.random.default_rng([seed & 0xFFFFFFFF, cx & 0xFFFFFFFF, cz & 0xFFFFFFFF])
+
+def block_index(x: int, y: int, z: int) -> int:
+  return (y * 16 + z) * 16 + x
+
+CHUNK_VOLUME = 16 * 16 * CHUNK_HEIGHT
+
+# Saved chunk data is the blocks followed by the flow levels, which are left out when every water
+# tile is a source
+def join_chunk_data(blocks: bytes, fluid: bytes | None) -> bytes:
+  return blocks if fluid == None else blocks + fluid
+
+def split_chunk_data(data: bytes) -> tuple[bytes, bytes | None]:
+  return data[:CHUNK_VOLUME], data[CHUNK_VOLUME:] if len(data) == CHUNK_VOLUME * 2 else None
+
+# The same blocks for the same seed and chunk every time
+def generate_blocks(seed: int, cx: int, cz: int) -> bytearray:
+  rng = get_chunk_rng(seed, cx, cz)
+  heights = np.minimum(get_heightmap(seed, cx, cz), 65)
+  ys = np.arange(CHUNK_HEIGHT).reshape(-1, 1, 1)
+
+  # Stone up to the grass on top, with dirt mixed in below y 29 that gets rarer with depth.
+  # Surfaces below y 30 stay uncovered.
+  tiles = np.full((CHUNK_HEIGHT, 16, 16), 2, dtype=np.uint8)
+  tiles[1:29][rng.integers(0, 18, size=(28, 16, 16)) > ys[1:29]] = 3
+  tiles[(ys >= 30) & (ys == heights - 1)] = 1
+  tiles[ys >= heights] = 0
+  tiles[0] = 9
+  blocks = bytearray(tiles.tobytes())
+
+  generate_tree(blocks, rng)
+
+  if cx == 0 and cz == 0:
+    generate_spawn_water(blocks)
+  return blocks
+
+# Runs in the worker pool, so it only works on plain arrays and returns (blocks, light)
+def generate_chunk(seed: int, cx: int, cz: int):
+  blocks = generate_blocks(seed, cx, cz)
+  return bytes(blocks), calculate_light(blocks)
+
+# Reads the chunk from its region file if it was saved before, otherwise generates it. Returns
+# (blocks, light, fluid), fluid is None for a generated chunk.
+def load_or_generate_chunk(save_dir: str | None, seed: int, cx: int, cz: int):
+  if save_dir != None:
+    data = read_region_chunk(save_dir, cx, cz)
+    if data != None and len(data) in (CHUNK_VOLUME, CHUNK_VOLUME * 2):
+      blocks, fluid = split_chunk_data(data)
+      return blocks, calculate_light(blocks), fluid
+
+  return generate_chunk(seed, cx, cz) + (None,)
+
+def generate_tree(blocks: bytearray, rng: np.random.Generator):
+  if rng.integers(0, 201) < 150:
+    randpos_x = int(rng.integers(0, 11))
+    randpos_z = int(rng.integers(0, 11))
+
+    if blocks[block_index(randpos_x + 2, 15, randpos_z + 2)] == 7:
+      return
+
+    for y in range(16, 20):
+      blocks[block_index(randpos_x + 2, y, randpos_z + 2)] = 4
+
+    for tx in range(randpos_x, randpos_x + 5):
+      for tz in range(randpos_z, randpos_z + 5):
+        blocks[block_index(tx, 20, tz)] = 8
+
+    for tx in range(randpos_x + 1, randpos_x + 4):
+      for tz in range(randpos_z + 1, randpos_z + 4):
+        blocks[block_index(tx, 21, tz)] = 8
+
+def generate_spawn_water(blocks: bytearray):
+  for x in range(0, 8):
+    for z in range(0, 8):
+      blocks[block_index(x, 15, z)] = 7
+      blocks[block_index(x, 14, z)] = 6
+
+  for x in range(0, 7):
+    for z in range(0, 7):
+      blocks[block_index(x, 14, z)] = 7
+      blocks[block_index(x, 13, z)] = 6
+
+  for x in range(0, 5):
+    for z in range(0, 6):
+      blocks[block_index(x, 13, z)] = 7
+      blocks[block_index(x, 12, z)] = 6
@@ -0,0 +1,73 @@
+import argparse
+import random
+import time
+from player import PlayerInput
+from world import World
+
+# Run from the voxels folder: python headless.py [--ticks N] [--render-distance N] [--save DIR]
+# Simulates a world without a window or GL context as fast as it goes, for benchmarks, tests and
+# servers. Nothing here imports glfw or OpenGL, the world is only drawn when a WorldRenderer listens to it.
+
+class HeadlessSettings:
+  def __init__(self, render_distance: int = 4):
+    self.render_distance = render_distance
+    self.greedy_meshing = False
+
+# Stands in for Game wherever a World wants one
+class HeadlessGame:
+  def __init__(self, render_distance: int = 4):
+    self.settings = HeadlessSettings(render_distance)
+    self.player = None
+    self.world: World | None = None
+
+  def start_world(self, save_dir: str | None = None) -> World:
+    self.world = World(self, save_dir)
+    return self.world
+
+  def get_camera_pos(self):
+    return (self.player.x, self.player.y, self.player.z)
+
+  def tick(self, player_input: PlayerInput | None = None):
+    self.world.process_jobs()
+    self.world.tick()
+    if self.world.is_spawn_ready() and self.world.is_chunk_loaded_at(self.player.x, self.player.z):
+      self.player.tick(player_input if player_input != None else PlayerInput())
+
+  def close_world(self):
+    self.world.dispose()
+    self.world = None
+    self.player = None
+
+def run(ticks: int, render_distance: int, save_dir: str | None, entity_count: int):
+  game = HeadlessGame(render_distance)
+  world = game.start_world(save_dir)
+  start_time = time.perf_counter()
+  world.wait_for_generation()
+  print(f"Generated {len(world.chunks)} chunks in {time.perf_counter() - start_time:.2f} s")
+
+  rng = random.Random(1)
+  for _ in range(entity_count):
+    index = world.entities.spawn(game.player.x + rng.uniform(-16, 16), 100.0, game.player.z + rng.uniform(-16, 16))
+    world.entities.walk[index] = (1.0, 0.0)
+    world.entities.rot_y[index] = rng.uniform(0, 360)
+
+  tick_times = []
+  for _ in range(ticks):
+    tick_start = time.perf_counter()
+    game.tick()
+    tick_times.append(time.perf_counter() - tick_start)
+
+  total = sum(tick_times)
+  tick_times.sort()
+  print(f"{ticks} ticks in {total:.2f} s: {ticks / total:.0f} ticks/s, mean {total / ticks * 1000:.3f} ms, p99 {tick_times[int(ticks * 0.99)] * 1000:.3f} ms, max {tick_times[-1] * 1000:.3f} ms")
+  print(f"Fluids: {world.fluids.update_count} updates, {world.fluids.change_count} changes; {world.tick_scheduler.pending_count} block ticks and {world.light_engine.pending_count} light updates pending; {len(world.entities)} entities")
+  game.close_world()
+
+if __name__ == "__main__":
+  parser = argparse.ArgumentParser(description="Runs a world without rendering it")
+  parser.add_argument("--ticks", type=int, default=1000)
+  parser.add_argument("--render-distance", type=int, default=4)
+  parser.add_argument("--save", default=None, help="world folder to load and save, nothing is saved without one")
+  parser.add_argument("--entities", type=int, default=0, help="walking entities to spawn around the player")
+  args = parser.parse_args()
+  run(args.ticks, args.render_distance, args.save, args.entities)
@@ -0,0 +1,62 @@
+import multiprocessing
+import os
+from concurrent.futures import Future, ProcessPoolExecutor
+from generation import load_or_generate_chunk
+from mesher import build_chunk_meshes
+
+# Terrain generation and mesh building for chunks, run in worker processes on plain arrays.
+# Results are collected on the main thread with poll_generated/poll_meshed, keyed by chunk position.
+class ChunkJobs:
+  def __init__(self, max_workers: int | None = None):
+    if max_workers == None:
+      max_workers = max(1, (os.cpu_count() or 2) - 1)
+    self.__executor = ProcessPoolExecutor(max_workers=max_workers, mp_context=multiprocessing.get_context("spawn"))
+    self.__generating: dict[tuple[int, int], Future] = {}
+    self.__meshing: dict[tuple[int, int], Future] = {}
+
+  @property
+  def generating_count(self) -> int:
+    return len(self.__generating)
+
+  @property
+  def meshing_count(self) -> int:
+    return len(self.__meshing)
+
+  def generating_keys(self) -> list[tuple[int, int]]:
+    return list(self.__generating.keys())
+
+  def is_generating(self, key: tuple[int, int]) -> bool:
+    return key in self.__generating
+
+  def is_meshing(self, key: tuple[int, int]) -> bool:
+    return key in self.__meshing
+
+  # Loads the chunk from the save folder if it was saved there, otherwise generates it
+  def generate(self, key: tuple[int, int], seed: int, save_dir: str | None = None):
+    self.__generating[key] = self.__executor.submit(load_or_generate_chunk, save_dir, seed, key[0], key[1])
+
+  # Drops the job, its result is ignored if it already started
+  def cancel_generate(self, key: tuple[int, int]):
+    self.__generating.pop(key).cancel()
+
+  def mesh(self, key: tuple[int, int], blocks, light, fluid, greedy: bool):
+    self.__meshing[key] = self.__executor.submit(build_chunk_meshes, blocks, light, key[0] * 16, key[1] * 16, greedy, fluid)
+
+  def poll_generated(self, wait = False):
+    return self.__poll(self.__generating, wait)
+
+  def poll_meshed(self, wait = False):
+    return self.__poll(self.__meshing, wait)
+
+  def __poll(self, futures: dict[tuple[int, int], Future], wait: bool):
+    done = []
+    for key, future in list(futures.items()):
+      if wait or future.done():
+        done.append((key, future.result()))
+        del futures[key]
+    return done
+
+  def shutdown(self):
+    self.__executor.shutdown(wait=True, cancel_futures=True)
+    self.__generating.clear()
+    self.__meshing.clear()
@@ -0,0 +1,489 @@
+from collections import deque
+import numpy as np
+from constants import *
+from tiles import BLOCK_TYPES
+
+# Light is stored one byte per tile with skylight in the high nibble and block light in the low one
+MAX_LIGHT = 15
+SKY_SHIFT = 4
+BLOCK_SHIFT = 0
+FULL_SKY_LIGHT = MAX_LIGHT << SKY_SHIFT
+
+# Indexed by tile id
+LIGHT_EMISSION = np.zeros(256, dtype=np.int16)
+LIGHT_OPACITY = np.zeros(256, dtype=np.int16)
+for tile_id, tile_type in BLOCK_TYPES.items():
+  LIGHT_EMISSION[tile_id] = tile_type.light_emission
+  LIGHT_OPACITY[tile_id] = tile_type.light_opacity
+EMISSION_IDS: list[int] = LIGHT_EMISSION.tolist()
+OPACITY_IDS: list[int] = LIGHT_OPACITY.tolist()
+# Per tile id in the smallest types that hold them, for relighting boxes: light lost going into the
+# tile, MAX_LIGHT + 1 where none gets in, and whether it dims skylight coming down
+RELIGHT_LOSS = np.where(LIGHT_OPACITY >= MAX_LIGHT, MAX_LIGHT + 1, np.maximum(LIGHT_OPACITY, 1)).astype(np.int8)
+RELIGHT_EMISSION = LIGHT_EMISSION.astype(np.int8)
+DIMS_SKYLIGHT = LIGHT_OPACITY > 0
+
+# Neighbour offsets, down first so skylight runs down columns before spreading sideways
+NEIGHBOURS = [(0, -1, 0), (0, 1, 0), (0, 0, -1), (0, 0, 1), (-1, 0, 0), (1, 0, 0)]
+# Furthest from an edited tile that light coming through it reaches, besides skylight falling straight down
+RELIGHT_REACH = MAX_LIGHT - 1
+
+def spread_light(light: np.ndarray, loss: np.ndarray, sources: np.ndarray) -> np.ndarray:
+  # Every step light reaches one tile further, until nothing changes or it had the time to fade out.
+  # Two buffers take turns so the steps don't allocate.
+  light = light.copy()
+  spread = np.empty_like(light)
+  for _ in range(MAX_LIGHT):
+    np.copyto(spread, light)
+    np.maximum(spread[1:], light[:-1], out=spread[1:])
+    np.maximum(spread[:-1], light[1:], out=spread[:-1])
+    np.maximum(spread[:, 1:], light[:, :-1], out=spread[:, 1:])
+    np.maximum(spread[:, :-1], light[:, 1:], out=spread[:, :-1])
+    np.maximum(spread[:, :, 1:], light[:, :, :-1], out=spread[:, :, 1:])
+    np.maximum(spread[:, :, :-1], light[:, :, 1:], out=spread[:, :, :-1])
+    np.subtract(spread, loss, out=spread)
+    np.maximum(spread, sources, out=spread)
+    if np.array_equal(spread, light):
+      break
+    light, spread = spread, light
+  return light
+
+# Runs in the worker pool: the light of a chunk on its own, packed like the ChunkSections in Chunk.light.
+# Light coming in from neighbouring chunks is added by the LightEngine once the chunk is loaded.
+def calculate_light(blocks) -> bytes:
+  tiles = np.frombuffer(bytes(blocks), dtype=np.uint8).reshape(CHUNK_HEIGHT, 16, 16)
+  opacity = LIGHT_OPACITY[tiles]
+  loss = np.maximum(opacity, 1)
+  loss[opacity >= MAX_LIGHT] = MAX_LIGHT + 1
+
+  # Full skylight down every column until the first tile that dims it
+  dims = np.cumsum((opacity > 0)[::-1], axis=0)[::-1] > 0
+  sky_sources = np.where(dims, 0, MAX_LIGHT).astype(np.int16)
+  sky = spread_light(sky_sources, loss, sky_sources)
+
+  emission = LIGHT_EMISSION[tiles]
+  block = spread_light(emission, loss, emission) if emission.any() else emission
+
+  return ((np.clip(sky, 0, MAX_LIGHT) << SKY_SHIFT) | np.clip(block, 0, MAX_LIGHT)).astype(np.uint8).tobytes()
+
+# Boxes as [x0, y0, z0, x1, y1, z1) holding every tile within RELIGHT_REACH of the edits, with the
+# edits in each. Edits are (x, y, z, bottom, shift) for the light at shift coming through every tile
+# from bottom up to y. Boxes are merged until no two of them overlap or touch, so the tiles right
+# around a box are outside all of them.
+def get_relight_boxes(edits) -> list[tuple[list[int], list[tuple[int, int, int, int, int]]]]:
+  boxes: list[tuple[list[int], list[tuple[int, int, int, int, int]]]] = []
+  for edit in sorted(edits):
+    x, y, z, bottom, _ = edit
+    box = [x - RELIGHT_REACH, max(bottom - RELIGHT_REACH, 0), z - RELIGHT_REACH, x + RELIGHT_REACH + 1, min(y + RELIGHT_REACH + 1, CHUNK_HEIGHT), z + RELIGHT_REACH + 1]
+    box_edits = [edit]
+    i = 0
+    while i < len(boxes):
+      other, other_edits = boxes[i]
+      if box[0] <= other[3] and other[0] <= box[3] and box[1] <= other[4] and other[1] <= box[4] and box[2] <= other[5] and other[2] <= box[5]:
+        box = [min(box[0], other[0]), min(box[1], other[1]), min(box[2], other[2]), max(box[3], other[3]), max(box[4], other[4]), max(box[5], other[5])]
+        box_edits += other_edits
+        boxes.pop(i)
+        i = 0
+      else:
+        i += 1
+    boxes.append((box, box_edits))
+  return boxes
+
+# The light at shift of rows y0 to y1 of a box worked out again in place, like calculate_light does for
+# a chunk, with the tiles around them shining in as they are lit now. The arrays are indexed [y, z, x]
+# and have a border of one tile around the rows, the rows above and below as far as the world goes.
+# Returns where the light changed, within the rows and the border.
+def relight_rows(shift: int, tiles: np.ndarray, light: np.ndarray, loss: np.ndarray, loaded: np.ndarray, y0: int, y1: int) -> np.ndarray:
+  rows = slice(max(y0 - 1, 0), min(y1 + 1, len(tiles)))
+  tiles = tiles[rows]
+  light = light[rows]
+  inside = (slice(y0 - rows.start, y1 - rows.start), slice(1, -1), slice(1, -1))
+  sources = ((light >> shift) & MAX_LIGHT).astype(np.int8)
+  old_level = sources[inside].copy()
+  if shift == BLOCK_SHIFT:
+    sources[inside] = np.take(RELIGHT_EMISSION, tiles[inside])
+  else:
+    # Full skylight down every column until the first tile that dims it, if it reaches the rows
+    dims = np.logical_or.accumulate(np.take(DIMS_SKYLIGHT, tiles)[::-1], axis=0)[::-1]
+    if rows.stop > y1:
+      dims |= sources[-1] < MAX_LIGHT
+    sources[inside] = np.where(dims[inside], 0, MAX_LIGHT)
+  sources[~loaded[rows]] = 0
+  level = np.clip(spread_light(sources, loss[rows], sources)[inside], 0, MAX_LIGHT)
+
+  changed = np.zeros(tiles.shape, dtype=bool)
+  changed[inside] = (level != old_level) & loaded[rows][inside]
+  inside_light = light[inside]
+  inside_light &= 0xFF ^ (MAX_LIGHT << shift)
+  inside_light |= level.astype(np.uint8) << shift
+  return changed
+
+# The parts of loaded chunk sections inside a box, as (chunk, section index, slices of the box, slices
+# of the section)
+def get_box_parts(chunks, x0: int, y0: int, z0: int, x1: int, y1: int, z1: int):
+  for cx in range(x0 >> 4, ((x1 - 1) >> 4) + 1):
+    for cz in range(z0 >> 4, ((z1 - 1) >> 4) + 1):
+      chunk = chunks.get((cx, cz))
+      if chunk is None:
+        continue
+      ax0 = max(x0, cx * 16)
+      ax1 = min(x1, cx * 16 + 16)
+      az0 = max(z0, cz * 16)
+      az1 = min(z1, cz * 16 + 16)
+      for i in range(y0 >> 4, ((y1 - 1) >> 4) + 1):
+        ay0 = max(y0, i * 16)
+        ay1 = min(y1, i * 16 + 16)
+        box_part = (slice(ay0 - y0, ay1 - y0), slice(az0 - z0, az1 - z0), slice(ax0 - x0, ax1 - x0))
+        section_part = (slice(ay0 - i * 16, ay1 - i * 16), slice(az0 - cz * 16, az1 - cz * 16), slice(ax0 - cx * 16, ax1 - cx * 16))
+        yield chunk, i, box_part, section_part
+
+# Keeps light up to date as tiles change and chunks load, with breadth first add and remove queues
+# that cross chunk borders. Updates only run in process(), a limited number of steps at a time. Once a
+# batch ran, chunks are marked dirty where a tile's light ended up different from before the batch and
+# a tile next to it is drawn against it.
+#
+# Edits aren't queued as they happen. Breaking a lamp would clear and fill in its whole reach again for
+# every edit, so the tiles edited since the last batch are kept and handled together at its start:
+# block light is worked out again over boxes around them, and skylight too unless the edits are few
+# enough for the queues to get through in the batch.
+class LightEngine:
+  # Queue steps a sky edit takes per tile of the open column under it, roughly, as the column's light
+  # is taken away and filled in again from the sides
+  SKY_EDIT_STEPS = 7
+
+  def __init__(self, world):
+    self.world = world
+    self.__add_queue: deque[tuple[int, int, int, int]] = deque()
+    self.__remove_queue: deque[tuple[int, int, int, int, int]] = deque()
+    # Tiles next to removed light that are lit from elsewhere, spread again once the removals are done
+    self.__relight: set[tuple[int, int, int, int]] = set()
+    # Packed light of every tile changed in the batch going on, from before the batch
+    self.__changed: dict[tuple[int, int, int], int] = {}
+    # Tiles whose opacity changed since the last batch, with their opacity from before
+    self.__sky_edits: dict[tuple[int, int, int], int] = {}
+    # Tiles whose block light or that of the tiles around them may have changed since the last batch
+    self.__block_edits: set[tuple[int, int, int]] = set()
+
+  @property
+  def pending_count(self) -> int:
+    return len(self.__add_queue) + len(self.__remove_queue) + len(self.__relight) + len(self.__sky_edits) + len(self.__block_edits)
+
+  # Sky and block light a tile letting light through as much as opacity gets from its neighbours
+  def __get_neighbour_light(self, x: int, y: int, z: int, opacity: int) -> tuple[int, int]:
+    if opacity >= MAX_LIGHT:
+      return 0, 0
+    chunks = self.world.chunks
+    loss = max(opacity, 1)
+    sky = 0
+    block = 0
+    for dx, dy, dz in NEIGHBOURS:
+      ny = y + dy
+      if ny < 0 or ny >= CHUNK_HEIGHT:
+        continue
+      chunk = chunks.get(((x + dx) >> 4, (z + dz) >> 4))
+      if chunk is None:
+        continue
+      packed = chunk.light.get((x + dx) & 15, ny, (z + dz) & 15)
+      neighbour_sky = (packed >> SKY_SHIFT) & MAX_LIGHT
+      # Skylight comes down columns without fading
+      if dy == 1 and neighbour_sky == MAX_LIGHT and opacity == 0:
+        sky = MAX_LIGHT
+      else:
+        sky = max(sky, neighbour_sky - loss)
+      block = max(block, ((packed >> BLOCK_SHIFT) & MAX_LIGHT) - loss)
+    return sky, block
+
+  def on_tile_changed(self, x: int, y: int, z: int, old_tile: int, new_tile: int):
+    chunk = self.world.chunks.get((x >> 4, z >> 4))
+    if chunk is None:
+      return
+    old_opacity = OPACITY_IDS[old_tile]
+    new_opacity = OPACITY_IDS[new_tile]
+    old_emission = EMISSION_IDS[old_tile]
+    new_emission = EMISSION_IDS[new_tile]
+    if old_opacity == new_opacity and old_emission == new_emission:
+      return
+
+    if old_opacity != new_opacity:
+      self.__sky_edits.setdefault((x, y, z), old_opacity)
+
+    # Block light only changes around emitters and where it was or can now get in
+    block = (chunk.light.get(x & 15, y, z & 15) >> BLOCK_SHIFT) & MAX_LIGHT
+    if old_emission > 0 or new_emission > 0 or (block > 0 and new_opacity > old_opacity):
+      self.__block_edits.add((x, y, z))
+    elif new_opacity < old_opacity and self.__get_neighbour_light(x, y, z, new_opacity)[1] > block:
+      self.__block_edits.add((x, y, z))
+
+  # Queues the skylight changes of a tile whose opacity went from old_opacity to new_opacity
+  def __queue_sky_edit(self, chunk, x: int, y: int, z: int, old_opacity: int, new_opacity: int):
+    lx = x & 15
+    lz = z & 15
+    old_packed = chunk.light.get(lx, y, lz)
+    sky = (old_packed >> SKY_SHIFT) & MAX_LIGHT
+    if sky > 0 and new_opacity > old_opacity:
+      self.__remove_queue.append((x, y, z, SKY_SHIFT, sky))
+      sky = 0
+
+    # Light around the tile can now get further in. It's enough to light the tile from its neighbours
+    # and spread that, light next to it that doesn't reach in doesn't change.
+    if new_opacity < old_opacity:
+      neighbour_sky = self.__get_neighbour_light(x, y, z, new_opacity)[0]
+      if neighbour_sky > sky:
+        sky = neighbour_sky
+        self.__add_queue.append((x, y, z, SKY_SHIFT))
+
+    packed = (old_packed & ~(MAX_LIGHT << SKY_SHIFT)) | (sky << SKY_SHIFT)
+    if packed != old_packed:
+      self.__changed.setdefault((x, y, z), old_packed)
+      chunk.light.set(lx, y, lz, packed)
+
+  # Sky edits that the queues get through in max_steps are queued. Returns the rest, for bigger
+  # batches like lamps placed in the air, which shade the whole column under them, as edits for
+  # get_relight_boxes.
+  def __process_sky_edits(self, max_steps: int) -> list[tuple[int, int, int, int, int]]:
+    chunks = self.world.chunks
+    edits = []
+    steps = 0
+    for (x, y, z), old_opacity in self.__sky_edits.items():
+      chunk = chunks.get((x >> 4, z >> 4))
+      if chunk is None:
+        continue
+      sections = chunk.sections
+      lx = x & 15
+      lz = z & 15
+      new_opacity = OPACITY_IDS[sections.get(lx, y, lz)]
+      if new_opacity == old_opacity:
+        continue
+      # Full skylight coming through the tile falls down the open column under it without fading,
+      # anything less fades out within reach of the tile
+      bottom = y
+      if y + 1 == CHUNK_HEIGHT or (chunk.light.get(lx, y + 1, lz) >> SKY_SHIFT) & MAX_LIGHT == MAX_LIGHT:
+        while bottom > 0 and OPACITY_IDS[sections.get(lx, bottom - 1, lz)] == 0:
+          bottom -= 1
+      edits.append((chunk, x, y, z, bottom, old_opacity, new_opacity))
+      steps += (y - bottom + 1) * LightEngine.SKY_EDIT_STEPS
+    self.__sky_edits.clear()
+
+    if steps > max_steps:
+      return [(x, y, z, bottom, SKY_SHIFT) for _, x, y, z, bottom, _, _ in edits]
+    for chunk, x, y, z, _, old_opacity, new_opacity in edits:
+      self.__queue_sky_edit(chunk, x, y, z, old_opacity, new_opacity)
+    return []
+
+  # Queues the border tiles of a newly loaded chunk and its neighbours wherever light can cross over
+  def add_chunk(self, chunk):
+    light = chunk.light.to_array().astype(np.int16)
+    loss = np.maximum(LIGHT_OPACITY[chunk.get_blocks_array()], 1)
+
+    for ox, oz in ((-1, 0), (1, 0), (0, -1), (0, 1)):
+      neighbour = self.world.chunks.get((chunk.x + ox, chunk.z + oz))
+      if neighbour is None:
+        continue
+      neighbour_light = neighbour.light.to_array().astype(np.int16)
+      neighbour_loss = np.maximum(LIGHT_OPACITY[neighbour.get_blocks_array()], 1)
+
+      # Border slabs indexed [y, along the border]
+      if ox != 0:
+        border = (slice(None), slice(None), 0 if ox == -1 else 15)
+        neighbour_border = (slice(None), slice(None), 15 if ox == -1 else 0)
+      else:
+        border = (slice(None), 0 if oz == -1 else 15, slice(None))
+        neighbour_border = (slice(None), 15 if oz == -1 else 0, slice(None))
+
+      for shift in (SKY_SHIFT, BLOCK_SHIFT):
+        ours = (light[border] >> shift) & MAX_LIGHT
+        theirs = (neighbour_light[neighbour_border] >> shift) & MAX_LIGHT
+        for source, target_loss, source_chunk, source_border in ((ours, neighbour_loss[neighbour_border], chunk, border), (theirs, loss[border], neighbour, neighbour_border)):
+          target = theirs if source is ours else ours
+          ys, js = np.nonzero(source - target_loss > target)
+          for y, j in zip(ys.tolist(), js.tolist()):
+            lx = source_border[2] if ox != 0 else j
+            lz = j if ox != 0 else source_border[1]
+            self.__add_queue.append((source_chunk.x * 16 + lx, y, source_chunk.z * 16 + lz, shift))
+
+  # Light of a box worked out again over the rows each kind of light of the edits in it reaches. The
+  # tiles around the box shine in as they are lit now, the edits of the batch can't have reached them.
+  # Chunks are marked dirty where a tile next to one whose light changed is drawn.
+  def __relight_box(self, box: list[int], edits: list[tuple[int, int, int, int, int]]):
+    chunks = self.world.chunks
+    x0, y0, z0, x1, y1, z1 = box
+    py0 = max(y0 - 1, 0)
+    py1 = min(y1 + 1, CHUNK_HEIGHT)
+    shape = (py1 - py0, z1 - z0 + 2, x1 - x0 + 2)
+    tiles = np.zeros(shape, dtype=np.uint8)
+    light = np.zeros(shape, dtype=np.uint8)
+    loaded = np.zeros(shape, dtype=bool)
+    for chunk, i, box_part, section_part in get_box_parts(chunks, x0 - 1, py0, z0 - 1, x1 + 1, py1, z1 + 1):
+      loaded[box_part] = True
+      section = chunk.sections.get_section_array(i)
+      if section is not None:
+        tiles[box_part] = section[section_part]
+      section = chunk.light.get_section_array(i)
+      light[box_part] = chunk.light.fill if section is None else section[section_part]
+
+    loss = np.take(RELIGHT_LOSS, tiles)
+    loss[~loaded] = MAX_LIGHT + 1
+    changed = np.zeros(shape, dtype=bool)
+    for shift in (SKY_SHIFT, BLOCK_SHIFT):
+      bottoms = [bottom for _, _, _, bottom, edit_shift in edits if edit_shift == shift]
+      if len(bottoms) == 0:
+        continue
+      top = max(y for _, y, _, _, edit_shift in edits if edit_shift == shift)
+      rows = slice(max(min(bottoms) - RELIGHT_REACH, 0) - py0, min(top + RELIGHT_REACH + 1, CHUNK_HEIGHT) - py0)
+      changed_rows = relight_rows(shift, tiles, light, loss, loaded, rows.start, rows.stop)
+      changed[max(rows.start - 1, 0):rows.stop + 1] |= changed_rows
+    if not changed.any():
+      return
+
+    for chunk, i, box_part, section_part in get_box_parts(chunks, x0 - 1, py0, z0 - 1, x1 + 1, py1, z1 + 1):
+      if changed[box_part].any():
+        chunk.light.make_section_array(i)[section_part] = light[box_part]
+
+    near = changed.copy()
+    near[1:] |= changed[:-1]
+    near[:-1] |= changed[1:]
+    near[:, 1:] |= changed[:, :-1]
+    near[:, :-1] |= changed[:, 1:]
+    near[:, :, 1:] |= changed[:, :, :-1]
+    near[:, :, :-1] |= changed[:, :, 1:]
+    near &= tiles != 0
+    # Whether a tile drawn next to changed light is in each column of the box
+    near_columns = near.any(axis=0)
+    for cx in range((x0 - 1) >> 4, (x1 >> 4) + 1):
+      for cz in range((z0 - 1) >> 4, (z1 >> 4) + 1):
+        chunk = chunks.get((cx, cz))
+        if chunk is None or chunk.dirty:
+          continue
+        columns = near_columns[max(cz * 16 - z0 + 1, 0):max(cz * 16 - z0 + 17, 0), max(cx * 16 - x0 + 1, 0):max(cx * 16 - x0 + 17, 0)]
+        if columns.any():
+          chunk.make_dirty()
+
+  # Runs the edits since the last batch and up to max_steps queued updates, removals first, and returns
+  # how many ran, an edit counting as one step. The queues are the hot loop of lighting, so sections are
+  # read straight from their arrays, and tiles away from chunk borders look their neighbours up in their
+  # own chunk.
+  def process(self, max_steps: int) -> int:
+    steps = len(self.__sky_edits) + len(self.__block_edits)
+    edits = []
+    if len(self.__sky_edits) > 0:
+      edits = self.__process_sky_edits(max_steps - steps - len(self.__remove_queue) - len(self.__add_queue))
+    edits += [(x, y, z, y, BLOCK_SHIFT) for x, y, z in self.__block_edits]
+    self.__block_edits.clear()
+    for box, box_edits in get_relight_boxes(edits):
+      self.__relight_box(box, box_edits)
+
+    chunks = self.world.chunks
+    remove_queue = self.__remove_queue
+    add_queue = self.__add_queue
+    relight = self.__relight
+    changed = self.__changed
+
+    while len(remove_queue) > 0 and steps < max_steps:
+      steps += 1
+      x, y, z, shift, level = remove_queue.popleft()
+      own_chunk = chunks.get((x >> 4, z >> 4))
+      if own_chunk is None:
+        continue
+      inside = 0 < (x & 15) < 15 and 0 < (z & 15) < 15
+      # A tile that blocks light, like the one just placed, can't be lit again from around it
+      lit_again = OPACITY_IDS[own_chunk.sections.get(x & 15, y, z & 15)] < MAX_LIGHT
+      for dx, dy, dz in NEIGHBOURS:
+        ny = y + dy
+        if ny < 0 or ny >= CHUNK_HEIGHT:
+          continue
+        nx = x + dx
+        nz = z + dz
+        chunk = own_chunk if inside else chunks.get((nx >> 4, nz >> 4))
+        if chunk is None:
+          continue
+        section = chunk.light.sections[ny >> 4]
+        index = ((ny & 15) * 16 + (nz & 15)) * 16 + (nx & 15)
+        packed = chunk.light.fill if section is None else section[index]
+        neighbour_level = (packed >> shift) & MAX_LIGHT
+        if neighbour_level == 0:
+          continue
+
+        # Lit by the removed light, straight down columns skylight doesn't fade
+        if neighbour_level < level or (shift == SKY_SHIFT and dy == -1 and level == MAX_LIGHT):
+          changed.setdefault((nx, ny, nz), packed)
+          packed &= ~(MAX_LIGHT << shift)
+          remove_queue.append((nx, ny, nz, shift, neighbour_level))
+          chunk.light.set(nx & 15, ny, nz & 15, packed)
+        elif lit_again:
+          # Lit from somewhere else, which has to fill the removed area back in
+          relight.add((nx, ny, nz, shift))
+
+    if len(remove_queue) == 0 and len(relight) > 0:
+      add_queue.extend(relight)
+      relight.clear()
+
+    while len(remove_queue) == 0 and len(add_queue) > 0 and steps < max_steps:
+      steps += 1
+      x, y, z, shift = add_queue.popleft()
+      own_chunk = chunks.get((x >> 4, z >> 4))
+      if own_chunk is None:
+        continue
+      level = (own_chunk.light.get(x & 15, y, z & 15) >> shift) & MAX_LIGHT
+      if level <= 1:
+        continue
+
+      inside = 0 < (x & 15) < 15 and 0 < (z & 15) < 15
+      for dx, dy, dz in NEIGHBOURS:
+        ny = y + dy
+        if ny < 0 or ny >= CHUNK_HEIGHT:
+          continue
+        nx = x + dx
+        nz = z + dz
+        chunk = own_chunk if inside else chunks.get((nx >> 4, nz >> 4))
+        if chunk is None:
+          continue
+        index = ((ny & 15) * 16 + (nz & 15)) * 16 + (nx & 15)
+        section = chunk.sections.sections[ny >> 4]
+        opacity = 0 if section is None else OPACITY_IDS[section[index]]
+        if opacity >= MAX_LIGHT:
+          continue
+
+        new_level = level - (opacity if opacity > 1 else 1)
+        if shift == SKY_SHIFT and dy == -1 and level == MAX_LIGHT and opacity == 0:
+          new_level = MAX_LIGHT
+        section = chunk.light.sections[ny >> 4]
+        packed = chunk.light.fill if section is None else section[index]
+        if new_level > (packed >> shift) & MAX_LIGHT:
+          changed.setdefault((nx, ny, nz), packed)
+          chunk.light.set(nx & 15, ny, nz & 15, (packed & ~(MAX_LIGHT << shift)) | (new_level << shift))
+          add_queue.append((nx, ny, nz, shift))
+
+    self.__make_changed_dirty()
+    return steps
+
+  # Meshes use a tile's light for the faces of the tiles next to it, so a chunk only needs rebuilding
+  # where a tile whose light changed has a tile of the chunk next to it. Tiles that ended up as lit as
+  # they were, like a column going dark and being lit from the side again, don't count.
+  def __make_changed_dirty(self):
+    chunks = self.world.chunks
+    for (x, y, z), packed in self.__changed.items():
+      chunk = chunks.get((x >> 4, z >> 4))
+      if chunk is None:
+        continue
+      # Tiles away from the border only have neighbours in their own chunk
+      inside = 0 < (x & 15) < 15 and 0 < (z & 15) < 15
+      if (inside and chunk.dirty) or chunk.light.get(x & 15, y, z & 15) == packed:
+        continue
+      for dx, dy, dz in NEIGHBOURS:
+        ny = y + dy
+        if ny < 0 or ny >= CHUNK_HEIGHT:
+          continue
+        nx = x + dx
+        nz = z + dz
+        neighbour = chunk if inside else chunks.get((nx >> 4, nz >> 4))
+        if neighbour != None and not neighbour.dirty and neighbour.sections.get(nx & 15, ny, nz & 15) != 0:
+          neighbour.make_dirty()
+    self.__changed.clear()
+
+  def clear(self):
+    self.__add_queue.clear()
+    self.__remove_queue.clear()
+    self.__relight.clear()
+    self.__changed.clear()
+    self.__sky_edits.clear()
+    self.__block_edits.clear()
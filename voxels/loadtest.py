@@ -0,0 +1,148 @@
+import argparse
+import asyncio
+import math
+import random
+import time
+import numpy as np
+from constants import *
+from server import Server
+from protocol import *
+
+# Run from the voxels folder: python loadtest.py [--clients N] [--seconds N] [--render-distance N]
+# Starts a server on loopback and connects simulated clients that walk around and change tiles.
+# Every client keeps its own copy of the chunks it was sent and applies the deltas to it, at the end
+# the copies are compared with the server's world.
+
+class SimulatedClient:
+  # Seconds between player updates and between tile changes
+  STATE_INTERVAL = 0.05
+  EDIT_INTERVAL = 0.25
+
+  def __init__(self, name: str, host: str, port: int, render_distance: int, seed: int):
+    self.name = name
+    self.host = host
+    self.port = port
+    self.render_distance = render_distance
+    self.rng = random.Random(seed)
+    self.chunks: dict[tuple[int, int], np.ndarray] = {}
+    self.levels: dict[tuple[int, int], np.ndarray] = {}
+    self.bytes_received = 0
+    self.bytes_sent = 0
+    self.chunk_messages = 0
+    self.delta_messages = 0
+    self.deltas = 0
+    self.ticks = 0
+    self.__spawn = None
+    self.__writer: asyncio.StreamWriter | None = None
+    self.__receiving: asyncio.Task | None = None
+
+  def __send(self, data: bytes):
+    self.__writer.write(data)
+    self.bytes_sent += len(data)
+
+  async def connect(self):
+    reader, self.__writer = await asyncio.open_connection(self.host, self.port)
+    self.__send(encode_message(LOGIN, LOGIN_FORMAT.pack(self.render_distance) + self.name.encode("utf-8")))
+    self.__receiving = asyncio.create_task(self.__receive(reader))
+
+  # Stops sending and waits for the server to close the connection, so everything it sent is applied
+  async def disconnect(self):
+    self.__writer.write_eof()
+    await asyncio.wait_for(self.__receiving, 5.0)
+    self.__writer.close()
+
+  # Walks in a circle around the spawn point, breaking and placing tiles around it
+  async def play(self, duration: float):
+    start_time = time.perf_counter()
+    last_edit = start_time
+    angle = self.rng.uniform(0, math.pi * 2)
+    radius = self.rng.uniform(8, 40)
+    while time.perf_counter() - start_time < duration:
+      await asyncio.sleep(SimulatedClient.STATE_INTERVAL)
+      if self.__spawn == None:
+        continue
+      sx, sy, sz = self.__spawn
+      angle += 0.02
+      x = sx + math.cos(angle) * radius
+      z = sz + math.sin(angle) * radius
+      self.__send(encode_message(PLAYER_STATE, PLAYER_STATE_FORMAT.pack(x, sy, z, 0.0, math.degrees(angle))))
+
+      now = time.perf_counter()
+      if now - last_edit >= SimulatedClient.EDIT_INTERVAL:
+        last_edit = now
+        tile_id = self.rng.choice((0, 1, 3, 7))
+        self.__send(encode_message(SET_TILE, SET_TILE_FORMAT.pack(math.floor(x) + self.rng.randint(-3, 3), self.rng.randint(40, 70), math.floor(z) + self.rng.randint(-3, 3), tile_id)))
+
+  async def __receive(self, reader: asyncio.StreamReader):
+    while True:
+      message = await read_message(reader)
+      if message is None:
+        return
+      message_type, payload = message
+      self.bytes_received += HEADER.size + len(payload)
+      if message_type == CHUNK:
+        cx, cz, blocks, fluid = decode_chunk(payload)
+        self.chunks[(cx, cz)] = np.frombuffer(blocks, dtype=np.uint8).copy()
+        self.levels[(cx, cz)] = np.frombuffer(fluid, dtype=np.uint8).copy() if fluid != None else np.zeros(len(blocks), dtype=np.uint8)
+        self.chunk_messages += 1
+      elif message_type == BLOCK_DELTAS:
+        cx, cz, indices, tiles, levels = decode_block_deltas(payload)
+        self.chunks[(cx, cz)][indices] = tiles
+        self.levels[(cx, cz)][indices] = levels
+        self.delta_messages += 1
+        self.deltas += len(indices)
+      elif message_type == UNLOAD_CHUNK:
+        key = CHUNK_KEY_FORMAT.unpack_from(payload)
+        del self.chunks[key]
+        del self.levels[key]
+      elif message_type == TICK:
+        self.ticks += 1
+      elif message_type == LOGIN_OK:
+        self.__spawn = LOGIN_OK_FORMAT.unpack_from(payload)[:3]
+
+  # Chunks whose tiles or flow levels differ from the server's
+  def count_mismatches(self, world) -> int:
+    mismatches = 0
+    for key, blocks in self.chunks.items():
+      chunk = world.chunks.get(key)
+      if chunk is None or not np.array_equal(chunk.get_blocks_array().ravel(), blocks) or not np.array_equal(chunk.fluid.to_array().ravel(), self.levels[key]):
+        mismatches += 1
+    return mismatches
+
+async def run_load_test(client_count: int, seconds: float, render_distance: int):
+  server = Server(None, render_distance)
+  start_time = time.perf_counter()
+  port = await server.start("127.0.0.1", 0)
+  print(f"Server ready in {time.perf_counter() - start_time:.2f} s, {client_count} clients for {seconds:.0f} s")
+
+  clients = [SimulatedClient(f"client{i}", "127.0.0.1", port, render_distance, i) for i in range(client_count)]
+  await asyncio.gather(*(client.connect() for client in clients))
+  run_start = time.perf_counter()
+  running = asyncio.create_task(server.run())
+  await asyncio.gather(*(client.play(seconds) for client in clients))
+  # A few more ticks to send out the last changes
+  await asyncio.sleep(0.25)
+  server.stop()
+  await running
+  run_time = time.perf_counter() - run_start
+  connections = {connection.name: connection for connection in server.clients}
+  await asyncio.gather(*(client.disconnect() for client in clients))
+
+  tick_times = np.array(server.tick_times) * 1000
+  print(f"Server: {server.tick_count} ticks, {server.tick_count / run_time:.1f} ticks/s, tick time mean {tick_times.mean():.2f} ms, p50 {np.percentile(tick_times, 50):.2f} ms, p99 {np.percentile(tick_times, 99):.2f} ms, {len(server.world.chunks)} chunks loaded")
+  print(f"  {tick_times.mean() / client_count:.3f} ms of tick time per client on average")
+  for client in clients:
+    connection = connections[client.name]
+    print(f"  {client.name}: down {client.bytes_received / seconds / 1024:7.1f} KiB/s, up {client.bytes_sent / seconds / 1024:5.2f} KiB/s, "
+          f"{connection.send_time / server.tick_count * 1000:.3f} ms/tick streaming, {client.chunk_messages} chunks, "
+          f"{client.deltas} deltas in {client.delta_messages} messages, {client.ticks} ticks, "
+          f"{len(client.chunks)} chunks held, {client.count_mismatches(server.world)} out of sync")
+  await server.close()
+
+if __name__ == "__main__":
+  parser = argparse.ArgumentParser(description="Runs a server on loopback with simulated clients")
+  parser.add_argument("--clients", type=int, default=4)
+  parser.add_argument("--seconds", type=float, default=10.0)
+  parser.add_argument("--render-distance", type=int, default=4)
+  args = parser.parse_args()
+  asyncio.run(run_load_test(args.clients, args.seconds, args.render_distance))
@@ -1,28 +1,45 @@
 from __future__ import annotations
+from startup import StartupProfile
+STARTUP_PROFILE = StartupProfile()
 import glfw
 from OpenGL.GL import *
 from OpenGL.GLU import *
 import math
-from utils import HitResult, bresenham, VertexDrawer, JSONWithCommentsDecoder
+import argparse
+from utils import HitResult, JSONWithCommentsDecoder
+from render_utils import VertexDrawer
+from sprite_batch import SpriteBatch, BLEND_NONE, BLEND_ALPHA, BLEND_INVERT
+from raycast import raycast, get_placement
 from textures import TextureManager
 from tiles import BLOCK_TYPES
 from window import GameWindow
 import os
-os.environ['PYGAME_HIDE_SUPPORT_PROMPT'] = "hide"
-import pygame
-from player import Player
+from sounds import SoundManager
+from resources import load_json
+from profiler import PROFILER
+import datetime
+from player import Player, PlayerInput
 from menus import *
 from constants import *
 from font import Font
 from world import World
+from world_renderer import WorldRenderer
 
 class GameSettings:
+  # Values the settings menu cycles through, values from settings.txt are moved to the nearest one
+  FOG_DISTANCES = [1, 2, 3]
+  RENDER_DISTANCES = [2, 4, 6, 8]
+
   def __init__(self):
     self.fog_distance = 1
     self.show_block_preview = True
     self.sound_enabled = True
     self.vsync = True
     self.language = "en_us"
+    self.greedy_meshing = False
+    self.render_distance = 4
+    # Mipmaps for the tile textures, sampling far away tiles gets cheaper and stops shimmering
+    self.mipmaps = True
 
   def load(self):
     try:
@@ -35,7 +52,7 @@ class GameSettings:
             continue
 
           if option_ln[0] == "fog_distance" and option_ln[1].isnumeric():
-            self.fog_distance = int(option_ln[1])
+            self.fog_distance = GameSettings.nearest(int(option_ln[1]), GameSettings.FOG_DISTANCES)
 
           if option_ln[0] == "show_block_preview":
             self.show_block_preview = option_ln[1] == "True"
@@ -46,25 +63,58 @@ class GameSettings:
           if option_ln[0] == "sound":
             self.sound_enabled = option_ln[1] == "True"
           
+          if option_ln[0] == "render_distance" and option_ln[1].isnumeric():
+            self.render_distance = GameSettings.nearest(int(option_ln[1]), GameSettings.RENDER_DISTANCES)
+
+          if option_ln[0] == "greedy_meshing":
+            self.greedy_meshing = option_ln[1] == "True"
+
+          if option_ln[0] == "mipmaps":
+            self.mipmaps = option_ln[1] == "True"
+
           if option_ln[0] == "language":
             self.language = option_ln[1] if ["en_us", "pt_pt"].count(option_ln[1]) > 0 else "en_us"
     except Exception:
       pass
+
+  # The value in values closest to value, the smaller one on a tie
+  @staticmethod
+  def nearest(value: int, values: list[int]) -> int:
+    return min(values, key=lambda option: (abs(option - value), option))
   
   def save(self):
     with open("settings.txt", "w") as f:
       f.write(f"vsync:{self.vsync}\n")
       f.write(f"fog_distance:{self.fog_distance}\n")
+      f.write(f"render_distance:{self.render_distance}\n")
       f.write(f"show_block_preview:{self.show_block_preview}\n")
       f.write(f"sound:{self.sound_enabled}\n")
+      f.write(f"greedy_meshing:{self.greedy_meshing}\n")
+      f.write(f"mipmaps:{self.mipmaps}\n")
       f.write(f"language:{self.language}")
 
 class Game:
-  def __init__(self):
+  TICKS_PER_SECOND = 60
+  # Ticks run in one frame at most, after a long stall the rest are dropped rather than all run at once
+  MAX_TICKS_PER_FRAME = 10
+  # Blocks away the player can pick tiles from
+  REACH = 7
+  # Size of the F3 frame time graph, it shows a frame per pixel and scale pixels per millisecond
+  FRAME_GRAPH_WIDTH = 120
+  FRAME_GRAPH_HEIGHT = 40
+  FRAME_GRAPH_SCALE = 1.0
+
+  # server_address is (host, port) to play on a server.py server instead of the local save
+  def __init__(self, server_address: tuple[str, int] | None = None):
+    self.server_address = server_address
     self.show_debug = False
     self.window = GameWindow(self, 700, 450)
     self.settings = GameSettings()
     self.texture_manager = TextureManager()
+    self.sprite_batch = SpriteBatch(self.texture_manager)
+    # Draw calls and quads of the GUI in the last frame
+    self.gui_draw_calls = 0
+    self.gui_quad_count = 0
     self.current_fps = 0
     self.mouse = {
       'x': 0,
@@ -81,14 +131,14 @@ class Game:
     self.window.cursor_pos_func(self.on_cursor_pos)
     self.window.key_func(self.on_key)
     self.world: World | None = None
+    self.world_renderer: WorldRenderer | None = None
     self.hit_result: HitResult | None = None
     self.font = Font(self)
     self.selected_tile = 1
     self.chunk_updates = 0
-    self.workaround_hit_face = 0
-    self.click_sound = pygame.mixer.Sound("res/sounds/click.mp3")
-    self.block_sound = pygame.mixer.Sound("res/sounds/block.mp3")
-    self.block_sound.set_volume(0.7)
+    # Camera position, rotation and world tile version the hit result was found for
+    self.__hit_key = None
+    self.sounds = SoundManager()
     self.translations = {}
 
   @property
@@ -106,8 +156,7 @@ class Game:
       self.__menu.on_display()
 
   def load_translations(self):
-    with open(f"res/languages/{self.settings.language}.json", "r", encoding="utf-8") as f:
-      self.translations = json.load(f)
+    self.translations = load_json(f"languages/{self.settings.language}.json")
 
   def translate_key(self, key: str, *args: object):
     translation: str = key if self.translations.get(key) == None else self.translations.get(key) 
@@ -116,15 +165,30 @@ class Game:
     except Exception:
       return translation
 
-  def play_sound(self, sound: pygame.mixer.Sound):
+  def play_sound(self, name: str):
     if self.settings.sound_enabled:
-      pygame.mixer.Sound.play(sound)
+      self.sounds.play(name)
 
   def start_world(self):
+    if self.server_address != None:
+      # Only needed to play on a server
+      from client import ClientWorld, ServerConnection
+      connection = ServerConnection(self.server_address[0], self.server_address[1], "Player", self.settings.render_distance)
+      self.world = ClientWorld(self, connection)
+    else:
+      self.world = World(self, os.path.join("saves", "world"))
+    self.world_renderer = WorldRenderer(self.world, self)
+    self.__hit_key = None
     self.menu = LoadingTerrainMenu(self)
 
-  def load_world(self):
-    self.world = World(self)
+  def close_world(self):
+    self.world_renderer.dispose()
+    self.world.dispose()
+    self.world_renderer = None
+    self.world = None
+    self.player = None
+
+  def enter_world(self):
     self.grab_mouse()
     self.menu = None
 
@@ -153,11 +217,13 @@ class Game:
 
     if action == glfw.PRESS and button == 0 and self.menu == None and self.hit_result != None:
       self.world.set_tile(self.hit_result.bx, self.hit_result.by, self.hit_result.bz, 0)
-      self.play_sound(self.block_sound)
+      self.play_sound("block")
     
     if action == glfw.PRESS and button == 1 and self.menu == None and self.hit_result != None:
-      self.world.set_tile(self.hit_result.bx, self.hit_result.by + 1, self.hit_result.bz, self.selected_tile)
-      self.play_sound(self.block_sound)
+      placement = get_placement(self.hit_result)
+      if placement != None:
+        self.world.set_tile(placement[0], placement[1], placement[2], self.selected_tile)
+        self.play_sound("block")
   
   def on_cursor_pos(self, xpos, ypos):
     self.mouse['dx'] = xpos - self.mouse['x']
@@ -174,7 +240,17 @@ class Game:
       self.ungrab_mouse()
 
     if action == glfw.PRESS and key == glfw.KEY_F7:
-      self.texture_manager.reload_textures()
+      changed = self.texture_manager.reload_textures()
+      if DEBUG_PRINTS:
+        print(f"Reloaded {changed} changed texture files")
+
+    if action == glfw.PRESS and key == glfw.KEY_F8:
+      if PROFILER.is_tracing():
+        path = os.path.join("traces", f"trace-{datetime.datetime.now():%Y%m%d-%H%M%S}.json")
+        event_count = PROFILER.stop_trace(path)
+        print(f"Wrote {event_count} trace events to {path}")
+      else:
+        PROFILER.start_trace()
 
     if action == glfw.PRESS and key == glfw.KEY_F and self.menu == None:
       self.settings.fog_distance += 1
@@ -184,11 +260,6 @@ class Game:
     if action == glfw.PRESS and key == glfw.KEY_F3:
       self.show_debug = not self.show_debug
 
-    if action == glfw.PRESS and self.menu == None and key == glfw.KEY_N:
-      self.workaround_hit_face += 1
-      if self.workaround_hit_face > 5:
-        self.workaround_hit_face = 0
-
     if action == glfw.PRESS and (key >= glfw.KEY_1 and key <= glfw.KEY_9):
       self.selected_tile = key - glfw.KEY_0
 
@@ -203,22 +274,53 @@ class Game:
   def get_camera_pos(self):
     return [self.player.x, self.player.y, self.player.z]
 
-  def run(self):
+  # The tile the player is looking at, only searched for again when the camera or the world changed
+  def update_hit_result(self):
+    hit_key = (self.player.x, self.player.y, self.player.z, self.player.rot_x, self.player.rot_y, self.world.tile_version)
+    if hit_key == self.__hit_key:
+      return
+    self.__hit_key = hit_key
+
+    rv0 = math.cos(-self.player.rot_y * (math.pi / 180.0) - math.pi)
+    rv1 = math.sin(-self.player.rot_y * (math.pi / 180.0) - math.pi)
+    rv2 = -math.cos(-self.player.rot_x * math.pi / 180.0)
+    rv3 = -math.sin(-self.player.rot_x * math.pi / 180.0)
+    direction = (-rv1 * rv2, -rv3, -rv0 * rv2)
+    with PROFILER.scope("raycast"):
+      self.hit_result = raycast(self.world.cursor(), self.get_camera_pos(), direction, Game.REACH)
+    PROFILER.count("raycasts")
+
+  # profile is the startup profile to print once the first frame is shown, if any
+  def run(self, profile: StartupProfile | None = None):
     self.settings.load()
-    self.load_translations()
-    self.window.init("Voxels")
-    self.texture_manager.load('grass.png')
-    self.texture_manager.load('gui.png')
+    # Images and sounds load on other threads while the window opens
+    self.sounds.load({"click": ("res/sounds/click.mp3", 1.0), "block": ("res/sounds/block.mp3", 0.7)})
+    self.texture_manager.load('grass.png', mipmaps=self.settings.mipmaps)
+    self.texture_manager.load_tiles('grass.png', {txr for tile_type in BLOCK_TYPES.values() for txr in tile_type.textures()}, mipmaps=self.settings.mipmaps)
+    self.texture_manager.load_gui('gui.png')
+    self.texture_manager.load_gui('not_bedrock.png')
+    # Drawn tiled or straight from a vertex buffer, so not in the GUI atlas
     self.texture_manager.load('bg.png')
     self.texture_manager.load('prof.png')
-    self.texture_manager.load('not_bedrock.png')
+    self.load_translations()
+    if profile != None:
+      profile.mark("settings")
+    self.window.init("Voxels")
+    if profile != None:
+      profile.mark("window")
+    self.texture_manager.upload_pending()
+    if profile != None:
+      profile.mark("textures")
     self.menu = MainMenu(self)
+    if profile != None:
+      profile.mark("main menu")
 
     glClearColor(0.239, 0.686, 0.807, 1.0)
     last_time = glfw.get_time()
     frame_counter = 0
     tick_last_time = glfw.get_time()
     tick_delta = 0
+    PROFILER.reset_frame_start()
 
     while self.running:
       if self.window.should_close():
@@ -227,12 +329,14 @@ class Game:
       tick_now = glfw.get_time()
       tick_passed_sec = tick_now - tick_last_time
       tick_last_time = tick_now
-      tick_delta += tick_passed_sec * 60 / 1.0
+      tick_delta += tick_passed_sec * Game.TICKS_PER_SECOND
       ticks = int(tick_delta)
       tick_delta -= ticks
+      ticks = min(ticks, Game.MAX_TICKS_PER_FRAME)
 
       for _ in range(0, ticks):
-        self.tick()
+        with PROFILER.scope("tick"):
+          self.tick()
 
       dx = self.mouse['dx']
       dy = self.mouse['dy']
@@ -243,9 +347,17 @@ class Game:
       
       glClear(GL_COLOR_BUFFER_BIT | GL_DEPTH_BUFFER_BIT)
 
-      self.render(tick_delta)
-      
-      self.window.update_frame()
+      with PROFILER.scope("render"):
+        self.render(tick_delta)
+
+      with PROFILER.scope("swap"):
+        self.window.update_frame()
+      PROFILER.end_frame()
+
+      if profile != None:
+        profile.mark("first frame")
+        profile.print_report([("sounds", self.sounds.load_time)] if self.sounds.is_loaded() else [])
+        profile = None
 
       frame_counter += 1
 
@@ -257,8 +369,10 @@ class Game:
 
     self.settings.save()
     if self.world != None:
-      self.world.dispose()
+      self.close_world()
+    self.sprite_batch.dispose()
     self.texture_manager.dispose()
+    self.sounds.dispose()
     glfw.terminate()
 
   def render(self, tick_delta: float):
@@ -283,23 +397,11 @@ class Game:
 
       glTranslatef(-player_x, -player_y, -player_z)
 
-      # idek
-      start_pos = self.get_camera_pos()
-      end_pos = self.get_camera_pos()
-      rv0 = math.cos(-self.player.rot_y * (math.pi / 180.0) - math.pi)
-      rv1 = math.sin(-self.player.rot_y * (math.pi / 180.0) - math.pi)
-      rv2 = -math.cos(-self.player.rot_x * math.pi / 180.0)
-      rv3 =-math.sin(-self.player.rot_x * math.pi / 180.0)
-
-      end_pos[0] -= rv1 * rv2 * 7
-      end_pos[1] -= rv3 * 7
-      end_pos[2] -= rv0 * rv2 * 7
-      #
-
-      self.hit_result = bresenham(self.world, start_pos, end_pos, lambda tile_id : BLOCK_TYPES[tile_id])
+      self.update_hit_result()
 
       self.texture_manager.get("grass.png").bind()
-      self.world.render()
+      with PROFILER.scope("world render"):
+        self.world_renderer.render()
 
       if self.hit_result != None:
         glDisable(GL_TEXTURE_2D)
@@ -351,6 +453,10 @@ class Game:
 
     glClear(GL_DEPTH_BUFFER_BIT)
 
+    with PROFILER.scope("gui"):
+      self.render_gui()
+
+  def render_gui(self):
     glMatrixMode(GL_PROJECTION)
     glLoadIdentity()
     glOrtho(0, self.window.scaled_width(), self.window.scaled_height(), 0, 1000.0, 3000.0)
@@ -361,14 +467,11 @@ class Game:
     glDisable(GL_DEPTH_TEST)
     glDisable(GL_CULL_FACE)
 
-    glEnable(GL_BLEND)
-    glBlendFunc(GL_ONE_MINUS_DST_COLOR, GL_ONE_MINUS_SRC_COLOR)
-    self.draw_texture("gui.png", self.window.scaled_width() / 2 - 8, self.window.scaled_height() / 2 - 8, 16, 16, 240, 0, 16, 16, 256, 256)
-    glBlendFunc(GL_SRC_ALPHA, GL_ONE_MINUS_SRC_ALPHA)
-    self.draw_texture("gui.png", self.window.scaled_width() / 2 - 91, self.window.scaled_height() - 22, 182, 22, 0, 0, 182, 22, 256, 256)
-    
+    self.draw_texture("gui.png", self.window.scaled_width() / 2 - 8, self.window.scaled_height() / 2 - 8, 16, 16, 240, 0, 16, 16, 256, 256, blend=BLEND_INVERT)
+    self.draw_texture("gui.png", self.window.scaled_width() / 2 - 91, self.window.scaled_height() - 22, 182, 22, 0, 0, 182, 22, 256, 256, blend=BLEND_ALPHA)
+
     self.texture_manager.get("grass.png").bind()
-    
+
     if self.settings.show_block_preview:
       glEnable(GL_CULL_FACE)
       glPushMatrix()
@@ -388,11 +491,9 @@ class Game:
 
     for i in range(0, 9):
       tile_txr = BLOCK_TYPES[i + 1].north_txr
-      self.draw_texture("grass.png", self.window.scaled_width() / 2 - 91 + 3 + i * 20, self.window.scaled_height() - 22 + 3, 16, 16, (tile_txr % 16) * 16, (tile_txr // 16) * 16, 16, 16, 256, 256)
-
-    self.draw_texture("gui.png", self.window.scaled_width() / 2 - 91 + (self.selected_tile - 1) * 20, self.window.scaled_height() - 22 - 1, 24, 24, 40, 22, 24, 24, 256, 256)
+      self.draw_texture("grass.png", self.window.scaled_width() / 2 - 91 + 3 + i * 20, self.window.scaled_height() - 22 + 3, 16, 16, (tile_txr % 16) * 16, (tile_txr // 16) * 16, 16, 16, 256, 256, blend=BLEND_ALPHA, layer=1)
 
-    glDisable(GL_BLEND)
+    self.draw_texture("gui.png", self.window.scaled_width() / 2 - 91 + (self.selected_tile - 1) * 20, self.window.scaled_height() - 22 - 1, 24, 24, 40, 22, 24, 24, 256, 256, blend=BLEND_ALPHA, layer=2)
 
     if self.world != None:
       self.font.draw_text(GAME_VERSION, 1, 1, 0xFFFFFF, 0)
@@ -403,87 +504,98 @@ class Game:
         self.font.draw_text(f"{'Y: {:.4f}'.format(self.player.y)}", 1, 31, 0xFFFFFF, 0)
         self.font.draw_text(f"{'Z: {:.4f}'.format(self.player.z)}", 1, 41, 0xFFFFFF, 0)
         self.font.draw_text(f"Selected Tile: {self.selected_tile}", 1, 51, 0xFFFFFF, 0)
-        self.font.draw_text("Press F3 to show/hide debug", 1, 71, 0xFFFFFF, 0)
-        self.font.draw_text("Press 1-9 to select blocks", 1, 81, 0xFFFFFF, 0)
-        self.font.draw_text("Press F7 to reload textures", 1, 91, 0xFFFFFF, 0)
+        quads, faces = self.world_renderer.get_quad_counts()
+        self.font.draw_text(f"Quads: {quads} ({faces} before merging)", 1, 61, 0xFFFFFF, 0)
+        self.font.draw_text(f"Chunks: {len(self.world_renderer.visible_chunks)} visible, {self.world_renderer.culled_chunk_count} culled, {self.world_renderer.visible_section_count} sections", 1, 71, 0xFFFFFF, 0)
+        self.font.draw_text(f"Draw calls: {self.world_renderer.draw_calls} world, {self.gui_draw_calls} GUI ({self.gui_quad_count} quads)", 1, 81, 0xFFFFFF, 0)
+        self.font.draw_text(f"Frame: p50 {PROFILER.get_percentile(50):.1f} ms, p99 {PROFILER.get_percentile(99):.1f} ms", 1, 91, 0xFFFFFF, 0)
+        scope_times = PROFILER.last_scope_times
+        self.font.draw_text(f"Tick {scope_times.get('tick', 0) / 1e6:.2f} ms, world {scope_times.get('world render', 0) / 1e6:.2f} ms, GUI {scope_times.get('gui', 0) / 1e6:.2f} ms", 1, 101, 0xFFFFFF, 0)
+        self.font.draw_text(f"Chunk updates: {PROFILER.get_rate('chunk updates'):.0f}/s, raycasts: {PROFILER.get_rate('raycasts'):.0f}/s", 1, 111, 0xFFFFFF, 0)
+        self.font.draw_text("Press F3 to show/hide debug", 1, 121, 0xFFFFFF, 0)
+        self.font.draw_text("Press 1-9 to select blocks", 1, 131, 0xFFFFFF, 0)
+        self.font.draw_text("Press F7 to reload textures", 1, 141, 0xFFFFFF, 0)
+        self.font.draw_text("Press F8 to stop the trace" if PROFILER.is_tracing() else "Press F8 to record a trace", 1, 151, 0xFFFFFF, 0)
+        self.render_frame_graph(self.window.scaled_width() - 1 - Game.FRAME_GRAPH_WIDTH, 32)
         self.font.draw_text(f"Python {platform.sys.version_info.major}.{platform.sys.version_info.minor}.{platform.sys.version_info.micro}", self.window.scaled_width() - 1, 1, 0xFFFFFF, 1)
         self.font.draw_text(f"Display: {self.window.width}x{self.window.height}", self.window.scaled_width() - 1, 21, 0xFFFFFF, 1)
       else:
         self.font.draw_text("Press F3 to show debug", 1, 11, 0xFFFFFF, 0)
         self.font.draw_text("Press 1-9 to select blocks", 1, 21, 0xFFFFFF, 0)
 
+    # Menus go over the HUD whatever their layers
+    self.sprite_batch.flush()
     if self.menu != None:
       self.menu.render(self, (self.mouse['x'] / self.window.scale_factor, self.mouse['y'] / self.window.scale_factor))
-
-  def draw_texture_nineslice(self, texture_name, pos: tuple[int, int], size: tuple[int, int], uv: tuple[int, int], uv_size: tuple[int, int], nineslice: tuple[int, int, int, int], tw: int, th: int):
-    self.texture_manager.get(texture_name).bind()
-    glColor4f(1.0, 1.0, 1.0, 1.0)
-    glBegin(GL_QUADS) 
-    # Top Left
-    self.__draw_texture_quad(pos[0], pos[1], nineslice[0], nineslice[1], uv[0], uv[1], nineslice[0], nineslice[1], tw, th)
-    # Top Middle
-    self.__draw_texture_quad(pos[0] + nineslice[0], pos[1], size[0] - nineslice[0] - nineslice[2], nineslice[1], uv[0] + nineslice[0], uv[1], uv_size[0] - nineslice[0] - nineslice[2], nineslice[1], tw, th)
-    # Top Right
-    self.__draw_texture_quad(pos[0] + size[0] - nineslice[2], pos[1], nineslice[2], nineslice[1], uv[0] + uv_size[0] - nineslice[2], uv[1], nineslice[2], nineslice[1], tw, th)
-    # Left Middle
-    self.__draw_texture_quad(pos[0], pos[1] + nineslice[1], nineslice[0], size[1] - nineslice[1] - nineslice[3], uv[0], uv[1] + nineslice[1], nineslice[0], uv_size[1] - nineslice[2] - nineslice[3], tw, th)
-    # Center
-    self.__draw_texture_quad(pos[0] + nineslice[0], pos[1] + nineslice[1], size[0] - nineslice[0] - nineslice[2], size[1] - nineslice[1] - nineslice[3], uv[0] + nineslice[0], uv[1] + nineslice[1], uv_size[0] - nineslice[0] - nineslice[2], uv_size[1] - nineslice[1] - nineslice[3], tw, th)
-    # Right Middle
-    self.__draw_texture_quad( pos[0] + size[0] - nineslice[2], pos[1] + nineslice[1], nineslice[2], size[1] - nineslice[1] - nineslice[3], uv[0] + uv_size[0] - nineslice[2], uv[1] + nineslice[1], nineslice[2], uv_size[1] - nineslice[1] - nineslice[3], tw, th)
-    # Bottom Left
-    self.__draw_texture_quad(pos[0], pos[1] + size[1] - nineslice[3], nineslice[0], nineslice[3], uv[0], uv[1] + uv_size[1] - nineslice[3], nineslice[0], nineslice[3], tw, th)
-    # Bottom Middle
-    self.__draw_texture_quad(pos[0] + nineslice[0], pos[1] + size[1] - nineslice[3], size[0] - nineslice[0] - nineslice[2], nineslice[3], uv[0] + nineslice[0], uv[1] + uv_size[1] - nineslice[2], uv_size[0] - nineslice[0] - nineslice[2], nineslice[3], tw, th)
-    # Bottom Right
-    self.__draw_texture_quad(pos[0] + size[0] - nineslice[2], pos[1] + size[1] - nineslice[3], nineslice[2], nineslice[3], uv[0] + uv_size[0] - nineslice[2], uv[1] + uv_size[1] - nineslice[3], nineslice[2], nineslice[3], tw, th)
-    glEnd()
-
-  def __draw_texture_quad(self, x: int, y: int, width: int, height: int, u: int, v: int, us: int, vs: int, tw: int, th: int):
-    u0 = u / tw
-    v0 = v / th
-    u1 = (u + us) / tw
-    v1 = (v + vs) / th
-    
-    glTexCoord2f(u0, v0)
-    glVertex3f(x, y, 0)
-    glTexCoord2f(u0, v1)
-    glVertex3f(x, y + height, 0)
-    glTexCoord2f(u1, v1)
-    glVertex3f(x + width, y + height, 0)
-    glTexCoord2f(u1, v0)
-    glVertex3f(x + width, y, 0)
-
-  def draw_rect(self, pos: tuple[int, int], size: tuple[int, int], color: int = 0xFFFFFFFF):
-    glEnable(GL_BLEND)
-    glDisable(GL_TEXTURE_2D)
-    glBlendFunc(GL_SRC_ALPHA, GL_ONE_MINUS_SRC_ALPHA)
-    glColor4f((color >> 16 & 0xFF) / 255.0, (color >> 8 & 0xFF) / 255.0, (color & 0xFF) / 255.0, (color >> 24 & 0xFF) / 255.0)
-    glBegin(GL_QUADS)
-    glVertex3f(pos[0], pos[1], 0)
-    glVertex3f(pos[0], pos[1] + size[1], 0)
-    glVertex3f(pos[0] + size[0], pos[1] + size[1], 0)
-    glVertex3f(pos[0] + size[0], pos[1], 0)
-    glEnd()
-    glColor4f(1.0, 1.0, 1.0, 1.0)
-    glDisable(GL_BLEND)
-    glEnable(GL_TEXTURE_2D)
-
-  def draw_texture(self, texture_name, x: int, y: int, width: int, height: int, u: int, v: int, us: int, vs: int, tw: int, th: int, color: int = 0xFFFFFF):
-    self.texture_manager.get(texture_name).bind()
-
-    glColor4f((color >> 16 & 0xFF) / 255.0, (color >> 8 & 0xFF) / 255.0, (color & 0xFF) / 255.0, 1.0)
-    glBegin(GL_QUADS)
-    self.__draw_texture_quad(x, y, width, height, u, v, us, vs, tw, th)
-    glEnd()
+      self.sprite_batch.flush()
+
+    self.gui_draw_calls = self.sprite_batch.draw_calls
+    self.gui_quad_count = self.sprite_batch.quad_count
+    self.sprite_batch.reset_counts()
+
+  # Recent frame times as bars a pixel wide, green under 60 FPS worth of time, yellow under 30 FPS and
+  # red above, with a line at 60 FPS
+  def render_frame_graph(self, x: int, y: int):
+    height = Game.FRAME_GRAPH_HEIGHT
+    self.draw_rect((x, y), (Game.FRAME_GRAPH_WIDTH, height), 0x90000000)
+    frame_times = list(PROFILER.frame_times)[-Game.FRAME_GRAPH_WIDTH:]
+    bar_x = x + Game.FRAME_GRAPH_WIDTH - len(frame_times)
+    for frame_time in frame_times:
+      color = 0xFF40C040 if frame_time <= 1000 / 60 else 0xFFE0E040 if frame_time <= 1000 / 30 else 0xFFE04040
+      bar_height = min(frame_time * Game.FRAME_GRAPH_SCALE, height)
+      self.draw_rect((bar_x, y + height - bar_height), (1, bar_height), color)
+      bar_x += 1
+    self.draw_rect((x, y + height - 1000 / 60 * Game.FRAME_GRAPH_SCALE), (Game.FRAME_GRAPH_WIDTH, 1), 0xC0FFFFFF)
+
+  # The draw_ functions add to the sprite batch, which draws everything at the end of the frame. A
+  # higher layer goes over anything in a lower one.
+  def draw_texture_nineslice(self, texture_name, pos: tuple[int, int], size: tuple[int, int], uv: tuple[int, int], uv_size: tuple[int, int], nineslice: tuple[int, int, int, int], tw: int, th: int, blend: int = BLEND_NONE, layer: int = 0):
+    self.sprite_batch.nineslice(texture_name, pos, size, uv, uv_size, nineslice, tw, th, blend, layer)
+
+  def draw_rect(self, pos: tuple[int, int], size: tuple[int, int], color: int = 0xFFFFFFFF, layer: int = 0):
+    self.sprite_batch.quad(None, pos[0], pos[1], pos[0] + size[0], pos[1] + size[1], color=color & 0xFFFFFF, alpha=(color >> 24 & 0xFF) / 255.0, blend=BLEND_ALPHA, layer=layer)
+
+  def draw_texture(self, texture_name, x: int, y: int, width: int, height: int, u: int, v: int, us: int, vs: int, tw: int, th: int, color: int = 0xFFFFFF, blend: int = BLEND_NONE, layer: int = 0):
+    self.sprite_batch.sprite(texture_name, x, y, width, height, u, v, us, vs, tw, th, color, blend, layer)
+
+  def get_player_input(self) -> PlayerInput:
+    handle = self.window.handle
+    player_input = PlayerInput()
+    if glfw.get_key(handle, glfw.KEY_W) != glfw.RELEASE:
+      player_input.forward += 1
+    if glfw.get_key(handle, glfw.KEY_S) != glfw.RELEASE:
+      player_input.forward -= 1
+    if glfw.get_key(handle, glfw.KEY_A) != glfw.RELEASE:
+      player_input.strafe -= 1
+    if glfw.get_key(handle, glfw.KEY_D) != glfw.RELEASE:
+      player_input.strafe += 1
+    player_input.jump = glfw.get_key(handle, glfw.KEY_SPACE) != glfw.RELEASE
+    player_input.reset = glfw.get_key(handle, glfw.KEY_R) != glfw.RELEASE
+    return player_input
 
   def tick(self):
     if self.world != None:
-      self.world.tick()
-      self.player.tick()
+      with PROFILER.scope("world tick"):
+        self.world.tick()
+      if self.server_address != None and not self.world.connected:
+        self.close_world()
+        self.ungrab_mouse()
+        self.menu = MainMenu(self)
+        return
+      if self.world_renderer.is_spawn_ready() and self.world.is_chunk_loaded_at(self.player.x, self.player.z):
+        self.player.tick(self.get_player_input())
 
 if __name__ == "__main__":
-  pygame.init()
-  game = Game()
-  game.run()
-  pygame.quit()
\ No newline at end of file
+  parser = argparse.ArgumentParser()
+  parser.add_argument("--connect", metavar="HOST:PORT", default=None, help="play on a server started with server.py")
+  parser.add_argument("--profile-startup", action="store_true", help="print how long each part of starting up took")
+  args = parser.parse_args()
+  STARTUP_PROFILE.mark("imports")
+  server_address = None
+  if args.connect != None:
+    host, _, port = args.connect.rpartition(":")
+    server_address = (host or "127.0.0.1", int(port))
+
+  game = Game(server_address)
+  STARTUP_PROFILE.mark("game")
+  game.run(STARTUP_PROFILE if args.profile_startup else None)
\ No newline at end of file
@@ -2,7 +2,7 @@ import glfw
 import random
 from OpenGL.GL import *
 from constants import *
-import json
+from resources import load_json
 
 class Widget:
   def __init__(self) -> None:
@@ -23,7 +23,7 @@ class ColoredCustomRenderer(Widget):
     self.orientation = orientation
 
   def render(self, game, mouse_pos: tuple[int, int]):
-    game.draw_rect(self.pos, self.size, self.colors[0])
+    game.draw_rect(self.pos, self.size, self.colors[0], layer=1)
 
 class Image(Widget):
   def __init__(self, texture_name: str, pos: tuple[int, int] = (0, 0), size: tuple[int, int] = (1, 1), color: int = 0xFFFFFF, uv: tuple[int, int] = (0, 0), uv_size: tuple[int, int] | None = None, nineslice: int | tuple[int, int] | tuple[int, int, int, int] | None = None, base_size: tuple[int, int] | None = None) -> None:
@@ -45,7 +45,6 @@ class Image(Widget):
     vs = th if self.uv_size == None else self.uv_size[1]
 
     game.draw_texture(self.texture_name, x=self.pos[0], y=self.pos[1], width=self.size[0], height=self.size[1], u=self.uv[0], v=self.uv[1], us=us, vs=vs, tw=tw, th=th, color=self.color)
-    glColor4f(1.0, 1.0, 1.0, 1.0)
 
 class Text(Widget):
   def __init__(self, pos: tuple[int, int] = (0, 0), message: str = "", align = 0.0, color = 0xFFFFFF, hover_color: int | None = None):
@@ -82,7 +81,7 @@ class Toggle(Widget):
 
   def render(self, game, mouse_pos: tuple[int, int]):
     hovered = self.is_cursor_over(mouse_pos)
-    game.draw_texture_nineslice("gui.png", self.pos, self.size, (20 if hovered else 0, 22), (20, 20), (4, 4, 4, 4), 256, 256)
+    game.draw_texture_nineslice("gui.png", self.pos, self.size, (20 if hovered else 0, 22), (20, 20), (4, 4, 4, 4), 256, 256, layer=1)
     game.font.draw_text(self.message + ": " + (game.translate_key("menu.on") if self.value else game.translate_key("menu.off")), self.pos[0] + self.size[0] / 2, self.pos[1] + 6, 0xFFFFFF, 0.5)
 
 class CycleButton(Widget):
@@ -110,7 +109,7 @@ class CycleButton(Widget):
 
   def render(self, game, mouse_pos: tuple[int, int]):
     hovered = self.is_cursor_over(mouse_pos)
-    game.draw_texture_nineslice("gui.png", self.pos, self.size, (20 if hovered else 0, 22), (20, 20), (4, 4, 4, 4), 256, 256)
+    game.draw_texture_nineslice("gui.png", self.pos, self.size, (20 if hovered else 0, 22), (20, 20), (4, 4, 4, 4), 256, 256, layer=1)
     game.font.draw_text(self.message + ": " + self.value_to_string(self.value), self.pos[0] + self.size[0] / 2, self.pos[1] + 6, 0xFFFFFF, 0.5)
 
 class Button(Widget):
@@ -137,7 +136,7 @@ class Button(Widget):
 
   def render(self, game, mouse_pos: tuple[int, int]):
     hovered = self.is_cursor_over(mouse_pos)
-    game.draw_texture_nineslice("gui.png", self.pos, self.size, (20 if hovered else 0, 22), (20, 20), (4, 4, 4, 4), 256, 256)
+    game.draw_texture_nineslice("gui.png", self.pos, self.size, (20 if hovered else 0, 22), (20, 20), (4, 4, 4, 4), 256, 256, layer=1)
     game.font.draw_text(self.message, self.pos[0] + self.size[0] / 2, self.pos[1] + 6, 0xFFFFFF, 0.5)
 
 class Menu:
@@ -170,24 +169,23 @@ class Menu:
   def mouse_clicked(self, mouse_pos: tuple[int, int]):
     for widget in self.widgets:
       if widget.is_pressable() and widget.is_cursor_over(mouse_pos):
-        self.game.play_sound(self.game.click_sound)
+        self.game.play_sound("click")
         widget.press()
         break
 
   def render_dirt_bg(self):
     self.game.draw_texture(texture_name="bg.png", x=0, y=0, width=self.game.window.scaled_width(), height=self.game.window.scaled_height(), u=0, v=0, us=self.game.window.scaled_width(), vs=self.game.window.scaled_height(), tw=16, th=16, color=0x666666)
-    glColor4f(1.0, 1.0, 1.0, 1.0)
 
   def render(self, game, mouse_pos: tuple[int, int]):
     for widget in self.widgets:
       widget.render(self.game, mouse_pos)
 
 class MainMenu(Menu):
-  SPLASHES = ["MISSING!"]
+  SPLASHES: list[str] | None = None
 
   def __init__(self, game) -> None:
-    with open("res/splashes.json", "r") as f:
-      MainMenu.SPLASHES = json.load(f)
+    if MainMenu.SPLASHES == None:
+      MainMenu.SPLASHES = load_json("splashes.json")
     super().__init__(game)
 
   def init_gui(self):
@@ -218,20 +216,19 @@ class CreateWorld(Menu):
   pass
 
 class LoadingTerrainMenu(Menu):
-  def __init__(self, game) -> None:
-    super().__init__(game)
-    self.started = False
-
   def render(self, game, mouse_pos: tuple[int, int]):
     self.render_dirt_bg()
     super().render(game, mouse_pos)
-    game.font.draw_text("Generating terrain...", self.game.window.scaled_width() / 2, 40, 0xFFFFFF, 0.5)
+    generated, meshed, total = self.game.world_renderer.get_loading_progress()
+    game.font.draw_text(self.game.translate_key("menu.generating_terrain"), self.game.window.scaled_width() / 2, 40, 0xFFFFFF, 0.5)
+    game.font.draw_text(f"{(generated + meshed) * 100 // (total * 2)}%", self.game.window.scaled_width() / 2, 52, 0xFFFFFF, 0.5)
 
-    if self.started:
-      self.game.load_world()
+    bar_x = self.game.window.scaled_width() / 2 - 50
+    game.draw_rect((bar_x, 64), (100, 2), 0xFF808080, layer=1)
+    game.draw_rect((bar_x, 64), ((generated + meshed) * 100 / (total * 2), 2), 0xFF80FF80, layer=2)
 
-    if not self.started:
-      self.started = True
+    if self.game.world_renderer.is_spawn_ready():
+      self.game.enter_world()
 
 class SettingsMenu(Menu):
   def __init__(self, game, parent: Menu) -> None:
@@ -243,11 +240,13 @@ class SettingsMenu(Menu):
     else:
       self.widgets.append(ColoredCustomRenderer(size=(self.game.window.scaled_width(), self.game.window.scaled_height()), colors=[0x90000000]))
     self.widgets.append(Text((self.game.window.scaled_width() / 2, 20), self.game.translate_key("menu.settings"), align=0.5))
-    self.widgets.append(Toggle(self.__set_block_preview, lambda : self.game.settings.show_block_preview, pos=(self.game.window.scaled_width() / 2 - 100, self.game.window.scaled_height() / 2 - 48), message=self.game.translate_key("menu.block_preview")))
-    self.widgets.append(Toggle(self.__set_sound, lambda : self.game.settings.sound_enabled, pos=(self.game.window.scaled_width() / 2 - 100, self.game.window.scaled_height() / 2 - 24), message=self.game.translate_key("menu.sound")))
-    self.widgets.append(Toggle(self.__set_vsync, lambda : self.game.settings.vsync, pos=(self.game.window.scaled_width() / 2 - 100, self.game.window.scaled_height() / 2), message=self.game.translate_key("menu.vsync")))
-    self.widgets.append(CycleButton(self.game.settings.fog_distance, [1, 2, 3], self.__fog_distance_stringify, self.__set_fog_distance, pos = (self.game.window.scaled_width() / 2 - 100, self.game.window.scaled_height() / 2 + 24), message=self.game.translate_key("menu.fog_distance")))
-    self.widgets.append(Button((self.game.window.scaled_width() / 2 - 100, self.game.window.scaled_height() / 2 + 58), message=self.game.translate_key("menu.done")).press_func(lambda _ : self.__back()))
+    self.widgets.append(Toggle(self.__set_block_preview, lambda : self.game.settings.show_block_preview, pos=(self.game.window.scaled_width() / 2 - 100, self.game.window.scaled_height() / 2 - 72), message=self.game.translate_key("menu.block_preview")))
+    self.widgets.append(Toggle(self.__set_sound, lambda : self.game.settings.sound_enabled, pos=(self.game.window.scaled_width() / 2 - 100, self.game.window.scaled_height() / 2 - 48), message=self.game.translate_key("menu.sound")))
+    self.widgets.append(Toggle(self.__set_vsync, lambda : self.game.settings.vsync, pos=(self.game.window.scaled_width() / 2 - 100, self.game.window.scaled_height() / 2 - 24), message=self.game.translate_key("menu.vsync")))
+    self.widgets.append(CycleButton(self.game.settings.fog_distance, self.game.settings.FOG_DISTANCES, self.__fog_distance_stringify, self.__set_fog_distance, pos = (self.game.window.scaled_width() / 2 - 100, self.game.window.scaled_height() / 2), message=self.game.translate_key("menu.fog_distance")))
+    self.widgets.append(CycleButton(self.game.settings.render_distance, self.game.settings.RENDER_DISTANCES, self.__render_distance_stringify, self.__set_render_distance, pos = (self.game.window.scaled_width() / 2 - 100, self.game.window.scaled_height() / 2 + 24), message=self.game.translate_key("menu.render_distance")))
+    self.widgets.append(Toggle(self.__set_greedy_meshing, lambda : self.game.settings.greedy_meshing, pos=(self.game.window.scaled_width() / 2 - 100, self.game.window.scaled_height() / 2 + 48), message=self.game.translate_key("menu.greedy_meshing")))
+    self.widgets.append(Button((self.game.window.scaled_width() / 2 - 100, self.game.window.scaled_height() / 2 + 82), message=self.game.translate_key("menu.done")).press_func(lambda _ : self.__back()))
 
   def __set_block_preview(self, value):
     self.game.settings.show_block_preview = value
@@ -259,9 +258,20 @@ class SettingsMenu(Menu):
     self.game.settings.vsync = value
     self.game.window.vsync = self.game.settings.vsync
 
+  def __set_greedy_meshing(self, value):
+    self.game.settings.greedy_meshing = value
+    if self.game.world != None:
+      self.game.world.make_all_dirty()
+
   def __set_fog_distance(self, value):
     self.game.settings.fog_distance = value
 
+  def __set_render_distance(self, value):
+    self.game.settings.render_distance = value
+
+  def __render_distance_stringify(self, distance: int):
+    return self.game.translate_key("menu.render_distance.chunks", distance)
+
   def __back(self):
     self.game.menu = self.parent
     self.game.settings.save()
@@ -292,6 +302,5 @@ class PauseMenu(Menu):
 
   def __return_main(self):
     self.game.menu = MainMenu(self.game)
-    self.game.world = None
-    self.game.player = None
+    self.game.close_world()
     self.game.show_debug = False
\ No newline at end of file
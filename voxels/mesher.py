@@ -0,0 +1,216 @@
+import numpy as np
+from constants import *
+from tiles import BLOCK_TYPES
+from visibility import get_chunk_connectivity
+from fluids import FLUID_HEIGHTS
+
+# Each face: neighbour offset (dx, dy, dz), colour shade, texture attribute and its
+# four corners as (x, y, z, u, v) where 0/1 pick the low/high side of the block or tile
+FACES = [
+  ((0, -1, 0), 0.6, 'down_txr', [(0, 0, 1, 0, 1), (0, 0, 0, 0, 0), (1, 0, 0, 1, 0), (1, 0, 1, 1, 1)]),
+  ((0, 1, 0), 1.0, 'up_txr', [(1, 1, 1, 1, 1), (1, 1, 0, 1, 0), (0, 1, 0, 0, 0), (0, 1, 1, 0, 1)]),
+  ((0, 0, -1), 0.6, 'north_txr', [(0, 1, 0, 1, 0), (1, 1, 0, 0, 0), (1, 0, 0, 0, 1), (0, 0, 0, 1, 1)]),
+  ((0, 0, 1), 0.6, 'south_txr', [(0, 1, 1, 0, 0), (0, 0, 1, 0, 1), (1, 0, 1, 1, 1), (1, 1, 1, 1, 0)]),
+  ((-1, 0, 0), 0.8, 'west_txr', [(0, 1, 1, 1, 0), (0, 1, 0, 0, 0), (0, 0, 0, 0, 1), (0, 0, 1, 1, 1)]),
+  ((1, 0, 0), 0.8, 'east_txr', [(1, 0, 1, 0, 1), (1, 0, 0, 1, 1), (1, 1, 0, 1, 0), (1, 1, 1, 0, 0)])
+]
+
+FACE_CORNERS = [np.array(corners, dtype=np.float32) for _, _, _, corners in FACES]
+
+# Texture index per face and tile id, so a whole mask of tiles can be looked up at once
+FACE_TEXTURES = np.zeros((len(FACES), 256), dtype=np.int32)
+for face_idx, (_, _, txr_attr, _) in enumerate(FACES):
+  for tile_id, tile_type in BLOCK_TYPES.items():
+    FACE_TEXTURES[face_idx, tile_id] = getattr(tile_type, txr_attr)
+
+# Colour multiplier per light level, level 0 keeps the 0.4 that unlit faces used to get
+LIGHT_BRIGHTNESS = (0.4 + 0.6 * 0.8 ** (15 - np.arange(16))).astype(np.float32)
+
+def visible_faces(tile, neighbour, face_idx):
+  mask = (tile == 8) | (neighbour == 0) | (neighbour == 8) | ((neighbour == 7) & (tile != 7))
+  if face_idx == 1:
+    mask |= (tile == 7) & (neighbour != 7)
+  return mask
+
+# For greedy meshes the UVs come from world coordinates so a merged quad repeats its tile texture
+# once per block, in the same orientation as FACES: (u axis, u sign, v axis, v sign) with x, y, z = 0, 1, 2
+FACE_UV_AXES = [(0, 1, 2, 1), (0, 1, 2, 1), (0, -1, 1, -1), (0, 1, 1, -1), (2, 1, 1, -1), (2, -1, 1, -1)]
+
+# Axis order that puts a face's normal first, for slicing [y, z, x] arrays into planes
+FACE_SLICE_AXES = [(0, 1, 2), (0, 1, 2), (1, 0, 2), (1, 0, 2), (2, 0, 1), (2, 0, 1)]
+
+class ChunkMesh:
+  def __init__(self, vertices: np.ndarray, batches: list[list[tuple[int, int, int]]], face_count: int):
+    self.vertices = vertices
+    # Per 16 high section, (texture index, first vertex, vertex count) with -1 meaning the whole atlas
+    self.batches = batches
+    # Block faces before any merging
+    self.face_count = face_count
+
+  @property
+  def quad_count(self) -> int:
+    return len(self.vertices) // 4
+
+EMPTY_MESH_VERTICES = np.zeros((0, VERTEX_SIZE), dtype=np.float32)
+SECTION_COUNT = CHUNK_HEIGHT // 16
+
+def empty_mesh() -> ChunkMesh:
+  return ChunkMesh(EMPTY_MESH_VERTICES, [[] for _ in range(SECTION_COUNT)], 0)
+
+def build_chunk_mesh(blocks: np.ndarray, light: np.ndarray, origin_x: int, origin_z: int, translucent: bool, greedy: bool = False, fluid: np.ndarray | None = None) -> ChunkMesh:
+  # blocks and light are (CHUNK_HEIGHT + 2, 18, 18) arrays indexed [y, z, x] holding the chunk plus
+  # a one block border from its neighbours. light is packed like the ChunkSections in Chunk.light, see lighting.py.
+  # fluid is the chunk's own (CHUNK_HEIGHT, 16, 16) flow levels, None when all water is still.
+  tiles = blocks[1:-1, 1:-1, 1:-1]
+
+  if translucent:
+    layer_mask = tiles == 7
+  else:
+    layer_mask = (tiles != 0) & (tiles != 7)
+
+  if not layer_mask.any():
+    return empty_mesh()
+
+  # Water is lowered by its flow level unless there is more water on top of it
+  heights = FLUID_HEIGHTS[0] if fluid is None else FLUID_HEIGHTS[fluid]
+  top = np.where((tiles == 7) & (blocks[2:, 1:-1, 1:-1] != 7), heights, 1.0).astype(np.float32)
+
+  quads = []
+  quad_sections = []
+  greedy_quads = []
+  face_count = 0
+  for face_idx, ((dx, dy, dz), face_shade, _, _) in enumerate(FACES):
+    neighbours = blocks[1 + dy:CHUNK_HEIGHT + 1 + dy, 1 + dz:17 + dz, 1 + dx:17 + dx]
+    mask = layer_mask & visible_faces(tiles, neighbours, face_idx)
+
+    ys, zs, xs = np.nonzero(mask)
+    if len(ys) == 0:
+      continue
+    face_count += len(ys)
+
+    face_tiles = tiles[ys, zs, xs]
+    packed = light[ys + 1 + dy, zs + 1 + dz, xs + 1 + dx]
+    levels = np.maximum(packed >> 4, packed & 15)
+    txr = FACE_TEXTURES[face_idx][face_tiles]
+
+    if greedy:
+      greedy_quads.append(build_greedy_faces(face_idx, ys, zs, xs, txr, levels, origin_x, origin_z))
+      continue
+
+    brightness = LIGHT_BRIGHTNESS[levels] * face_shade
+    u0 = (txr % 16).astype(np.float32) / 16.0
+    v0 = (txr // 16).astype(np.float32) / 16.0
+
+    corners = FACE_CORNERS[face_idx]
+    vertices = np.empty((len(ys), 4, VERTEX_SIZE), dtype=np.float32)
+    vertices[:, :, 0] = (xs + origin_x)[:, None] + corners[:, 0]
+    vertices[:, :, 1] = ys[:, None] + corners[:, 1] * top[ys, zs, xs][:, None]
+    vertices[:, :, 2] = (zs + origin_z)[:, None] + corners[:, 2]
+    vertices[:, :, 3] = u0[:, None] + corners[:, 3] / 16.0
+    vertices[:, :, 4] = v0[:, None] + corners[:, 4] / 16.0
+    vertices[:, :, 5:8] = brightness[:, None, None]
+    vertices[:, :, 8] = 1.0
+    quads.append(vertices)
+    quad_sections.append(ys >> 4)
+
+  if greedy:
+    return batch_greedy_faces(greedy_quads, face_count)
+
+  if len(quads) == 0:
+    return empty_mesh()
+  quad_sections = np.concatenate(quad_sections)
+  return batch_quads(np.concatenate(quads), quad_sections, np.full(len(quad_sections), -1), face_count)
+
+# Merges the visible faces of one direction into rectangles of equal texture and light level, and
+# returns their vertices along with the texture index and section of every quad
+def build_greedy_faces(face_idx: int, ys: np.ndarray, zs: np.ndarray, xs: np.ndarray, txr: np.ndarray, levels: np.ndarray, origin_x: int, origin_z: int):
+  slice_axes = FACE_SLICE_AXES[face_idx]
+  coords = (ys, zs, xs)
+  rects = greedy_rects(coords[slice_axes[0]], coords[slice_axes[1]], coords[slice_axes[2]], txr * 16 + levels)
+
+  # Back from (plane, row, column) to block position and size in [y, z, x] order
+  position = np.empty((len(rects), 3), dtype=np.float32)
+  size = np.ones((len(rects), 3), dtype=np.float32)
+  for axis, source in zip(slice_axes, (0, 1, 2)):
+    position[:, axis] = rects[:, source]
+  size[:, slice_axes[1]] = rects[:, 3]
+  size[:, slice_axes[2]] = rects[:, 4]
+
+  sections = position[:, 0].astype(np.int32) >> 4
+
+  # To x, y, z world coordinates
+  position = position[:, [2, 0, 1]]
+  size = size[:, [2, 0, 1]]
+  position[:, 0] += origin_x
+  position[:, 2] += origin_z
+
+  keys = rects[:, 5]
+  txr = keys // 16
+  brightness = LIGHT_BRIGHTNESS[keys % 16] * FACES[face_idx][1]
+
+  corners = FACE_CORNERS[face_idx]
+  vertices = np.empty((len(rects), 4, VERTEX_SIZE), dtype=np.float32)
+  vertices[:, :, 0:3] = position[:, None, :] + corners[None, :, 0:3] * size[:, None, :]
+  u_axis, u_sign, v_axis, v_sign = FACE_UV_AXES[face_idx]
+  vertices[:, :, 3] = vertices[:, :, u_axis] * u_sign
+  vertices[:, :, 4] = vertices[:, :, v_axis] * v_sign
+  vertices[:, :, 5:8] = brightness[:, None, None]
+  vertices[:, :, 8] = 1.0
+  return vertices, txr, sections
+
+# Merges faces at (plane, row, column) with equal keys into rectangles and returns them as
+# (plane, row, column, height, width, key) rows. Every row is first cut into runs of equal keys, then
+# runs are stacked on the same run in the row before them. Rows are y for side faces, so stacks stop
+# every 16 rows to keep rectangles inside sections and let sections be drawn on their own.
+def greedy_rects(planes: np.ndarray, rows: np.ndarray, cols: np.ndarray, keys: np.ndarray) -> np.ndarray:
+  planes = planes.astype(np.int32)
+  rows = rows.astype(np.int32)
+  cols = cols.astype(np.int32)
+  keys = keys.astype(np.int32)
+
+  # Faces in row order, a face carries on the run before it if it's next to it with the same key
+  order = np.lexsort((cols, rows, planes))
+  planes, rows, cols, keys = planes[order], rows[order], cols[order], keys[order]
+  run_start = np.ones(len(keys), dtype=bool)
+  run_start[1:] = (cols[1:] != cols[:-1] + 1) | (rows[1:] != rows[:-1]) | (planes[1:] != planes[:-1]) | (keys[1:] != keys[:-1])
+  widths = np.bincount(np.cumsum(run_start) - 1)
+  planes, rows, cols, keys = planes[run_start], rows[run_start], cols[run_start], keys[run_start]
+
+  # Runs in column order, a run is stacked if the one before it is the same run a row down
+  order = np.lexsort((rows, cols, planes))
+  planes, rows, cols, keys, widths = planes[order], rows[order], cols[order], keys[order], widths[order]
+  rect_start = np.ones(len(keys), dtype=bool)
+  rect_start[1:] = (rows[1:] != rows[:-1] + 1) | (rows[1:] % 16 == 0) | (cols[1:] != cols[:-1]) | (planes[1:] != planes[:-1]) | (keys[1:] != keys[:-1]) | (widths[1:] != widths[:-1])
+  heights = np.bincount(np.cumsum(rect_start) - 1)
+  return np.stack([planes[rect_start], rows[rect_start], cols[rect_start], heights, widths[rect_start], keys[rect_start]], axis=1)
+
+def batch_greedy_faces(greedy_quads, face_count: int) -> ChunkMesh:
+  if len(greedy_quads) == 0:
+    return empty_mesh()
+
+  vertices = np.concatenate([quad_vertices for quad_vertices, _, _ in greedy_quads])
+  txr = np.concatenate([quad_txr for _, quad_txr, _ in greedy_quads])
+  sections = np.concatenate([quad_sections for _, _, quad_sections in greedy_quads])
+  return batch_quads(vertices, sections, txr, face_count)
+
+# Sorts quads, shaped (quads, 4, VERTEX_SIZE), by texture and then section so each texture of a
+# section is one draw call, and a texture's batches of neighbouring sections follow each other
+def batch_quads(vertices: np.ndarray, sections: np.ndarray, txr: np.ndarray, face_count: int) -> ChunkMesh:
+  order = np.lexsort((sections, txr))
+  vertices = vertices[order].reshape(-1, VERTEX_SIZE)
+  keys = (txr[order].astype(np.int64) + 1) * SECTION_COUNT + sections[order]
+
+  batches = [[] for _ in range(SECTION_COUNT)]
+  key_values, starts, counts = np.unique(keys, return_index=True, return_counts=True)
+  for key, start, count in zip(key_values.tolist(), starts.tolist(), counts.tolist()):
+    batches[key % SECTION_COUNT].append((key // SECTION_COUNT - 1, start * 4, count * 4))
+  return ChunkMesh(vertices, batches, face_count)
+
+# Runs in the worker pool: the SOLID and TRANSLUCENT meshes of one chunk from its neighbourhood arrays,
+# plus the connectivity of its sections for the visibility search
+def build_chunk_meshes(blocks: np.ndarray, light: np.ndarray, origin_x: int, origin_z: int, greedy: bool, fluid: np.ndarray | None = None):
+  return (
+    build_chunk_mesh(blocks, light, origin_x, origin_z, False, greedy),
+    build_chunk_mesh(blocks, light, origin_x, origin_z, True, fluid=fluid),
+    get_chunk_connectivity(blocks[1:-1, 1:-1, 1:-1])
+  )
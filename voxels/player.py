@@ -1,7 +1,19 @@
 import random
 import math
-import glfw
 from utils import AABB
+from collision import move_box
+from entities import GRAVITY, JUMP_SPEED, GROUND_SPEED, AIR_SPEED, WATER_SPEED_FACTOR, HORIZONTAL_DRAG, VERTICAL_DRAG, GROUND_FRICTION
+
+# What the player is asked to do for a tick, filled in from the keyboard by the game or by anything
+# else driving the player, so ticking doesn't need a window
+class PlayerInput:
+  __slots__ = ("forward", "strafe", "jump", "reset")
+
+  def __init__(self, forward: float = 0.0, strafe: float = 0.0, jump: bool = False, reset: bool = False):
+    self.forward = forward
+    self.strafe = strafe
+    self.jump = jump
+    self.reset = reset
 
 class Player:
   WIDTH = 0.6
@@ -25,56 +37,44 @@ class Player:
     self.bounding_box = AABB(self.x - Player.WIDTH / 2, self.y - Player.HEIGHT / 2, self.z - Player.WIDTH / 2, self.x + Player.WIDTH / 2, self.y + Player.HEIGHT / 2, self.z + Player.WIDTH / 2)
 
   def reset_pos(self):
-    self.x = random.randint(0, 4 * 16)
-    self.y = 64
-    self.z = random.randint(0, 4 * 16)
+    self.set_pos(random.randint(0, 4 * 16), 64, random.randint(0, 4 * 16))
+
+  def set_pos(self, x: float, y: float, z: float):
+    self.x = x
+    self.y = y
+    self.z = z
     self.bounding_box = AABB(self.x - Player.WIDTH / 2, self.y - Player.HEIGHT / 2, self.z - Player.WIDTH / 2, self.x + Player.WIDTH / 2, self.y + Player.HEIGHT / 2, self.z + Player.WIDTH / 2)
 
-  def tick(self):
+  def tick(self, player_input: PlayerInput):
     self.old_x = self.x
     self.old_y = self.y
     self.old_z = self.z
 
-    xa = 0.0
-    za = 0.0
-
-    if glfw.get_key(self.world.game.window.handle, glfw.KEY_R) != glfw.RELEASE:
+    if player_input.reset:
       self.reset_pos()
 
-    if glfw.get_key(self.world.game.window.handle, glfw.KEY_W) != glfw.RELEASE:
-      za -= 1
-    
-    if glfw.get_key(self.world.game.window.handle, glfw.KEY_S) != glfw.RELEASE:
-      za += 1
-
-    if glfw.get_key(self.world.game.window.handle, glfw.KEY_A) != glfw.RELEASE:
-      xa -= 1
-    
-    if glfw.get_key(self.world.game.window.handle, glfw.KEY_D) != glfw.RELEASE:
-      xa += 1
-
-    if glfw.get_key(self.world.game.window.handle, glfw.KEY_SPACE) != glfw.RELEASE and self.on_ground:
-      self.yd = 0.12
+    if player_input.jump and self.on_ground:
+      self.yd = JUMP_SPEED
 
     camera_pos = [self.x, self.bounding_box.y0, self.z]
     self.is_inside_water = self.world.get_tile(int(camera_pos[0]), int(camera_pos[1]), int(camera_pos[2])) == 7
 
-    mov_speed = 0.005
+    mov_speed = AIR_SPEED
     if self.on_ground:
-      mov_speed = 0.02
+      mov_speed = GROUND_SPEED
     
     if self.is_inside_water:
-      mov_speed *= 0.4
+      mov_speed *= WATER_SPEED_FACTOR
 
-    self.move_relative(xa, za, mov_speed)
-    self.yd = self.yd - 0.005
+    self.move_relative(player_input.strafe, -player_input.forward, mov_speed)
+    self.yd = self.yd - GRAVITY
     self.move(self.xd, self.yd, self.zd)
-    self.xd *= 0.91
-    self.yd *= 0.98
-    self.zd *= 0.91
+    self.xd *= HORIZONTAL_DRAG
+    self.yd *= VERTICAL_DRAG
+    self.zd *= HORIZONTAL_DRAG
     if self.on_ground:
-      self.xd *= 0.8
-      self.zd *= 0.8
+      self.xd *= GROUND_FRICTION
+      self.zd *= GROUND_FRICTION
 
   # O código de colisão não foi totalmente feito por mim
   # Obtiu por pesquisa e basiado no Minecraft
@@ -83,22 +83,8 @@ class Player:
     ya_ini = ya
     za_ini = za
 
-    cube_boxes = self.world.get_cubes(self.bounding_box.expand(xa, ya, za))
-
-    for i in range(len(cube_boxes)):
-      ya = cube_boxes[i].clipYCollide(self.bounding_box, ya)
-    
-    self.bounding_box.move(0.0, ya, 0.0)
-
-    for i in range(len(cube_boxes)):
-      xa = cube_boxes[i].clipXCollide(self.bounding_box, xa)
-    
-    self.bounding_box.move(xa, 0.0, 0.0)
-
-    for i in range(len(cube_boxes)):
-      za = cube_boxes[i].clipZCollide(self.bounding_box, za)
-
-    self.bounding_box.move(0.0, 0.0, za)
+    box = self.bounding_box
+    (box.x0, box.y0, box.z0, box.x1, box.y1, box.z1), xa, ya, za = move_box(self.world.cursor(), (box.x0, box.y0, box.z0, box.x1, box.y1, box.z1), xa, ya, za)
 
     self.on_ground = ya_ini != ya and ya_ini < 0.0
 
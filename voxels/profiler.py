@@ -0,0 +1,115 @@
+from __future__ import annotations
+import json
+import os
+import threading
+import time
+from collections import deque
+import numpy as np
+
+# Times named scopes and counts events frame by frame, for the F3 overlay and for traces that can be
+# opened in chrome://tracing or Perfetto. Scopes cost two perf_counter_ns calls, so they go around
+# whole steps of a frame, not around work done per tile.
+#
+#   with PROFILER.scope("tick"):
+#     ...
+#   PROFILER.count("raycasts")
+class Profiler:
+  # Frames kept for the graph, percentiles and rates
+  HISTORY = 240
+  # Events a trace stops at, around a minute of frames
+  MAX_TRACE_EVENTS = 500000
+
+  def __init__(self):
+    self.frame_times: deque[float] = deque(maxlen=Profiler.HISTORY)
+    # Nanoseconds spent in each scope and counts, of the frame going on and of the frames before it
+    self.scope_times: dict[str, int] = {}
+    self.counters: dict[str, int] = {}
+    self.last_scope_times: dict[str, int] = {}
+    self.__counter_history: deque[dict[str, int]] = deque(maxlen=Profiler.HISTORY)
+    self.__frame_start = time.perf_counter_ns()
+    self.__start_time = self.__frame_start
+    # Trace events as (name, start ns, duration ns, thread id), None when not recording
+    self.__trace: list[tuple[str, int, int, int]] | None = None
+    self.__trace_counters: list[tuple[int, dict[str, int]]] = []
+
+  def scope(self, name: str) -> ProfileScope:
+    return ProfileScope(self, name)
+
+  def add_scope_time(self, name: str, start: int, end: int):
+    self.scope_times[name] = self.scope_times.get(name, 0) + end - start
+    if self.__trace != None and len(self.__trace) < Profiler.MAX_TRACE_EVENTS:
+      self.__trace.append((name, start, end - start, threading.get_ident()))
+
+  def count(self, name: str, amount: int = 1):
+    self.counters[name] = self.counters.get(name, 0) + amount
+
+  # Starts timing the first frame from now rather than from when the profiler was made
+  def reset_frame_start(self):
+    self.__frame_start = time.perf_counter_ns()
+
+  # Ends the frame going on, its time is from the end of the frame before
+  def end_frame(self):
+    now = time.perf_counter_ns()
+    self.add_scope_time("frame", self.__frame_start, now)
+    self.frame_times.append((now - self.__frame_start) / 1e6)
+    self.__frame_start = now
+    self.last_scope_times = self.scope_times
+    self.__counter_history.append(self.counters)
+    if self.__trace != None and len(self.__trace) < Profiler.MAX_TRACE_EVENTS:
+      self.__trace_counters.append((now, self.counters))
+    self.scope_times = {}
+    self.counters = {}
+
+  # Frame time in milliseconds that the given percent of the recent frames were faster than
+  def get_percentile(self, percent: float) -> float:
+    if len(self.frame_times) == 0:
+      return 0.0
+    return float(np.percentile(np.fromiter(self.frame_times, dtype=np.float64), percent))
+
+  # How many times a second the counter went up over the recent frames
+  def get_rate(self, name: str) -> float:
+    total_time = sum(self.frame_times) / 1000
+    if total_time == 0:
+      return 0.0
+    return sum(counters.get(name, 0) for counters in self.__counter_history) / total_time
+
+  def is_tracing(self) -> bool:
+    return self.__trace != None
+
+  def start_trace(self):
+    self.__trace = []
+    self.__trace_counters = []
+
+  # Writes the events recorded since start_trace in the Chrome trace event format and stops recording
+  def stop_trace(self, path: str) -> int:
+    trace = self.__trace or []
+    pid = os.getpid()
+    events = [{"name": name, "ph": "X", "ts": (start - self.__start_time) / 1000, "dur": duration / 1000, "pid": pid, "tid": tid} for name, start, duration, tid in trace]
+    for now, counters in self.__trace_counters:
+      if len(counters) > 0:
+        events.append({"name": "counters", "ph": "C", "ts": (now - self.__start_time) / 1000, "pid": pid, "tid": 0, "args": counters})
+    directory = os.path.dirname(path)
+    if directory != "":
+      os.makedirs(directory, exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+      json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, f)
+    self.__trace = None
+    self.__trace_counters = []
+    return len(events)
+
+class ProfileScope:
+  def __init__(self, profiler: Profiler, name: str):
+    self.__profiler = profiler
+    self.__name = name
+    self.__start = 0
+
+  def __enter__(self):
+    self.__start = time.perf_counter_ns()
+    return self
+
+  def __exit__(self, exc_type, exc_value, traceback):
+    self.__profiler.add_scope_time(self.__name, self.__start, time.perf_counter_ns())
+    return False
+
+# The game's profiler, everything that runs on the game's thread reports to it
+PROFILER = Profiler()
@@ -0,0 +1,80 @@
+import asyncio
+import struct
+import zlib
+import numpy as np
+from generation import join_chunk_data, split_chunk_data
+
+# Messages are a 4 byte length, a 1 byte type and the payload, big endian throughout.
+# The length counts the type byte and the payload.
+HEADER = struct.Struct(">IB")
+MAX_MESSAGE_SIZE = 1 << 22
+
+# Client to server
+LOGIN = 1          # render distance (B), name (utf-8)
+PLAYER_STATE = 2   # x, y, z (d), rot_x, rot_y (f)
+SET_TILE = 3       # x, y, z (i), tile (B)
+
+# Server to client
+LOGIN_OK = 64      # x, y, z (d) to spawn at, ticks per second (H)
+CHUNK = 65         # cx, cz (i), zlib compressed blocks followed by flow levels if there are any
+UNLOAD_CHUNK = 66  # cx, cz (i)
+BLOCK_DELTAS = 67  # cx, cz (i), count (H), compressed flag (B), then the deltas, see encode_block_deltas
+TICK = 68          # tick number (I), sent after everything that changed during the tick
+
+LOGIN_FORMAT = struct.Struct(">B")
+PLAYER_STATE_FORMAT = struct.Struct(">dddff")
+SET_TILE_FORMAT = struct.Struct(">iiiB")
+LOGIN_OK_FORMAT = struct.Struct(">dddH")
+CHUNK_KEY_FORMAT = struct.Struct(">ii")
+BLOCK_DELTAS_FORMAT = struct.Struct(">iiHB")
+TICK_FORMAT = struct.Struct(">I")
+
+# Delta bodies at least this long are worth compressing
+COMPRESS_DELTAS_OVER = 64
+
+def encode_message(message_type: int, payload: bytes = b"") -> bytes:
+  return HEADER.pack(len(payload) + 1, message_type) + payload
+
+# Reads one message, returns (type, payload), or None once the other side closed the connection
+async def read_message(reader: asyncio.StreamReader) -> tuple[int, bytes] | None:
+  try:
+    header = await reader.readexactly(HEADER.size)
+    length, message_type = HEADER.unpack(header)
+    if length < 1 or length > MAX_MESSAGE_SIZE:
+      raise ConnectionError(f"Bad message length {length}")
+    return message_type, await reader.readexactly(length - 1)
+  except (asyncio.IncompleteReadError, ConnectionResetError):
+    return None
+
+def encode_chunk(cx: int, cz: int, blocks: bytes, fluid: bytes | None) -> bytes:
+  return encode_message(CHUNK, CHUNK_KEY_FORMAT.pack(cx, cz) + zlib.compress(join_chunk_data(blocks, fluid)))
+
+# Returns (cx, cz, blocks, fluid or None)
+def decode_chunk(payload: bytes):
+  cx, cz = CHUNK_KEY_FORMAT.unpack_from(payload)
+  blocks, fluid = split_chunk_data(zlib.decompress(payload[CHUNK_KEY_FORMAT.size:]))
+  return cx, cz, blocks, fluid
+
+# Tile changes of one chunk, given as arrays of local indices ((y * 16 + z) * 16 + x), tiles and
+# flow levels. Indices are sorted and stored as the gaps between them, which are small for changes
+# close together, then the tiles and levels follow as columns so long runs compress well.
+def encode_block_deltas(cx: int, cz: int, indices: np.ndarray, tiles: np.ndarray, levels: np.ndarray) -> bytes:
+  order = np.argsort(indices, kind="stable")
+  indices = indices[order].astype(np.uint16)
+  gaps = np.diff(indices, prepend=np.uint16(0)).astype(">u2")
+  body = gaps.tobytes() + tiles[order].astype(np.uint8).tobytes() + levels[order].astype(np.uint8).tobytes()
+  compressed = len(body) >= COMPRESS_DELTAS_OVER
+  if compressed:
+    body = zlib.compress(body)
+  return encode_message(BLOCK_DELTAS, BLOCK_DELTAS_FORMAT.pack(cx, cz, len(indices), 1 if compressed else 0) + body)
+
+# Returns (cx, cz, indices, tiles, levels)
+def decode_block_deltas(payload: bytes):
+  cx, cz, count, compressed = BLOCK_DELTAS_FORMAT.unpack_from(payload)
+  body = payload[BLOCK_DELTAS_FORMAT.size:]
+  if compressed:
+    body = zlib.decompress(body)
+  indices = np.cumsum(np.frombuffer(body, dtype=">u2", count=count), dtype=np.int64)
+  tiles = np.frombuffer(body, dtype=np.uint8, count=count, offset=count * 2)
+  levels = np.frombuffer(body, dtype=np.uint8, count=count, offset=count * 3)
+  return cx, cz, indices, tiles, levels
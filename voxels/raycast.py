@@ -0,0 +1,132 @@
+import math
+import numpy as np
+from constants import *
+from collision import COLLIDABLE, COLLIDABLE_IDS
+from utils import HitResult
+
+# Faces in the same order as mesher.FACES: down, up, north, south, west, east. A ray moving along
+# +x enters a tile through its west face, along -x through its east face and so on.
+FACE_OFFSETS = [(0, -1, 0), (0, 1, 0), (0, 0, -1), (0, 0, 1), (-1, 0, 0), (1, 0, 0)]
+
+# Where a tile placed against the hit face goes, None when the ray started inside the tile
+def get_placement(hit: HitResult) -> tuple[int, int, int] | None:
+  if hit.face == -1:
+    return None
+  dx, dy, dz = FACE_OFFSETS[hit.face]
+  return hit.bx + dx, hit.by + dy, hit.bz + dz
+
+# Walks the tiles along the ray one boundary crossing at a time (Amanatides and Woo) and returns the
+# first collidable tile within reach blocks, with the face the ray went in through and the distance
+# to it. tiles is anything with get_tile(x, y, z), like a world's cursor().
+def raycast(tiles, origin, direction, reach: float) -> HitResult | None:
+  ox, oy, oz = origin
+  dx, dy, dz = direction
+  length = math.sqrt(dx * dx + dy * dy + dz * dz)
+  if length == 0.0:
+    return None
+  dx /= length
+  dy /= length
+  dz /= length
+
+  x = math.floor(ox)
+  y = math.floor(oy)
+  z = math.floor(oz)
+  get_tile = tiles.get_tile
+  tile_id = get_tile(x, y, z)
+  if COLLIDABLE_IDS[tile_id]:
+    return HitResult(x, y, z, tile_id, -1, 0.0)
+
+  step_x = 1 if dx > 0 else -1
+  step_y = 1 if dy > 0 else -1
+  step_z = 1 if dz > 0 else -1
+  # Distance along the ray between two boundaries of an axis, and to the next one
+  delta_x = abs(1.0 / dx) if dx != 0.0 else math.inf
+  delta_y = abs(1.0 / dy) if dy != 0.0 else math.inf
+  delta_z = abs(1.0 / dz) if dz != 0.0 else math.inf
+  max_x = ((x + 1 - ox) if dx > 0 else (ox - x)) * delta_x if dx != 0.0 else math.inf
+  max_y = ((y + 1 - oy) if dy > 0 else (oy - y)) * delta_y if dy != 0.0 else math.inf
+  max_z = ((z + 1 - oz) if dz > 0 else (oz - z)) * delta_z if dz != 0.0 else math.inf
+
+  while True:
+    if max_x <= max_y and max_x <= max_z:
+      distance = max_x
+      x += step_x
+      max_x += delta_x
+      face = 4 if step_x > 0 else 5
+    elif max_y <= max_z:
+      distance = max_y
+      y += step_y
+      max_y += delta_y
+      face = 0 if step_y > 0 else 1
+      # Nothing to hit above or below the world
+      if (y >= CHUNK_HEIGHT and step_y > 0) or (y < 0 and step_y < 0):
+        return None
+    else:
+      distance = max_z
+      z += step_z
+      max_z += delta_z
+      face = 2 if step_z > 0 else 3
+
+    if distance > reach:
+      return None
+    tile_id = get_tile(x, y, z)
+    if COLLIDABLE_IDS[tile_id]:
+      return HitResult(x, y, z, tile_id, face, distance)
+
+# Casts many rays at once, a step of every ray per iteration, for things like line of sight checks
+# between entities. Returns the distance to the first collidable tile of every ray (inf for rays that
+# hit nothing within reach), the tile hit as an (n, 3) array and the face, -1 where nothing was hit.
+def raycast_many(world, origins: np.ndarray, directions: np.ndarray, reach):
+  origins = np.asarray(origins, dtype=np.float64)
+  directions = np.asarray(directions, dtype=np.float64)
+  count = len(origins)
+  reach = np.broadcast_to(np.asarray(reach, dtype=np.float64), (count,))
+  lengths = np.linalg.norm(directions, axis=1)
+  directions = directions / np.where(lengths == 0.0, 1.0, lengths)[:, None]
+
+  cells = np.floor(origins).astype(np.int64)
+  steps = np.where(directions > 0, 1, -1)
+  moving = directions != 0.0
+  deltas = np.where(moving, 1.0 / np.where(moving, np.abs(directions), 1.0), np.inf)
+  next_bounds = np.where(directions > 0, cells + 1 - origins, origins - cells)
+  maxes = np.where(moving, next_bounds * np.where(moving, deltas, 0.0), np.inf)
+
+  distances = np.full(count, np.inf)
+  hits = cells.copy()
+  faces = np.full(count, -1, dtype=np.int64)
+
+  started_inside = COLLIDABLE[world.get_tiles(cells[:, 0], cells[:, 1], cells[:, 2])] & (lengths > 0.0)
+  distances[started_inside] = 0.0
+  active = np.flatnonzero(~started_inside & (lengths > 0.0))
+
+  while len(active) > 0:
+    axes = np.argmin(maxes[active], axis=1)
+    travelled = maxes[active, axes]
+    within = travelled <= reach[active]
+    active = active[within]
+    axes = axes[within]
+    travelled = travelled[within]
+
+    cells[active, axes] += steps[active, axes]
+    maxes[active, axes] += deltas[active, axes]
+    ys = cells[active, 1]
+    in_world = ((ys < CHUNK_HEIGHT) | (steps[active, 1] < 0)) & ((ys >= 0) | (steps[active, 1] > 0))
+
+    tiles = world.get_tiles(cells[active, 0], ys, cells[active, 2])
+    hit = COLLIDABLE[tiles]
+    hit_rays = active[hit]
+    distances[hit_rays] = travelled[hit]
+    hits[hit_rays] = cells[hit_rays]
+    faces[hit_rays] = np.where(steps[hit_rays, axes[hit]] > 0, 0, 1) + axes[hit].choose([4, 0, 2])
+    active = active[~hit & in_world]
+
+  return distances, hits, faces
+
+# True for every pair of points with no collidable tile in between
+def has_line_of_sight(world, starts: np.ndarray, ends: np.ndarray) -> np.ndarray:
+  starts = np.asarray(starts, dtype=np.float64)
+  ends = np.asarray(ends, dtype=np.float64)
+  directions = ends - starts
+  lengths = np.linalg.norm(directions, axis=1)
+  distances, _, _ = raycast_many(world, starts, directions, lengths)
+  return distances >= lengths
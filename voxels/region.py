@@ -0,0 +1,157 @@
+import os
+import queue
+import struct
+import threading
+import zlib
+
+# Region files hold 32x32 chunks. The first sector is an offset table with one 4 byte entry per
+# chunk: 3 bytes for the first sector of the chunk's data and 1 byte for its length in sectors.
+# Chunk data is a 4 byte length, a compression byte and the compressed chunk data, padded to a sector.
+REGION_SIZE = 32
+SECTOR_SIZE = 4096
+COMPRESSION_ZLIB = 1
+
+def region_path(save_dir: str, cx: int, cz: int) -> str:
+  return os.path.join(save_dir, "region", f"r.{cx // REGION_SIZE}.{cz // REGION_SIZE}.dat")
+
+def entry_index(cx: int, cz: int) -> int:
+  return (cx % REGION_SIZE) + (cz % REGION_SIZE) * REGION_SIZE
+
+def read_region_chunk(save_dir: str, cx: int, cz: int) -> bytes | None:
+  path = region_path(save_dir, cx, cz)
+  if not os.path.exists(path):
+    return None
+
+  with open(path, "rb") as f:
+    f.seek(entry_index(cx, cz) * 4)
+    entry = f.read(4)
+    offset = int.from_bytes(entry[0:3], "big")
+    if len(entry) < 4 or offset == 0:
+      return None
+
+    f.seek(offset * SECTOR_SIZE)
+    length, compression = struct.unpack(">IB", f.read(5))
+    if compression != COMPRESSION_ZLIB:
+      return None
+    return zlib.decompress(f.read(length - 1))
+
+class RegionFile:
+  def __init__(self, path: str):
+    if os.path.exists(path):
+      self.__file = open(path, "r+b")
+    else:
+      self.__file = open(path, "w+b")
+      self.__file.write(bytes(SECTOR_SIZE))
+      self.__file.flush()
+
+    self.__file.seek(0)
+    header = self.__file.read(SECTOR_SIZE)
+    self.__entries = [(int.from_bytes(header[i:i + 3], "big"), header[i + 3]) for i in range(0, SECTOR_SIZE, 4)]
+
+    self.__file.seek(0, os.SEEK_END)
+    self.__used_sectors = [False] * max(1, (self.__file.tell() + SECTOR_SIZE - 1) // SECTOR_SIZE)
+    self.__used_sectors[0] = True
+    for offset, count in self.__entries:
+      if offset != 0:
+        self.__mark_sectors(offset, count, True)
+
+  def __mark_sectors(self, offset: int, count: int, used: bool):
+    if offset + count > len(self.__used_sectors):
+      self.__used_sectors.extend([False] * (offset + count - len(self.__used_sectors)))
+    for i in range(offset, offset + count):
+      self.__used_sectors[i] = used
+
+  def __find_free_sectors(self, count: int) -> int:
+    run_start = 0
+    run_length = 0
+    for i, used in enumerate(self.__used_sectors):
+      if used:
+        run_length = 0
+        continue
+      if run_length == 0:
+        run_start = i
+      run_length += 1
+      if run_length == count:
+        return run_start
+    # Grow the file, reusing a free run at its end if there is one
+    return run_start if run_length > 0 else len(self.__used_sectors)
+
+  # Only touches the chunk's own sectors and table entry, the rest of the region is left alone
+  def write_chunk(self, cx: int, cz: int, blocks: bytes):
+    compressed = zlib.compress(blocks)
+    data = struct.pack(">IB", len(compressed) + 1, COMPRESSION_ZLIB) + compressed
+    sectors = (len(data) + SECTOR_SIZE - 1) // SECTOR_SIZE
+    if sectors > 255:
+      raise ValueError(f"Chunk [{cx}, {cz}] is too big for a region file")
+
+    index = entry_index(cx, cz)
+    offset, count = self.__entries[index]
+
+    if offset != 0 and sectors <= count:
+      self.__mark_sectors(offset + sectors, count - sectors, False)
+    else:
+      if offset != 0:
+        self.__mark_sectors(offset, count, False)
+      offset = self.__find_free_sectors(sectors)
+
+    self.__mark_sectors(offset, sectors, True)
+    self.__file.seek(offset * SECTOR_SIZE)
+    self.__file.write(data + bytes(sectors * SECTOR_SIZE - len(data)))
+
+    self.__entries[index] = (offset, sectors)
+    self.__file.seek(index * 4)
+    self.__file.write(offset.to_bytes(3, "big") + bytes([sectors]))
+    self.__file.flush()
+
+  def close(self):
+    self.__file.close()
+
+# Writes chunks to their region files on a background thread. Chunks waiting to be written are
+# kept in memory so a chunk that is loaded again before its save finishes doesn't read stale data.
+class WorldStorage:
+  def __init__(self, save_dir: str):
+    self.save_dir = save_dir
+    os.makedirs(os.path.join(save_dir, "region"), exist_ok=True)
+    self.__regions: dict[str, RegionFile] = {}
+    self.__pending: dict[tuple[int, int], bytes] = {}
+    self.__lock = threading.Lock()
+    self.__queue = queue.Queue()
+    self.__thread = threading.Thread(target=self.__run, name="World Storage", daemon=True)
+    self.__thread.start()
+
+  def save_chunk(self, key: tuple[int, int], blocks: bytes):
+    with self.__lock:
+      self.__pending[key] = blocks
+    self.__queue.put(key)
+
+  def get_pending_chunk(self, key: tuple[int, int]) -> bytes | None:
+    with self.__lock:
+      return self.__pending.get(key)
+
+  def __run(self):
+    while True:
+      key = self.__queue.get()
+      if key == None:
+        break
+
+      with self.__lock:
+        blocks = self.__pending.get(key)
+      if blocks == None:
+        continue
+
+      path = region_path(self.save_dir, key[0], key[1])
+      if self.__regions.get(path) == None:
+        self.__regions[path] = RegionFile(path)
+      self.__regions[path].write_chunk(key[0], key[1], blocks)
+
+      with self.__lock:
+        if self.__pending.get(key) is blocks:
+          del self.__pending[key]
+
+  # Writes everything still queued and closes the region files
+  def close(self):
+    self.__queue.put(None)
+    self.__thread.join()
+    for region in self.__regions.values():
+      region.close()
+    self.__regions.clear()
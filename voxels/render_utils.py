@@ -0,0 +1,122 @@
+from __future__ import annotations
+from OpenGL.GL import *
+from array import array
+import numpy as np
+import ctypes
+from constants import *
+
+# Interleaved vertex layout shared by VertexDrawer, VertexBuffer and the chunk mesher
+VERTEX_STRIDE = VERTEX_SIZE * 4
+
+def set_vertex_pointers(pointer: int):
+  glEnableClientState(GL_VERTEX_ARRAY)
+  glEnableClientState(GL_TEXTURE_COORD_ARRAY)
+  glEnableClientState(GL_COLOR_ARRAY)
+  glVertexPointer(3, GL_FLOAT, VERTEX_STRIDE, ctypes.c_void_p(pointer))
+  glTexCoordPointer(2, GL_FLOAT, VERTEX_STRIDE, ctypes.c_void_p(pointer + 12))
+  glColorPointer(4, GL_FLOAT, VERTEX_STRIDE, ctypes.c_void_p(pointer + 20))
+
+def unset_vertex_pointers():
+  glDisableClientState(GL_COLOR_ARRAY)
+  glDisableClientState(GL_TEXTURE_COORD_ARRAY)
+  glDisableClientState(GL_VERTEX_ARRAY)
+
+# Draws interleaved x, y, z, u, v, r, g, b, a float32 rows straight from client memory
+def draw_vertex_array(vertices, mode):
+  if len(vertices) == 0:
+    return
+
+  set_vertex_pointers(vertices.ctypes.data)
+  glDrawArrays(mode, 0, len(vertices))
+  unset_vertex_pointers()
+
+class VertexBuffer:
+  def __init__(self) -> None:
+    self.__id = -1
+    self.__capacity = 0
+    self.__vertex_count = 0
+
+  @property
+  def vertex_count(self) -> int:
+    return self.__vertex_count
+
+  def upload(self, vertices):
+    self.__vertex_count = len(vertices)
+    if self.__vertex_count == 0:
+      return
+
+    if self.__id == -1:
+      self.__id = glGenBuffers(1)
+
+    glBindBuffer(GL_ARRAY_BUFFER, self.__id)
+    if vertices.nbytes > self.__capacity:
+      # Leave some headroom so placing a few blocks doesn't reallocate the buffer
+      self.__capacity = vertices.nbytes + vertices.nbytes // 4
+      glBufferData(GL_ARRAY_BUFFER, self.__capacity, None, GL_DYNAMIC_DRAW)
+    glBufferSubData(GL_ARRAY_BUFFER, 0, vertices.nbytes, vertices)
+    glBindBuffer(GL_ARRAY_BUFFER, 0)
+
+  def draw(self, mode, first: int = 0, count: int | None = None):
+    if self.__vertex_count == 0:
+      return
+
+    glBindBuffer(GL_ARRAY_BUFFER, self.__id)
+    set_vertex_pointers(0)
+    glDrawArrays(mode, first, self.__vertex_count - first if count == None else count)
+    unset_vertex_pointers()
+    glBindBuffer(GL_ARRAY_BUFFER, 0)
+
+  def dispose(self):
+    if self.__id != -1:
+      glDeleteBuffers(1, [self.__id])
+      self.__id = -1
+    self.__capacity = 0
+    self.__vertex_count = 0
+
+# Collects vertices into a growable float array; flush() draws them with one call and
+# build() hands them over as a NumPy array for uploading into a VertexBuffer
+class VertexDrawer:
+  def __init__(self) -> None:
+    self.__data = array('f')
+    self.__glType = 0
+    self.__color = (1.0, 1.0, 1.0, 1.0)
+    self.__uv = (0.0, 0.0)
+
+  @property
+  def vertex_count(self) -> int:
+    return len(self.__data) // VERTEX_SIZE
+
+  def begin(self, glType):
+    self.__glType = glType
+
+  def build(self):
+    vertices = np.frombuffer(self.__data, dtype=np.float32).reshape(-1, VERTEX_SIZE).copy()
+    self.__data = array('f')
+    return vertices
+
+  def flush(self, print_vertices = False):
+    if len(self.__data) > 0:
+      if print_vertices:
+        print(self.vertex_count)
+      draw_vertex_array(np.frombuffer(self.__data, dtype=np.float32).reshape(-1, VERTEX_SIZE), self.__glType)
+    self.__data = array('f')
+
+  def vertex(self, x, y, z):
+    self.__data.extend((x, y, z) + self.__uv + self.__color)
+
+  def vertex_uv(self, x, y, z, u, v):
+    self.__uv = (u, v)
+    self.__data.extend((x, y, z, u, v) + self.__color)
+
+  def vertex_uv_color(self, x, y, z, u, v, r, g, b, a):
+    self.__color = (r, g, b, a)
+    self.__uv = (u, v)
+    self.__data.extend((x, y, z, u, v, r, g, b, a))
+
+  def color(self, r: float, g: float, b: float, a: float):
+    self.__color = (r, g, b, a)
+    return self
+
+  def texture(self, u: float, v: float):
+    self.__uv = (u, v)
+    return self
@@ -0,0 +1,52 @@
+import json
+import marshal
+import os
+from utils import JSONWithCommentsDecoder
+
+RESOURCE_DIR = "res/"
+CACHE_PATH = "cache/resources.bin"
+# Changed when the cache changes form so old ones are parsed again
+CACHE_VERSION = 1
+
+# path: ((modification time, size), parsed data), read from CACHE_PATH the first time it's needed
+resource_cache: dict[str, tuple[tuple[int, int], object]] | None = None
+
+def read_resource_cache() -> dict:
+  try:
+    with open(CACHE_PATH, "rb") as f:
+      version, entries = marshal.load(f)
+    if version == CACHE_VERSION and isinstance(entries, dict):
+      return entries
+  except (OSError, EOFError, ValueError, TypeError):
+    pass
+  return {}
+
+# Written to another file and moved in place, the chunk job processes import tiles at the same time
+def write_resource_cache(entries: dict):
+  try:
+    os.makedirs(os.path.dirname(CACHE_PATH), exist_ok=True)
+    temp_path = f"{CACHE_PATH}.{os.getpid()}.tmp"
+    with open(temp_path, "wb") as f:
+      marshal.dump((CACHE_VERSION, entries), f)
+    os.replace(temp_path, CACHE_PATH)
+  except OSError:
+    pass
+
+# Parses a JSON file under res/. Everything parsed is kept in one marshal file in cache/ with the
+# modification time and size of the file it came from, so a later start only reads that file and
+# checks the times. A file that changed since is parsed again and the cache rewritten.
+def load_json(path: str, comments: bool = False):
+  global resource_cache
+  if resource_cache is None:
+    resource_cache = read_resource_cache()
+  stat = os.stat(RESOURCE_DIR + path)
+  stamp = (stat.st_mtime_ns, stat.st_size)
+  entry = resource_cache.get(path)
+  if entry != None and tuple(entry[0]) == stamp:
+    return entry[1]
+
+  with open(RESOURCE_DIR + path, "r", encoding="utf-8") as f:
+    data = json.load(f, cls=JSONWithCommentsDecoder) if comments else json.load(f)
+  resource_cache[path] = (stamp, data)
+  write_resource_cache(resource_cache)
+  return data
@@ -0,0 +1,77 @@
+import sys
+from array import array
+import numpy as np
+from constants import *
+
+SECTION_SIZE = 16 * 16 * 16
+SECTION_COUNT = CHUNK_HEIGHT // 16
+EMPTY_SECTION = bytes(SECTION_SIZE)
+
+# A chunk's tiles split into 16 high sections of one byte per tile, indexed (y * 16 + z) * 16 + x
+# inside each section. Sections where every value is fill (air for tiles) are None and only get an
+# array once something else is placed in them.
+class ChunkSections:
+  __slots__ = ("sections", "fill", "__fill_section")
+
+  def __init__(self, blocks: bytes | None = None, fill: int = 0):
+    self.sections: list[array | None] = [None] * SECTION_COUNT
+    self.fill = fill
+    self.__fill_section = EMPTY_SECTION if fill == 0 else bytes([fill]) * SECTION_SIZE
+    if blocks != None:
+      for i in range(SECTION_COUNT):
+        data = blocks[i * SECTION_SIZE:(i + 1) * SECTION_SIZE]
+        if data != self.__fill_section:
+          self.sections[i] = array('B', data)
+
+  def get(self, x: int, y: int, z: int) -> int:
+    section = self.sections[y >> 4]
+    if section is None:
+      return self.fill
+    return section[((y & 15) * 16 + z) * 16 + x]
+
+  def set(self, x: int, y: int, z: int, tile_id: int):
+    section = self.sections[y >> 4]
+    if section is None:
+      if tile_id == self.fill:
+        return
+      section = self.sections[y >> 4] = array('B', self.__fill_section)
+    section[((y & 15) * 16 + z) * 16 + x] = tile_id
+
+  # True when every value is fill, as far as the sections that were never set go
+  def is_fill(self) -> bool:
+    return all(section is None for section in self.sections)
+
+  # Drops sections that became all fill
+  def compact(self):
+    for i, section in enumerate(self.sections):
+      if section is not None and section.tobytes() == self.__fill_section:
+        self.sections[i] = None
+
+  # A (16, 16, 16) view indexed [y, z, x] sharing the section's memory, None for all fill sections
+  def get_section_array(self, i: int) -> np.ndarray | None:
+    section = self.sections[i]
+    if section is None:
+      return None
+    return np.frombuffer(section, dtype=np.uint8).reshape(16, 16, 16)
+
+  # Like get_section_array, but an all fill section gets an array first so the view can be written to
+  def make_section_array(self, i: int) -> np.ndarray:
+    if self.sections[i] is None:
+      self.sections[i] = array('B', self.__fill_section)
+    return np.frombuffer(self.sections[i], dtype=np.uint8).reshape(16, 16, 16)
+
+  # A copy of every value as a (CHUNK_HEIGHT, 16, 16) array indexed [y, z, x]
+  def to_array(self) -> np.ndarray:
+    blocks = np.full((CHUNK_HEIGHT, 16, 16), self.fill, dtype=np.uint8)
+    for i in range(SECTION_COUNT):
+      section = self.get_section_array(i)
+      if section is not None:
+        blocks[i * 16:(i + 1) * 16] = section
+    return blocks
+
+  # Same layout as generated and saved chunks use
+  def to_bytes(self) -> bytes:
+    return b"".join(self.__fill_section if section is None else section.tobytes() for section in self.sections)
+
+  def get_memory_size(self) -> int:
+    return sys.getsizeof(self.sections) + sum(sys.getsizeof(section) for section in self.sections if section is not None)
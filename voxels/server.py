@@ -0,0 +1,278 @@
+import argparse
+import asyncio
+import math
+import struct
+import time
+from collections import deque
+import numpy as np
+from constants import *
+from tiles import BLOCK_TYPES
+from world import World
+from headless import HeadlessGame
+from protocol import *
+
+# Run from the voxels folder: python server.py [--port N] [--save DIR] [--render-distance N]
+# Runs a headless world and streams it to clients: whole chunks as they come into a client's range,
+# then the tiles that changed during every tick, batched per chunk. Clients only send where their
+# player is and the tiles they place or break, the server's world is the one that counts.
+
+# A world kept loaded around every connected client as well as the server's own spawn player
+class ServerWorld(World):
+  def __init__(self, game, server, save_dir: str | None = None):
+    self.server = server
+    super().__init__(game, save_dir)
+
+  def get_load_centers(self) -> list[tuple[int, int]]:
+    return [self.get_player_chunk()] + [client.chunk for client in self.server.clients if client.chunk != None]
+
+class ClientConnection:
+  def __init__(self, writer: asyncio.StreamWriter, name: str, render_distance: int):
+    self.writer = writer
+    self.name = name
+    self.render_distance = render_distance
+    self.x = 0.0
+    self.y = 0.0
+    self.z = 0.0
+    self.rot_x = 0.0
+    self.rot_y = 0.0
+    # Chunk the client's player is in, None until it sends where it is
+    self.chunk: tuple[int, int] | None = None
+    # Chunks the client was sent and wasn't told to unload since, it gets the changes to these
+    self.sent_chunks: set[tuple[int, int]] = set()
+    self.bytes_sent = 0
+    self.bytes_received = 0
+    self.chunks_sent = 0
+    self.deltas_sent = 0
+    # Seconds of server ticks spent on this client
+    self.send_time = 0.0
+
+  # Bytes written but not sent yet, a client that doesn't keep up gets no new chunks until it catches up
+  @property
+  def backlog(self) -> int:
+    return self.writer.transport.get_write_buffer_size()
+
+  def send(self, data: bytes):
+    if self.writer.is_closing():
+      return
+    self.writer.write(data)
+    self.bytes_sent += len(data)
+
+  def set_state(self, x: float, y: float, z: float, rot_x: float, rot_y: float):
+    self.x = x
+    self.y = y
+    self.z = z
+    self.rot_x = rot_x
+    self.rot_y = rot_y
+    self.chunk = (math.floor(x) // 16, math.floor(z) // 16)
+
+class Server:
+  TICKS_PER_SECOND = 60
+  MAX_CHUNKS_PER_CLIENT_PER_TICK = 4
+  MAX_CLIENT_BACKLOG = 1 << 20
+  # Changed tiles in one chunk in one tick past which the chunk is sent whole instead
+  MAX_DELTAS_PER_CHUNK = 2048
+  # Tick times kept for get_tick_times
+  TICK_HISTORY = 60 * 60
+
+  def __init__(self, save_dir: str | None = None, render_distance: int = 4):
+    self.game = HeadlessGame(render_distance)
+    self.clients: list[ClientConnection] = []
+    self.world = ServerWorld(self.game, self, save_dir)
+    self.game.world = self.world
+    self.world.changed_tiles = {}
+    self.world.listeners.append(self)
+    self.tick_count = 0
+    self.tick_times: deque[float] = deque(maxlen=Server.TICK_HISTORY)
+    # Encoded CHUNK messages, shared by every client the chunk is sent to until it changes
+    self.__chunk_messages: dict[tuple[int, int], bytes] = {}
+    self.__server: asyncio.Server | None = None
+    self.__running = False
+
+  # Listens on host and port, port 0 picks a free one. Returns the port.
+  async def start(self, host: str = "127.0.0.1", port: int = 25565) -> int:
+    self.world.wait_for_generation()
+    self.__server = await asyncio.start_server(self.__handle_client, host, port)
+    return self.__server.sockets[0].getsockname()[1]
+
+  # A client that sends something that can't be read is dropped like one that disconnected
+  async def __handle_client(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+    client = None
+    try:
+      message = await read_message(reader)
+      if message is None or message[0] != LOGIN:
+        return
+      payload = message[1]
+      render_distance = LOGIN_FORMAT.unpack_from(payload)[0]
+      name = payload[LOGIN_FORMAT.size:].decode("utf-8")
+
+      # Chunks are only loaded as far as the server's own render distance
+      client = ClientConnection(writer, name, min(render_distance, self.game.settings.render_distance))
+      client.bytes_received += HEADER.size + len(payload)
+      player = self.game.player
+      client.set_state(player.x, player.y, player.z, 0.0, 0.0)
+      client.send(encode_message(LOGIN_OK, LOGIN_OK_FORMAT.pack(player.x, player.y, player.z, Server.TICKS_PER_SECOND)))
+      self.clients.append(client)
+      if DEBUG_PRINTS:
+        print(f"{name} joined")
+
+      while True:
+        message = await read_message(reader)
+        if message is None:
+          break
+        message_type, payload = message
+        client.bytes_received += HEADER.size + len(payload)
+        self.__handle_message(client, message_type, payload)
+    except (ConnectionError, struct.error, UnicodeDecodeError):
+      pass
+    finally:
+      writer.close()
+      if client != None:
+        self.clients.remove(client)
+        if DEBUG_PRINTS:
+          print(f"{client.name} left")
+
+  def __handle_message(self, client: ClientConnection, message_type: int, payload: bytes):
+    if message_type == PLAYER_STATE:
+      client.set_state(*PLAYER_STATE_FORMAT.unpack_from(payload))
+    elif message_type == SET_TILE:
+      x, y, z, tile_id = SET_TILE_FORMAT.unpack_from(payload)
+      if tile_id == 0 or tile_id in BLOCK_TYPES:
+        self.world.set_tile(x, y, z, tile_id)
+
+  def on_chunk_added(self, chunk):
+    pass
+
+  def on_chunk_dirty(self, chunk):
+    pass
+
+  def on_chunk_removed(self, chunk):
+    self.__chunk_messages.pop((chunk.x, chunk.z), None)
+
+  def __get_chunk_message(self, chunk) -> bytes:
+    key = (chunk.x, chunk.z)
+    message = self.__chunk_messages.get(key)
+    if message == None:
+      chunk.sections.compact()
+      chunk.fluid.compact()
+      message = encode_chunk(chunk.x, chunk.z, chunk.sections.to_bytes(), None if chunk.fluid.is_fill() else chunk.fluid.to_bytes())
+      self.__chunk_messages[key] = message
+    return message
+
+  # Sends the tiles changed since the last tick to every client that has their chunk
+  def __send_changes(self):
+    changed_tiles = self.world.changed_tiles
+    if len(changed_tiles) == 0:
+      return
+    self.world.changed_tiles = {}
+
+    for key, indices in changed_tiles.items():
+      self.__chunk_messages.pop(key, None)
+      chunk = self.world.chunks.get(key)
+      receivers = [client for client in self.clients if key in client.sent_chunks]
+      if chunk is None or len(receivers) == 0:
+        continue
+
+      if len(indices) > Server.MAX_DELTAS_PER_CHUNK:
+        message = self.__get_chunk_message(chunk)
+      else:
+        index_list = list(indices)
+        get_tile = chunk.sections.get
+        get_level = chunk.fluid.get
+        tiles = [get_tile(i & 15, i >> 8, (i >> 4) & 15) for i in index_list]
+        levels = [get_level(i & 15, i >> 8, (i >> 4) & 15) for i in index_list]
+        message = encode_block_deltas(key[0], key[1], np.array(index_list, dtype=np.int64), np.array(tiles, dtype=np.uint8), np.array(levels, dtype=np.uint8))
+
+      for client in receivers:
+        client.send(message)
+        client.deltas_sent += len(indices)
+
+  # Unloads the client's chunks that went out of range and sends it the nearest ones it doesn't have
+  def __stream_chunks(self, client: ClientConnection):
+    if client.chunk == None:
+      return
+    cx, cz = client.chunk
+    load_distance = client.render_distance + 1
+
+    # One further than they are sent, like World does, so walking along a border doesn't resend chunks
+    for key in [key for key in client.sent_chunks if (key[0] - cx) ** 2 + (key[1] - cz) ** 2 > (load_distance + 1) ** 2]:
+      client.sent_chunks.remove(key)
+      client.send(encode_message(UNLOAD_CHUNK, CHUNK_KEY_FORMAT.pack(key[0], key[1])))
+
+    if client.backlog > Server.MAX_CLIENT_BACKLOG:
+      return
+
+    missing = []
+    for x in range(cx - load_distance, cx + load_distance + 1):
+      for z in range(cz - load_distance, cz + load_distance + 1):
+        distance_sq = (x - cx) ** 2 + (z - cz) ** 2
+        if distance_sq <= load_distance ** 2 and (x, z) not in client.sent_chunks and (x, z) in self.world.chunks:
+          missing.append((distance_sq, x, z))
+    missing.sort()
+
+    for _, x, z in missing[:Server.MAX_CHUNKS_PER_CLIENT_PER_TICK]:
+      client.send(self.__get_chunk_message(self.world.chunks[(x, z)]))
+      client.sent_chunks.add((x, z))
+      client.chunks_sent += 1
+
+  def tick(self):
+    start_time = time.perf_counter()
+    self.world.process_jobs()
+    self.world.tick()
+    self.__send_changes()
+    self.tick_count += 1
+    tick_message = encode_message(TICK, TICK_FORMAT.pack(self.tick_count & 0xFFFFFFFF))
+    for client in self.clients:
+      client_start = time.perf_counter()
+      self.__stream_chunks(client)
+      client.send(tick_message)
+      client.send_time += time.perf_counter() - client_start
+    self.tick_times.append(time.perf_counter() - start_time)
+
+  # Ticks at TICKS_PER_SECOND until stop() is called or duration seconds went by. Ticks that fall
+  # more than a second behind are dropped rather than run back to back.
+  async def run(self, duration: float | None = None):
+    loop = asyncio.get_running_loop()
+    interval = 1 / Server.TICKS_PER_SECOND
+    end_time = loop.time() + duration if duration != None else None
+    next_tick = loop.time()
+    self.__running = True
+    while self.__running and (end_time == None or loop.time() < end_time):
+      self.tick()
+      next_tick += interval
+      now = loop.time()
+      if now - next_tick > 1.0:
+        next_tick = now
+      await asyncio.sleep(max(0.0, next_tick - now))
+
+  def stop(self):
+    self.__running = False
+
+  async def close(self):
+    self.stop()
+    if self.__server != None:
+      self.__server.close()
+      await self.__server.wait_closed()
+    for client in list(self.clients):
+      client.writer.close()
+    self.game.close_world()
+
+async def serve(host: str, port: int, save_dir: str | None, render_distance: int):
+  server = Server(save_dir, render_distance)
+  port = await server.start(host, port)
+  print(f"Listening on {host}:{port}")
+  try:
+    await server.run()
+  finally:
+    await server.close()
+
+if __name__ == "__main__":
+  parser = argparse.ArgumentParser(description="Runs a world for clients started with main.py --connect")
+  parser.add_argument("--host", default="127.0.0.1")
+  parser.add_argument("--port", type=int, default=25565)
+  parser.add_argument("--save", default="saves/server", help="world folder to load and save")
+  parser.add_argument("--render-distance", type=int, default=4, help="furthest chunks are sent to clients")
+  args = parser.parse_args()
+  try:
+    asyncio.run(serve(args.host, args.port, args.save, args.render_distance))
+  except KeyboardInterrupt:
+    pass
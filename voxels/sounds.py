@@ -0,0 +1,49 @@
+import os
+import threading
+import time
+from constants import *
+
+# pygame is only used for sounds, so it's imported and the sounds are loaded on a thread of their own
+# while the window opens. Sounds played before they finished loading are skipped.
+class SoundManager:
+  def __init__(self):
+    self.__sounds = {}
+    self.__thread: threading.Thread | None = None
+    self.__pygame = None
+    # Seconds the loading thread took
+    self.load_time = 0.0
+
+  # sounds maps names to (path, volume)
+  def load(self, sounds: dict[str, tuple[str, float]]):
+    self.__thread = threading.Thread(target=self.__load, args=(sounds,), name="sounds", daemon=True)
+    self.__thread.start()
+
+  def __load(self, sounds: dict[str, tuple[str, float]]):
+    start_time = time.perf_counter()
+    os.environ['PYGAME_HIDE_SUPPORT_PROMPT'] = "hide"
+    try:
+      import pygame
+      pygame.mixer.init()
+      self.__pygame = pygame
+      for name, (path, volume) in sounds.items():
+        sound = pygame.mixer.Sound(path)
+        sound.set_volume(volume)
+        self.__sounds[name] = sound
+    except Exception as e:
+      if DEBUG_PRINTS:
+        print(f"Sounds unavailable: {e}")
+    self.load_time = time.perf_counter() - start_time
+
+  def is_loaded(self) -> bool:
+    return self.__thread != None and not self.__thread.is_alive()
+
+  def play(self, name: str):
+    sound = self.__sounds.get(name)
+    if sound != None:
+      sound.play()
+
+  def dispose(self):
+    if self.__thread != None:
+      self.__thread.join()
+    if self.__pygame != None:
+      self.__pygame.quit()
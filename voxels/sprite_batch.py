@@ -0,0 +1,135 @@
+from array import array
+from OpenGL.GL import *
+from constants import *
+from render_utils import VertexBuffer
+from profiler import PROFILER
+import numpy as np
+
+BLEND_NONE = 0
+BLEND_ALPHA = 1
+# Inverts what is behind, like the crosshair
+BLEND_INVERT = 2
+
+# Text goes above every sprite drawn with the default layers
+TEXT_LAYER = 10
+
+# Collects GUI quads and draws them with as few draw calls as possible. Quads are grouped by layer,
+# blend mode and texture, and flush() uploads all of them into one vertex buffer and draws each group
+# with a single call, lower layers first. Within a group quads keep the order they were added in, but
+# groups of the same layer can be drawn in any order, so sprites that overlap something with another
+# texture or blend mode have to go in a higher layer. Images in a texture atlas share the atlas' groups.
+class SpriteBatch:
+  def __init__(self, texture_manager):
+    self.texture_manager = texture_manager
+    self.__groups: dict[tuple[int, int, str], array] = {}
+    self.__buffer = VertexBuffer()
+    # Since reset_counts
+    self.draw_calls = 0
+    self.quad_count = 0
+
+  def reset_counts(self):
+    self.draw_calls = 0
+    self.quad_count = 0
+
+  # Adds a quad from (x0, y0) to (x1, y1) showing the texture between (u0, v0) and (u1, v1). A
+  # texture of None draws the quad in plain color.
+  def quad(self, texture_name: str | None, x0: float, y0: float, x1: float, y1: float, u0: float = 0.0, v0: float = 0.0, u1: float = 0.0, v1: float = 0.0, color: int = 0xFFFFFF, alpha: float = 1.0, blend: int = BLEND_ALPHA, layer: int = 0):
+    key = (layer, blend, texture_name or "")
+    data = self.__groups.get(key)
+    if data is None:
+      self.__groups[key] = data = array('f')
+    r = (color >> 16 & 0xFF) / 255.0
+    g = (color >> 8 & 0xFF) / 255.0
+    b = (color & 0xFF) / 255.0
+    data.extend((
+      x0, y0, 0.0, u0, v0, r, g, b, alpha,
+      x0, y1, 0.0, u0, v1, r, g, b, alpha,
+      x1, y1, 0.0, u1, v1, r, g, b, alpha,
+      x1, y0, 0.0, u1, v0, r, g, b, alpha
+    ))
+
+  # A quad taking pixel coordinates on a tw x th texture
+  def sprite(self, texture_name: str, x: float, y: float, width: float, height: float, u: float, v: float, us: float, vs: float, tw: int, th: int, color: int = 0xFFFFFF, blend: int = BLEND_ALPHA, layer: int = 0):
+    self.quad(texture_name, x, y, x + width, y + height, u / tw, v / th, (u + us) / tw, (v + vs) / th, color, 1.0, blend, layer)
+
+  # Adds prebuilt quads, an array of vertices, moved by (x, y)
+  def mesh(self, texture_name: str | None, vertices: np.ndarray, x: float = 0.0, y: float = 0.0, blend: int = BLEND_ALPHA, layer: int = 0):
+    if len(vertices) == 0:
+      return
+    key = (layer, blend, texture_name or "")
+    data = self.__groups.get(key)
+    if data is None:
+      self.__groups[key] = data = array('f')
+    if x != 0.0 or y != 0.0:
+      vertices = vertices + np.array((x, y, 0.0, 0.0, 0.0, 0.0, 0.0, 0.0, 0.0), dtype=np.float32)
+    data.frombytes(vertices.tobytes())
+
+  # Stretches the middle of the texture region to fill the size while the borders, given as
+  # (left, top, right, bottom) in pixels, keep their size
+  def nineslice(self, texture_name: str, pos: tuple[int, int], size: tuple[int, int], uv: tuple[int, int], uv_size: tuple[int, int], nineslice: tuple[int, int, int, int], tw: int, th: int, blend: int = BLEND_ALPHA, layer: int = 0):
+    left, top, right, bottom = nineslice
+    xs = (pos[0], pos[0] + left, pos[0] + size[0] - right, pos[0] + size[0])
+    ys = (pos[1], pos[1] + top, pos[1] + size[1] - bottom, pos[1] + size[1])
+    us = (uv[0], uv[0] + left, uv[0] + uv_size[0] - right, uv[0] + uv_size[0])
+    vs = (uv[1], uv[1] + top, uv[1] + uv_size[1] - bottom, uv[1] + uv_size[1])
+    for row in range(3):
+      for column in range(3):
+        self.quad(texture_name, xs[column], ys[row], xs[column + 1], ys[row + 1], us[column] / tw, vs[row] / th, us[column + 1] / tw, vs[row + 1] / th, 0xFFFFFF, 1.0, blend, layer)
+
+  # Draws everything added since the last flush with the current matrices
+  def flush(self):
+    if len(self.__groups) == 0:
+      return
+    with PROFILER.scope("gui flush"):
+      self.__flush()
+
+  def __flush(self):
+    # Images in an atlas are drawn with the atlas, their texture coordinates moved into their part of it
+    merged: dict[tuple[int, int, str], list[np.ndarray]] = {}
+    for (layer, blend, texture_name), data in sorted(self.__groups.items()):
+      group = np.frombuffer(data, dtype=np.float32).reshape(-1, VERTEX_SIZE)
+      if texture_name != "":
+        texture = self.texture_manager.get(texture_name)
+        if texture.atlas_name != None:
+          u, v, us, vs = texture.uv_rect
+          group = group.copy()
+          group[:, 3] = u + group[:, 3] * us
+          group[:, 4] = v + group[:, 4] * vs
+          texture_name = texture.atlas_name
+      merged.setdefault((layer, blend, texture_name), []).append(group)
+    self.__groups.clear()
+
+    keys = sorted(merged.keys())
+    counts = [sum(len(group) for group in merged[key]) for key in keys]
+    vertices = np.concatenate([group for key in keys for group in merged[key]])
+    self.__buffer.upload(vertices)
+
+    first = 0
+    bound_blend = -1
+    for (_, blend, texture_name), count in zip(keys, counts):
+      if blend != bound_blend:
+        if blend == BLEND_NONE:
+          glDisable(GL_BLEND)
+        else:
+          glEnable(GL_BLEND)
+          if blend == BLEND_INVERT:
+            glBlendFunc(GL_ONE_MINUS_DST_COLOR, GL_ONE_MINUS_SRC_COLOR)
+          else:
+            glBlendFunc(GL_SRC_ALPHA, GL_ONE_MINUS_SRC_ALPHA)
+        bound_blend = blend
+      if texture_name == "":
+        glDisable(GL_TEXTURE_2D)
+      else:
+        glEnable(GL_TEXTURE_2D)
+        self.texture_manager.get(texture_name).bind()
+      self.__buffer.draw(GL_QUADS, first, count)
+      first += count
+      self.draw_calls += 1
+
+    self.quad_count += len(vertices) // 4
+    glDisable(GL_BLEND)
+    glEnable(GL_TEXTURE_2D)
+    glColor4f(1.0, 1.0, 1.0, 1.0)
+
+  def dispose(self):
+    self.__buffer.dispose()
@@ -0,0 +1,21 @@
+import time
+
+# Times the phases of starting the game, each mark ends the phase that started at the previous one
+class StartupProfile:
+  def __init__(self):
+    self.start_time = time.perf_counter()
+    self.__last_time = self.start_time
+    self.phases: list[tuple[str, float]] = []
+
+  def mark(self, name: str):
+    now = time.perf_counter()
+    self.phases.append((name, now - self.__last_time))
+    self.__last_time = now
+
+  def print_report(self, extra: list[tuple[str, float]] = []):
+    total = self.__last_time - self.start_time
+    print(f"Startup: {total * 1000:.1f} ms to the first frame")
+    for name, elapsed in self.phases:
+      print(f"  {name:<20} {elapsed * 1000:8.1f} ms {elapsed / total * 100:5.1f}%")
+    for name, elapsed in extra:
+      print(f"  {name:<20} {elapsed * 1000:8.1f} ms (in the background)")
@@ -1,63 +1,274 @@
+from concurrent.futures import ThreadPoolExecutor, Future
 from typing import Dict
 from OpenGL.GL import *
-import PIL.Image as Image
 import numpy as np
+import hashlib
+import io
+import os
+
+TEXTURE_DIR = "res/textures/"
+# Mipmaps stop at 16x16 tiles shrunk to a pixel, smaller levels would mix neighbouring tiles
+MAX_MIPMAP_LEVEL = 4
+
+# Halves the image until it's MAX_MIPMAP_LEVEL levels down or a side can't be halved, averaging 2x2 pixels
+def build_mipmaps(pixels: np.ndarray) -> list[np.ndarray]:
+  levels = [pixels]
+  while len(levels) <= MAX_MIPMAP_LEVEL:
+    level = levels[-1]
+    height, width = level.shape[:2]
+    if width < 2 or height < 2 or width % 2 != 0 or height % 2 != 0:
+      break
+    blocks = level.reshape(height // 2, 2, width // 2, 2, 4).astype(np.uint16)
+    levels.append(((blocks.sum(axis=(1, 3)) + 2) // 4).astype(np.uint8))
+  return levels
+
+# Reads and decodes an image, run on the decoding threads. Returns its mipmap levels (just the image
+# if mipmaps is False) as height x width x 4 RGBA arrays and a hash of the file.
+def decode_image(path: str, mipmaps: bool) -> tuple[list[np.ndarray], bytes]:
+  import PIL.Image as Image
+  with open(TEXTURE_DIR + path, "rb") as f:
+    data = f.read()
+  image = Image.open(io.BytesIO(data)).convert("RGBA")
+  pixels = np.asarray(image, dtype=np.uint8)
+  return build_mipmaps(pixels) if mipmaps else [pixels], hashlib.blake2b(data, digest_size=16).digest()
 
 class Texture:
-  def __init__(self, path: str):
+  def __init__(self, repeat: bool = True):
     self.__id = -1
-    self.__path = path
+    self.__repeat = repeat
     self.__width = 0
     self.__height = 0
+    self.__level_count = 0
 
   @property
   def width(self) -> int:
     return self.__width
-  
+
   @property
   def height(self) -> int:
     return self.__height
-  
+
+  # Name of the atlas the texture is in, None for a texture of its own
+  @property
+  def atlas_name(self) -> str | None:
+    return None
+
+  # Where the texture is in the bound texture as (u, v, width, height)
+  @property
+  def uv_rect(self) -> tuple[float, float, float, float]:
+    return (0.0, 0.0, 1.0, 1.0)
+
   def bind(self):
-    if self.__id == -1:
-      self.__id = glGenTextures(1)
     glBindTexture(GL_TEXTURE_2D, self.__id)
 
-  def upload_to_gpu(self):
-    image = Image.open("res/textures/" + self.__path).convert("RGBA")
-    self.__width = image.width
-    self.__height = image.height
+  # Uploads the image and its mipmaps, if the size didn't change the storage is kept and overwritten
+  def upload(self, levels: list[np.ndarray]):
+    height, width = levels[0].shape[:2]
+    resized = self.__id == -1 or width != self.__width or height != self.__height or len(levels) != self.__level_count
+    if self.__id == -1:
+      self.__id = glGenTextures(1)
+    self.__width = width
+    self.__height = height
+    self.__level_count = len(levels)
 
-    image_data = np.frombuffer(image.tobytes(), np.uint8)
+    self.bind()
+    glPixelStorei(GL_UNPACK_ALIGNMENT, 1)
+    if resized:
+      glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MIN_FILTER, GL_NEAREST_MIPMAP_LINEAR if len(levels) > 1 else GL_NEAREST)
+      glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MAG_FILTER, GL_NEAREST)
+      glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_WRAP_S, GL_REPEAT if self.__repeat else GL_CLAMP_TO_EDGE)
+      glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_WRAP_T, GL_REPEAT if self.__repeat else GL_CLAMP_TO_EDGE)
+      glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MAX_LEVEL, len(levels) - 1)
+    for level, pixels in enumerate(levels):
+      pixels = np.ascontiguousarray(pixels)
+      if resized:
+        glTexImage2D(GL_TEXTURE_2D, level, GL_RGBA, pixels.shape[1], pixels.shape[0], 0, GL_RGBA, GL_UNSIGNED_BYTE, pixels)
+      else:
+        glTexSubImage2D(GL_TEXTURE_2D, level, 0, 0, pixels.shape[1], pixels.shape[0], GL_RGBA, GL_UNSIGNED_BYTE, pixels)
+    glBindTexture(GL_TEXTURE_2D, 0)
 
+  # Overwrites part of the top level
+  def upload_region(self, x: int, y: int, pixels: np.ndarray):
     self.bind()
-    glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MIN_FILTER, GL_NEAREST)
-    glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MAG_FILTER, GL_NEAREST)
-    glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_WRAP_S, GL_REPEAT)
-    glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_WRAP_T, GL_REPEAT)
-    glTexImage2D(GL_TEXTURE_2D, 0, GL_RGBA, self.__width, self.__height, 0, GL_RGBA, GL_UNSIGNED_BYTE, image_data)
+    glPixelStorei(GL_UNPACK_ALIGNMENT, 1)
+    glTexSubImage2D(GL_TEXTURE_2D, 0, x, y, pixels.shape[1], pixels.shape[0], GL_RGBA, GL_UNSIGNED_BYTE, np.ascontiguousarray(pixels))
     glBindTexture(GL_TEXTURE_2D, 0)
 
   def dispose(self):
-    glDeleteTextures([self.__id])
-    self.__id = -1
+    if self.__id != -1:
+      glDeleteTextures([self.__id])
+      self.__id = -1
+
+# An image packed into an atlas. Binding it binds the whole atlas, so texture coordinates have to be
+# moved into uv_rect (SpriteBatch does) and the image can't be tiled with GL_REPEAT.
+class AtlasRegion:
+  def __init__(self, atlas_name: str, atlas: Texture):
+    self.__atlas_name = atlas_name
+    self.__atlas = atlas
+    self.x = 0
+    self.y = 0
+    self.width = 0
+    self.height = 0
+
+  @property
+  def atlas_name(self) -> str:
+    return self.__atlas_name
+
+  @property
+  def uv_rect(self) -> tuple[float, float, float, float]:
+    return (self.x / self.__atlas.width, self.y / self.__atlas.height, self.width / self.__atlas.width, self.height / self.__atlas.height)
+
+  def bind(self):
+    self.__atlas.bind()
 
+# Loads textures from res/textures. load, load_tiles and load_gui only start decoding the image on a
+# thread pool, the textures are uploaded the first time one is asked for or when upload_pending is
+# called, so the decoding runs while the game sets up everything else.
 class TextureManager:
+  DECODE_THREADS = 4
+  GUI_ATLAS = "#gui_atlas"
+  # Gap left between images in the GUI atlas
+  ATLAS_PADDING = 1
+
   def __init__(self):
-    self.__textures: Dict[str, Texture] = {}
+    self.__textures: Dict[str, Texture | AtlasRegion] = {}
+    self.__executor = ThreadPoolExecutor(max_workers=TextureManager.DECODE_THREADS, thread_name_prefix="texture")
+    # What was asked to be loaded, as (kind, path, mipmaps, tile indices and tile size), to load it again on reload
+    self.__loads: list[tuple[str, str, bool, tuple[int, ...]]] = []
+    self.__pending: list[tuple[str, str, bool, tuple[int, ...]]] = []
+    self.__decoding: dict[tuple[str, bool], Future] = {}
+    # Modification time and hash of every file loaded, the hash is only checked when the time changed
+    self.__file_times: dict[str, float] = {}
+    self.__file_hashes: dict[str, bytes] = {}
+    self.__atlas = Texture(repeat=False)
+    self.__textures[TextureManager.GUI_ATLAS] = self.__atlas
+    self.__atlas_images: dict[str, np.ndarray] = {}
 
-  def load(self, path: str):
-    texture = Texture(path)
-    texture.upload_to_gpu()
-    self.__textures[path] = texture
+  def __decode(self, path: str, mipmaps: bool):
+    key = (path, mipmaps)
+    if key not in self.__decoding:
+      self.__file_times[path] = os.path.getmtime(TEXTURE_DIR + path)
+      self.__decoding[key] = self.__executor.submit(decode_image, path, mipmaps)
 
-  def reload_textures(self):
-    for texture in self.__textures.values():
-      texture.upload_to_gpu()
+  def __add_load(self, load: tuple[str, str, bool, tuple[int, ...]]):
+    self.__loads.append(load)
+    self.__pending.append(load)
+    self.__decode(load[1], load[2])
+
+  def load(self, path: str, mipmaps: bool = False):
+    self.__textures[path] = Texture()
+    self.__add_load(("texture", path, mipmaps, ()))
+
+  # Splits an atlas into one texture per tile so a tile can be repeated with GL_REPEAT,
+  # which greedy meshed chunks rely on. Tiles are named "<path>#<index>".
+  def load_tiles(self, path: str, indices, tile_size: int = 16, mipmaps: bool = False):
+    for index in indices:
+      self.__textures[f"{path}#{index}"] = Texture()
+    self.__add_load(("tiles", path, mipmaps, tuple(sorted(indices)) + (tile_size,)))
+
+  # Packs a GUI image into the shared GUI atlas, so sprites of different images can be drawn together
+  def load_gui(self, path: str):
+    self.__textures[path] = AtlasRegion(TextureManager.GUI_ATLAS, self.__atlas)
+    self.__add_load(("gui", path, False, ()))
+
+  # Waits for the images being decoded and uploads them, must run on the thread with the GL context
+  def upload_pending(self):
+    if len(self.__pending) == 0:
+      return
+    pending = self.__pending
+    self.__pending = []
+    decoded = {key: future.result() for key, future in self.__decoding.items()}
+    self.__decoding.clear()
+
+    atlas_changed = []
+    for kind, path, mipmaps, args in pending:
+      levels, file_hash = decoded[(path, mipmaps)]
+      self.__file_hashes[path] = file_hash
+      if kind == "texture":
+        self.__textures[path].upload(levels)
+      elif kind == "tiles":
+        tile_size = args[-1]
+        tiles_per_row = levels[0].shape[1] // tile_size
+        for index in args[:-1]:
+          u = (index % tiles_per_row) * tile_size
+          v = (index // tiles_per_row) * tile_size
+          # Mipmaps are halved in 2x2 blocks, so a tile's levels are the same part of the atlas' levels
+          self.__textures[f"{path}#{index}"].upload([level[v >> i:(v + tile_size) >> i, u >> i:(u + tile_size) >> i] for i, level in enumerate(levels)])
+      elif kind == "gui":
+        self.__atlas_images[path] = levels[0]
+        atlas_changed.append(path)
+
+    if len(atlas_changed) > 0:
+      self.__update_atlas(atlas_changed)
+
+  # Copies changed images into their place in the atlas, or packs it again when one changed size
+  def __update_atlas(self, changed: list[str]):
+    if all(self.__textures[path].width == image.shape[1] and self.__textures[path].height == image.shape[0] for path, image in self.__atlas_images.items() if path in changed):
+      for path in changed:
+        region = self.__textures[path]
+        self.__atlas.upload_region(region.x, region.y, self.__atlas_images[path])
+      return
+
+    # Shelves filled left to right, tallest images first
+    padding = TextureManager.ATLAS_PADDING
+    paths = sorted(self.__atlas_images.keys(), key=lambda path: (-self.__atlas_images[path].shape[0], path))
+    width = 256
+    while width < max(image.shape[1] for image in self.__atlas_images.values()):
+      width *= 2
+    x = 0
+    y = 0
+    shelf_height = 0
+    for path in paths:
+      image_height, image_width = self.__atlas_images[path].shape[:2]
+      if x + image_width > width:
+        x = 0
+        y += shelf_height + padding
+        shelf_height = 0
+      region = self.__textures[path]
+      region.x = x
+      region.y = y
+      region.width = image_width
+      region.height = image_height
+      x += image_width + padding
+      shelf_height = max(shelf_height, image_height)
+    height = 1
+    while height < y + shelf_height:
+      height *= 2
+
+    pixels = np.zeros((height, width, 4), dtype=np.uint8)
+    for path in paths:
+      region = self.__textures[path]
+      pixels[region.y:region.y + region.height, region.x:region.x + region.width] = self.__atlas_images[path]
+    self.__atlas.upload([pixels])
+
+  # Loads the textures whose files changed since they were loaded, with the same storage where the
+  # size is the same. Returns the number of files that changed.
+  def reload_textures(self) -> int:
+    self.upload_pending()
+    changed = set()
+    for path, file_time in self.__file_times.items():
+      new_time = os.path.getmtime(TEXTURE_DIR + path)
+      if new_time == file_time:
+        continue
+      self.__file_times[path] = new_time
+      with open(TEXTURE_DIR + path, "rb") as f:
+        if hashlib.blake2b(f.read(), digest_size=16).digest() != self.__file_hashes[path]:
+          changed.add(path)
+
+    for load in self.__loads:
+      if load[1] in changed:
+        self.__pending.append(load)
+        self.__decode(load[1], load[2])
+    self.upload_pending()
+    return len(changed)
 
-  def get(self, path: str) -> Texture:
+  def get(self, path: str) -> Texture | AtlasRegion:
+    if len(self.__pending) > 0:
+      self.upload_pending()
     return self.__textures[path]
 
   def dispose(self):
+    self.__executor.shutdown(wait=True, cancel_futures=True)
     for texture in self.__textures.values():
-      texture.dispose()
\ No newline at end of file
+      if isinstance(texture, Texture):
+        texture.dispose()
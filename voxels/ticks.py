@@ -0,0 +1,73 @@
+import heapq
+import numpy as np
+from tiles import BLOCK_TYPES
+
+# True for tiles that get scheduled ticks, indexed by tile id
+TICKABLE = np.zeros(256, dtype=bool)
+for tile_id, tile_type in BLOCK_TYPES.items():
+  TICKABLE[tile_id] = tile_type.is_tickable
+TICKABLE_IDS: list[int] = TICKABLE.tolist()
+
+# Local indices, (y * 16 + z) * 16 + x, of the tickable tiles in a chunk's (CHUNK_HEIGHT, 16, 16) tiles
+def get_tickable_indices(blocks: np.ndarray) -> set[int]:
+  return set(np.flatnonzero(TICKABLE[blocks]).tolist())
+
+# Runs block ticks when they are due instead of scanning chunks for tiles that might want one.
+# Ticks are kept in a heap by due tick, with a sequence number so ticks due together run in the
+# order they were scheduled, and a position only ever has one tick waiting.
+class TickScheduler:
+  def __init__(self, world):
+    self.world = world
+    self.__queue: list[tuple[int, int, int, int, int]] = []
+    self.__scheduled: set[tuple[int, int, int]] = set()
+    self.__sequence = 0
+    self.__tick = 0
+
+  @property
+  def pending_count(self) -> int:
+    return len(self.__queue)
+
+  def schedule(self, x: int, y: int, z: int, delay: int):
+    position = (x, y, z)
+    if position in self.__scheduled:
+      return
+    self.__scheduled.add(position)
+    self.__sequence += 1
+    heapq.heappush(self.__queue, (self.__tick + max(delay, 1), self.__sequence, x, y, z))
+
+  # Tickable tiles in a newly loaded chunk may have been waiting on a tick when it was saved
+  def add_chunk(self, chunk):
+    ox = chunk.x * 16
+    oz = chunk.z * 16
+    for index in sorted(chunk.tickable_blocks):
+      x = index & 15
+      z = (index >> 4) & 15
+      y = index >> 8
+      self.schedule(ox + x, y, oz + z, BLOCK_TYPES[chunk.sections.get(x, y, z)].tick_delay)
+
+  # Advances one tick and runs up to max_ticks of the due ticks, the rest run on the next ones.
+  # Returns how many ran.
+  def process(self, max_ticks: int) -> int:
+    self.__tick += 1
+    queue = self.__queue
+    chunks = self.world.chunks
+    ran = 0
+
+    while len(queue) > 0 and queue[0][0] <= self.__tick and ran < max_ticks:
+      _, _, x, y, z = heapq.heappop(queue)
+      self.__scheduled.discard((x, y, z))
+      chunk = chunks.get((x >> 4, z >> 4))
+      if chunk is None:
+        continue
+      # The tile may have been replaced since the tick was scheduled
+      tile_id = chunk.sections.get(x & 15, y, z & 15)
+      if not TICKABLE_IDS[tile_id]:
+        continue
+      ran += 1
+      BLOCK_TYPES[tile_id].scheduled_tick(self.world, x, y, z, tile_id)
+
+    return ran
+
+  def clear(self):
+    self.__queue.clear()
+    self.__scheduled.clear()
@@ -1,12 +1,11 @@
 from __future__ import annotations
 from typing import Dict
-import json
-from utils import JSONWithCommentsDecoder
+from resources import load_json
 
 BLOCK_TYPES: Dict[int, BlockType] = {}
 
 class BlockType:
-  def __init__(self, tile_id: int, down_txr: int, up_txr: int, north_txr: int, south_txr: int, west_txr: int, east_txr: int, is_tickable = False, allows_light_through = False, is_collidable = True) -> None:
+  def __init__(self, tile_id: int, down_txr: int, up_txr: int, north_txr: int, south_txr: int, west_txr: int, east_txr: int, is_tickable = False, allows_light_through = False, is_collidable = True, light_emission = 0, light_opacity = 15, tick_delay = 10, falls = False) -> None:
     self.tile_id = tile_id
     self.down_txr = down_txr
     self.up_txr = up_txr
@@ -15,9 +14,19 @@ class BlockType:
     self.west_txr = west_txr
     self.east_txr = east_txr
     self.is_tickable = is_tickable
+    # Ticks between a tile being placed or having a neighbour change and its scheduled tick
+    self.tick_delay = tick_delay
+    # Whether the tile drops down through air and water when nothing holds it up, needs is_tickable
+    self.falls = falls
     self.allows_light_through = allows_light_through
     self.is_collidable = is_collidable
+    # Light level the tile gives off and how much light loses going through it, both 0 to 15
+    self.light_emission = light_emission
+    self.light_opacity = light_opacity
   
+  def textures(self):
+    return (self.down_txr, self.up_txr, self.north_txr, self.south_txr, self.west_txr, self.east_txr)
+
   def render_in_gui(self, vertex_drawer):
     tile = self.tile_id
     x0 = 0.0
@@ -114,44 +123,39 @@ class BlockType:
     vertex_drawer.vertex_uv(x1, y1, z0, u1, v0)
     vertex_drawer.vertex_uv(x1, y1, z1, u0, v0)
 
-  def random_tick(self, world, x: int, y: int, z: int, tile_id: int):
-    if tile_id == 7:
-      if world.get_tile(x - 1, y, z) == 0:
-        world.set_tile(x - 1, y, z, 7)
-
-      if world.get_tile(x + 1, y, z) == 0:
-        world.set_tile(x + 1, y, z, 7)
-
-      if world.get_tile(x, y, z - 1) == 0:
-        world.set_tile(x, y, z - 1, 7)
-
-      if world.get_tile(x, y, z + 1) == 0:
-        world.set_tile(x, y, z + 1, 7)
-
-      if world.get_tile(x, y - 1, z) == 0:
-        world.set_tile(x, y - 1, z, 7)
-
-with open("res/blocks.json") as f:
-  blocks_data = json.load(f, cls=JSONWithCommentsDecoder)
-  for block_data in blocks_data:
-    tile_id = block_data['id']
-    if isinstance(block_data.get('textures'), int):
-      txr_idx = block_data.get('textures')
-      down_txr = txr_idx
-      up_txr = txr_idx
-      north_txr = txr_idx
-      south_txr = txr_idx
-      west_txr = txr_idx
-      east_txr = txr_idx
-    else:
-      down_txr = block_data['textures']['down']
-      up_txr = block_data['textures']['up']
-      north_txr = block_data['textures']['north']
-      south_txr = block_data['textures']['south']
-      west_txr = block_data['textures']['west']
-      east_txr = block_data['textures']['east']
-    is_tickable = block_data.get('is_tickable') if block_data.get('is_tickabke') != None else False 
-    allows_light_through = block_data.get('allows_light_through') if block_data.get('allows_light_through') != None else False
-    is_collidable = block_data.get('is_collidable') if block_data.get('is_collidable') != None else True
-
-    BLOCK_TYPES[tile_id] = BlockType(tile_id, down_txr, up_txr, north_txr, south_txr, west_txr, east_txr, is_tickable, allows_light_through, is_collidable)
\ No newline at end of file
+  # Run by the world's TickScheduler for tickable tiles, water is moved by the FluidSimulator instead.
+  # A falling tile moves down a block, which schedules its next tick and one for the tile above it.
+  def scheduled_tick(self, world, x: int, y: int, z: int, tile_id: int):
+    if not self.falls or y == 0:
+      return
+    below = world.get_tile(x, y - 1, z)
+    if below == 0 or not BLOCK_TYPES[below].is_collidable:
+      world.set_tile(x, y, z, 0)
+      world.set_tile(x, y - 1, z, tile_id)
+
+for block_data in load_json("blocks.json", comments=True):
+  tile_id = block_data['id']
+  if isinstance(block_data.get('textures'), int):
+    txr_idx = block_data.get('textures')
+    down_txr = txr_idx
+    up_txr = txr_idx
+    north_txr = txr_idx
+    south_txr = txr_idx
+    west_txr = txr_idx
+    east_txr = txr_idx
+  else:
+    down_txr = block_data['textures']['down']
+    up_txr = block_data['textures']['up']
+    north_txr = block_data['textures']['north']
+    south_txr = block_data['textures']['south']
+    west_txr = block_data['textures']['west']
+    east_txr = block_data['textures']['east']
+  is_tickable = block_data.get('is_tickable') if block_data.get('is_tickable') != None else False
+  allows_light_through = block_data.get('allows_light_through') if block_data.get('allows_light_through') != None else False
+  is_collidable = block_data.get('is_collidable') if block_data.get('is_collidable') != None else True
+  light_emission = block_data.get('light_emission') if block_data.get('light_emission') != None else 0
+  light_opacity = block_data.get('light_opacity') if block_data.get('light_opacity') != None else 0 if allows_light_through else 15
+  tick_delay = block_data.get('tick_delay') if block_data.get('tick_delay') != None else 10
+  falls = block_data.get('falls') if block_data.get('falls') != None else False
+
+  BLOCK_TYPES[tile_id] = BlockType(tile_id, down_txr, up_txr, north_txr, south_txr, west_txr, east_txr, is_tickable, allows_light_through, is_collidable, light_emission, light_opacity, tick_delay, falls)
\ No newline at end of file
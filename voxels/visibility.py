@@ -0,0 +1,98 @@
+from collections import deque
+import numpy as np
+from constants import *
+
+SECTION_COUNT = CHUNK_HEIGHT // 16
+
+# Section faces in the same order as mesher.FACES: down, up, north, south, west, east
+FACE_DIRECTIONS = [(0, -1, 0), (0, 1, 0), (0, 0, -1), (0, 0, 1), (-1, 0, 0), (1, 0, 0)]
+OPPOSITE_FACES = [1, 0, 3, 2, 5, 4]
+
+# Bit (a * 6 + b) of a section's connectivity is set when faces a and b are linked through open tiles
+ALL_CONNECTED = (1 << 36) - 1
+
+# Tiles that don't hide what is behind them, the same ones the mesher draws neighbouring faces for
+OPEN_TILES = np.zeros(256, dtype=bool)
+OPEN_TILES[[0, 7, 8]] = True
+
+FACE_SLICES = [
+  (0, slice(None), slice(None)), (15, slice(None), slice(None)),
+  (slice(None), 0, slice(None)), (slice(None), 15, slice(None)),
+  (slice(None), slice(None), 0), (slice(None), slice(None), 15)
+]
+
+# Labels every group of connected open tiles with the smallest index in it, by spreading labels
+# to neighbours until nothing changes. Closed tiles keep the label 4096.
+def label_open_tiles(open_tiles: np.ndarray) -> np.ndarray:
+  closed = np.int32(16 * 16 * 16)
+  labels = np.where(open_tiles, np.arange(16 * 16 * 16, dtype=np.int32).reshape(16, 16, 16), closed)
+
+  while True:
+    spread = labels.copy()
+    for axis in range(3):
+      low = [slice(None)] * 3
+      high = [slice(None)] * 3
+      low[axis] = slice(0, 15)
+      high[axis] = slice(1, 16)
+      np.minimum(spread[tuple(high)], labels[tuple(low)], out=spread[tuple(high)])
+      np.minimum(spread[tuple(low)], labels[tuple(high)], out=spread[tuple(low)])
+    spread[~open_tiles] = closed
+
+    if np.array_equal(spread, labels):
+      return labels
+    labels = spread
+
+# Which faces of a (16, 16, 16) section of tiles, indexed [y, z, x], can be seen from which
+def get_section_connectivity(tiles: np.ndarray) -> int:
+  open_tiles = OPEN_TILES[tiles]
+  if open_tiles.all():
+    return ALL_CONNECTED
+  if not open_tiles.any():
+    return 0
+
+  labels = label_open_tiles(open_tiles)
+  face_labels = [set(np.unique(labels[face_slice]).tolist()) - {16 * 16 * 16} for face_slice in FACE_SLICES]
+
+  connectivity = 0
+  for a in range(6):
+    for b in range(6):
+      if not face_labels[a].isdisjoint(face_labels[b]):
+        connectivity |= 1 << (a * 6 + b)
+  return connectivity
+
+# Runs in the worker pool along with the meshes, blocks being the chunk's (CHUNK_HEIGHT, 16, 16) tiles
+def get_chunk_connectivity(blocks: np.ndarray) -> list[int]:
+  return [get_section_connectivity(blocks[i * 16:(i + 1) * 16]) for i in range(SECTION_COUNT)]
+
+# Sections reachable from the camera's section through open space. get_connectivity(cx, cz) gives a
+# chunk's connectivity per section, or None for chunks that can't be walked into. Like in Minecraft,
+# the search never steps back in a direction opposite to one it has already taken.
+def find_reachable_sections(start: tuple[int, int, int], get_connectivity) -> list[tuple[int, int, int]]:
+  start = (start[0], min(max(start[1], 0), SECTION_COUNT - 1), start[2])
+  if get_connectivity(start[0], start[2]) == None:
+    return []
+
+  reachable = []
+  visited = {start}
+  queue = deque([(start, -1, 0)])
+  while len(queue) > 0:
+    (cx, sy, cz), entry_face, directions = queue.popleft()
+    reachable.append((cx, sy, cz))
+    connectivity = get_connectivity(cx, cz)[sy]
+
+    for face, (dx, dy, dz) in enumerate(FACE_DIRECTIONS):
+      if directions & (1 << OPPOSITE_FACES[face]):
+        continue
+      if entry_face != -1 and not connectivity & (1 << (entry_face * 6 + face)):
+        continue
+
+      neighbour = (cx + dx, sy + dy, cz + dz)
+      if neighbour[1] < 0 or neighbour[1] >= SECTION_COUNT or neighbour in visited:
+        continue
+      if get_connectivity(neighbour[0], neighbour[2]) == None:
+        continue
+
+      visited.add(neighbour)
+      queue.append((neighbour, OPPOSITE_FACES[face], directions | (1 << face)))
+
+  return reachable
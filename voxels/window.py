@@ -1,6 +1,5 @@
 from typing import Callable
 import glfw
-import PIL.Image as Image
 
 class GameWindow:
   def __init__(self, game, width: int, height: int):
@@ -100,6 +99,8 @@ class GameWindow:
     return int(self.__height / self.__scale_factor)
 
   def set_icon(self, path: str):
+    # By now the texture decoding threads have imported PIL
+    import PIL.Image as Image
     image = Image.open("res/" + path)
     glfw.set_window_icon(self.__handle, 1, [image])
 
@@ -1,487 +1,465 @@
-import random
-import time
-from perlin_noise import PerlinNoise
-from OpenGL.GL import *
+import math
 from constants import *
 from player import Player
 from tiles import BLOCK_TYPES
-from render_layers import RenderLayers
-from utils import VertexDrawer, AABB
-import utils
+from jobs import ChunkJobs
+from region import WorldStorage
+from lighting import LightEngine, calculate_light, FULL_SKY_LIGHT
+from sections import ChunkSections, SECTION_COUNT
+from ticks import TickScheduler, get_tickable_indices, TICKABLE_IDS
+from fluids import FluidSimulator
+from generation import join_chunk_data, split_chunk_data
+from entities import Entities
+from profiler import PROFILER
+import numpy as np
+
+# Destination slice in a padded neighbourhood array and source slice in the chunk, per chunk offset
+NEIGHBOUR_SLICES = {
+  -1: (slice(0, 1), slice(15, 16)),
+  0: (slice(1, 17), slice(0, 16)),
+  1: (slice(17, 18), slice(0, 1))
+}
+
+# Reads tiles while remembering the chunk of the previous lookup, for loops that walk over
+# neighbouring tiles. Only meant to live for one loop as it doesn't notice chunks being unloaded.
+class TileCursor:
+  __slots__ = ("__world", "__cx", "__cz", "__sections")
+
+  def __init__(self, world):
+    self.__world = world
+    self.__cx = None
+    self.__cz = None
+    self.__sections = None
+
+  def get_tile(self, x: int, y: int, z: int) -> int:
+    if y < 0 or y >= CHUNK_HEIGHT:
+      return 0
 
-class Chunk:
-  CHUNK_UPDATES = 0
+    cx = x >> 4
+    cz = z >> 4
+    if cx != self.__cx or cz != self.__cz:
+      self.__cx = cx
+      self.__cz = cz
+      chunk = self.__world.chunks.get((cx, cz))
+      self.__sections = chunk.sections.sections if chunk != None else None
+
+    if self.__sections is None:
+      return 0
+    section = self.__sections[y >> 4]
+    if section is None:
+      return 0
+    return section[((y & 15) * 16 + (z & 15)) * 16 + (x & 15)]
 
-  def __init__(self, world, x: int, z: int):
+class Chunk:
+  def __init__(self, world, x: int, z: int, blocks: bytes, light: bytes, fluid: bytes | None = None):
     self.x = x
     self.z = z
     self.world = world
-    self.blocks = [0] * (16 * 16 * CHUNK_HEIGHT)
-    self.__list = glGenLists(2)
-    self.generate()
+    self.sections = ChunkSections(blocks)
+    # Sky and block light per tile, kept up to date by the world's LightEngine
+    self.light = ChunkSections(light, fill=FULL_SKY_LIGHT)
+    # Flow level per water tile, 0 for sources, kept up to date by the world's FluidSimulator
+    self.fluid = ChunkSections(fluid)
+    # Local indices of the tiles that get scheduled ticks, kept up to date by set_tile
+    self.tickable_blocks = get_tickable_indices(self.get_blocks_array())
     self.__dirty = True
-    self.__light_heightmap = [0] * (16 * 16)
-    self.calculate_light_heightmap(0, 0, 16, 16)
-
-  def calculate_light_heightmap(self, x0, z0, x1, z1):
-    for x in range(x0, x1):
-      for z in range(z0, z1):
-        for y in range(CHUNK_HEIGHT - 1, -1, -1):
-          tile = self.get_tile(x, y, z)
-          if tile != 0 and not BLOCK_TYPES[tile].allows_light_through:
-            self.__light_heightmap[(z * 16) + x] = y
-            break
-
-  def is_lighted(self, x, y, z) -> bool:
-    if x < 0 or x >= 16 or y < 0 or y >= CHUNK_HEIGHT or z < 0 or z >= 16:
-      return True
-    return self.__light_heightmap[(z * 16) + x] >= y
+    self.__unsaved = False
 
-  def make_dirty(self):
-    self.__dirty = True
+  # Whether the mesh uses the tile at (x, y, z) of the chunk next to it, as is the case where this
+  # chunk has a tile drawn against it
+  def references_neighbour_tile(self, x: int, y: int, z: int) -> bool:
+    return self.sections.get(x, y, z) != 0
 
-  def generate(self):    
-    for x in range(16):
-      for z in range(16):
-        max_y = 31 + self.world.noise.noise([(x + self.z * 16) / 256, z + (self.x * 16) / 256]) * 6
-        
-        for y in range(0, int(max_y)):
-          if y > 64:
-            continue
-          elif y == 0:
-            self.blocks[(y * 16 + z) * 16 + x] = 9
-          elif y < 29:
-            self.blocks[(y * 16 + z) * 16 + x] = 2 if random.randint(0, 17) - y < 1 else 3
-          elif y < 30:
-            self.blocks[(y * 16 + z) * 16 + x] = 2
-          elif y == int(max_y) - 1:
-            self.blocks[(y * 16 + z) * 16 + x] = 1
-          else:
-            self.blocks[(y * 16 + z) * 16 + x] = 2
-
-    if random.randint(0, 200) < 150:
-      randpos_x = random.randint(0, 10)
-      randpos_z = random.randint(0, 10)
-
-      if self.get_tile(randpos_x + 2, 15, randpos_z + 2) == 7:
-        return
-
-      self.set_tile(randpos_x + 2, 16, randpos_z + 2, 4, calculate_lights=False)
-      self.set_tile(randpos_x + 2, 17, randpos_z + 2, 4, calculate_lights=False)
-      self.set_tile(randpos_x + 2, 18, randpos_z + 2, 4, calculate_lights=False)
-      self.set_tile(randpos_x + 2, 19, randpos_z + 2, 4, calculate_lights=False)
-
-      for tx in range(randpos_x, randpos_x + 5):
-        for tz in range(randpos_z, randpos_z + 5):
-          self.set_tile(tx, 20, tz, 8, calculate_lights=False)
-
-      for tx in range(randpos_x + 1, randpos_x + 4):
-        for tz in range(randpos_z + 1, randpos_z + 4):
-          self.set_tile(tx, 21, tz, 8, calculate_lights=False)
-
-  def set_tile(self, x: int, y: int, z: int, tile_id: int, calculate_lights=True):
-    if x < 0 or x >= 16 or y < 0 or y >= CHUNK_HEIGHT or z < 0 or z >= 16:
+  def get_blocks_array(self) -> np.ndarray:
+    return self.sections.to_array()
+
+  def get_memory_size(self) -> int:
+    return self.sections.get_memory_size() + self.light.get_memory_size() + self.fluid.get_memory_size()
+
+  # Tells the world's listeners the chunk changed, once until whoever is watching clears it again
+  def make_dirty(self):
+    if self.__dirty:
       return
-    self.blocks[(y * 16 + z) * 16 + x] = tile_id
     self.__dirty = True
-    if calculate_lights:
-      if DEBUG_PRINTS:
-        print(f"Chunk[x={self.x},z={self.z}] set tile {tile_id} ({x},{y},{z}) ({x + self.x * 16}, {y}, {z + self.z * 16})")
-      self.calculate_light_heightmap(x, z, x + 1, z + 1)
+    for listener in self.world.listeners:
+      listener.on_chunk_dirty(self)
 
-  def get_tile(self, x: int, y: int, z: int):
-    if x < 0 or x >= 16 or y < 0 or y >= CHUNK_HEIGHT or z < 0 or z >= 16:
-      return 0
-    return self.blocks[(y * 16 + z) * 16 + x]
-
-  def rebuild_geometry(self, layer, world, texture_manager):
-    glNewList(self.__list + layer.value, GL_COMPILE)
-    Chunk.CHUNK_UPDATES += 1
-
-    vertex_drawer = VertexDrawer()
-    vertex_drawer.begin(GL_QUADS)
-
-    for y in range(CHUNK_HEIGHT):
-      for x in range(16):
-        for z in range(16):
-          bx = x + self.x * 16
-          by = y
-          bz = z + self.z * 16
-
-          tile = world.get_tile(bx, by, bz)
-          if tile < 1 or ((tile == 7) and layer == RenderLayers['SOLID']):
-            continue
-
-          tile_type = BLOCK_TYPES[tile]
-
-          x0 = bx
-          y0 = by
-          z0 = bz
-          x1 = bx + 1.0
-          y1 = by + 1.0
-          z1 = bz + 1.0
-
-          if tile == 7 and world.get_tile(bx, by + 1, bz) != 7:
-            y1 -= 0.1
-
-          temp_tile = world.get_tile(bx, by - 1, bz)
-          if tile == 8 or temp_tile == 0 or temp_tile == 8 or (temp_tile == 7 and tile != 7):
-            light_multiplier = 1.0
-            if world.is_lighted(bx, by - 1, bz):
-              light_multiplier = 0.4
-
-            u = (tile_type.down_txr % 16) * 16
-            v = tile_type.down_txr // 16 * 16
-
-            u0 = u / 256.0
-            v0 = v / 256.0
-            u1 = (u + 16) / 256.0
-            v1 = (v + 16) / 256.0
-
-            vertex_drawer.color(0.6 * light_multiplier, 0.6 * light_multiplier, 0.6 * light_multiplier, 1.0)
-            vertex_drawer.vertex_uv(x0, y0, z1, u0, v1)
-            vertex_drawer.vertex_uv(x0, y0, z0, u0, v0)
-            vertex_drawer.vertex_uv(x1, y0, z0, u1, v0)
-            vertex_drawer.vertex_uv(x1, y0, z1, u1, v1)
-
-          temp_tile = world.get_tile(bx, by + 1, bz)
-          if tile == 8 or temp_tile == 0 or temp_tile == 8 or (temp_tile == 7 and tile != 7) or (tile == 7 and temp_tile != 7):
-            light_multiplier = 1.0
-            if world.is_lighted(bx, by + 1, bz):
-              light_multiplier = 0.4
-            
-            u = (tile_type.up_txr % 16) * 16
-            v = tile_type.up_txr // 16 * 16
-
-            u0 = u / 256.0
-            v0 = v / 256.0
-            u1 = (u + 16) / 256.0
-            v1 = (v + 16) / 256.0
-
-            vertex_drawer.color(1.0 * light_multiplier, 1.0 * light_multiplier, 1.0 * light_multiplier, 1.0)
-            vertex_drawer.vertex_uv(x1, y1, z1, u1, v1)
-            vertex_drawer.vertex_uv(x1, y1, z0, u1, v0)
-            vertex_drawer.vertex_uv(x0, y1, z0, u0, v0)
-            vertex_drawer.vertex_uv(x0, y1, z1, u0, v1)
-
-          temp_tile = world.get_tile(bx, by, bz - 1)
-          if tile == 8 or temp_tile == 0 or temp_tile == 8 or (temp_tile == 7 and tile != 7):
-            light_multiplier = 1.0
-            if world.is_lighted(bx, by, bz - 1):
-              light_multiplier = 0.4
-            
-            u = (tile_type.north_txr % 16) * 16
-            v = tile_type.north_txr // 16 * 16
-
-            u0 = u / 256.0
-            v0 = v / 256.0
-            u1 = (u + 16) / 256.0
-            v1 = (v + 16) / 256.0
-            
-            vertex_drawer.color(0.6 * light_multiplier, 0.6 * light_multiplier, 0.6 * light_multiplier, 1.0)
-            vertex_drawer.vertex_uv(x0, y1, z0, u1, v0)
-            vertex_drawer.vertex_uv(x1, y1, z0, u0, v0)
-            vertex_drawer.vertex_uv(x1, y0, z0, u0, v1)
-            vertex_drawer.vertex_uv(x0, y0, z0, u1, v1)
-
-          temp_tile = world.get_tile(bx, by, bz + 1)
-          if tile == 8 or temp_tile == 0 or temp_tile == 8 or (temp_tile == 7 and tile != 7):
-            light_multiplier = 1.0
-            if world.is_lighted(bx, by, bz + 1):
-              light_multiplier = 0.4
-
-            u = (tile_type.south_txr % 16) * 16
-            v = tile_type.south_txr // 16 * 16
-
-            u0 = u / 256.0
-            v0 = v / 256.0
-            u1 = (u + 16) / 256.0
-            v1 = (v + 16) / 256.0
-
-            vertex_drawer.color(0.6 * light_multiplier, 0.6 * light_multiplier, 0.6 * light_multiplier, 1.0)
-            vertex_drawer.vertex_uv(x0, y1, z1, u0, v0)
-            vertex_drawer.vertex_uv(x0, y0, z1, u0, v1)
-            vertex_drawer.vertex_uv(x1, y0, z1, u1, v1)
-            vertex_drawer.vertex_uv(x1, y1, z1, u1, v0)
-
-          temp_tile = world.get_tile(bx - 1, by, bz)
-          if tile == 8 or temp_tile == 0 or temp_tile == 8 or (temp_tile == 7 and tile != 7):
-            light_multiplier = 1.0
-            if world.is_lighted(bx - 1, by, bz):
-              light_multiplier = 0.4
-
-            u = (tile_type.west_txr % 16) * 16
-            v = tile_type.west_txr // 16 * 16
-
-            u0 = u / 256.0
-            v0 = v / 256.0
-            u1 = (u + 16) / 256.0
-            v1 = (v + 16) / 256.0
-
-            vertex_drawer.color(0.8 * light_multiplier, 0.8 * light_multiplier, 0.8 * light_multiplier, 1.0)
-            vertex_drawer.vertex_uv(x0, y1, z1, u1, v0)
-            vertex_drawer.vertex_uv(x0, y1, z0, u0, v0)
-            vertex_drawer.vertex_uv(x0, y0, z0, u0, v1)
-            vertex_drawer.vertex_uv(x0, y0, z1, u1, v1)
-
-          temp_tile = world.get_tile(bx + 1, by, bz)
-          if tile == 8 or temp_tile == 0 or temp_tile == 8 or (temp_tile == 7 and tile != 7):
-            light_multiplier = 1.0
-            if world.is_lighted(bx + 1, by, bz):
-              light_multiplier = 0.4
-
-            u = (tile_type.east_txr % 16) * 16
-            v = tile_type.east_txr // 16 * 16
-
-            u0 = u / 256.0
-            v0 = v / 256.0
-            u1 = (u + 16) / 256.0
-            v1 = (v + 16) / 256.0
-
-            vertex_drawer.color(0.8 * light_multiplier, 0.8 * light_multiplier, 0.8 * light_multiplier, 1.0)
-            vertex_drawer.vertex_uv(x1, y0, z1, u0, v1)
-            vertex_drawer.vertex_uv(x1, y0, z0, u1, v1)
-            vertex_drawer.vertex_uv(x1, y1, z0, u1, v0)
-            vertex_drawer.vertex_uv(x1, y1, z1, u0, v0)
-          
-    vertex_drawer.flush()
-    glEndList()   
-
-  def render_debug(self, vertex_drawer = VertexDrawer()):
-    clx0 = self.x * 16
-    clz0 = self.z * 16
-    clx1 = clx0 + 16
-    clz1 = clz0 + 16
-
-    vertex_drawer.begin(GL_LINES)
-    vertex_drawer.color(1.0, 0.0, 0.0, 1.0)
-
-    vertex_drawer.vertex(clx0, 0, clz0)
-    vertex_drawer.vertex(clx0, CHUNK_HEIGHT, clz0)
-
-    vertex_drawer.vertex(clx1, 0, clz0)
-    vertex_drawer.vertex(clx1, CHUNK_HEIGHT, clz0)
-
-    vertex_drawer.vertex(clx0, 0, clz1)
-    vertex_drawer.vertex(clx0, CHUNK_HEIGHT, clz1)
-
-    vertex_drawer.vertex(clx1, 0, clz1)
-    vertex_drawer.vertex(clx1, CHUNK_HEIGHT, clz1)
-
-    for y in range(0, int(CHUNK_HEIGHT / 8)):
-      vertex_drawer.color(1.0, 1.0, 0.0, 1.0)
-      vertex_drawer.vertex(clx0, y * 8, clz0)
-      vertex_drawer.vertex(clx1, y * 8, clz0)
-      vertex_drawer.vertex(clx0, y * 8, clz0)
-      vertex_drawer.vertex(clx0, y * 8, clz1)
-      vertex_drawer.vertex(clx0, y * 8, clz0)
-      vertex_drawer.vertex(clx0, y * 8, clz1)
-
-    vertex_drawer.flush()
-
-  def rebuild_layers(self, texture_manager):
-    start_time = time.time()
-    self.rebuild_geometry(RenderLayers['SOLID'], self.world, texture_manager)
-    self.rebuild_geometry(RenderLayers['TRANSLUCENT'], self.world, texture_manager)
-    end_time = time.time()
-    if DEBUG_PRINTS:
-      print(f"DEBUG: Chunk [{self.x}, {self.z}] took {(end_time - start_time) * 1000} ms")
+  @property
+  def dirty(self) -> bool:
+    return self.__dirty
+
+  # Cleared when a mesh job is handed the chunk's current blocks
+  def clear_dirty(self):
     self.__dirty = False
 
-  def __tick_some_block(self):
-    for x in range(0, 16):
-        for y in range(0, CHUNK_HEIGHT):
-          for z in range(0, 16):
-             tile_id = self.blocks[(y * 16 + z) * 16 + x]
-             if tile_id == 0:
-                continue
-             tile_type = BLOCK_TYPES[tile_id]
-             if tile_type.is_tickable:
-                BLOCK_TYPES[tile_id].random_tick(self.world, x + self.x * 16, y, z + self.z * 16, tile_id)
-                return
-             
+  # Set when a block changes since the chunk was last handed to the world storage
+  @property
+  def unsaved(self) -> bool:
+    return self.__unsaved
 
-  def tick(self):
-    for _ in range(0, random.randint(0, 2)):
-      self.__tick_some_block()
+  def mark_saved(self):
+    self.__unsaved = False
 
-  def render(self, layer, texture_manager):
-    if self.__dirty:
-      self.rebuild_layers(texture_manager)
-      if DEBUG_PRINTS:
-        print(f"Chunk[x={self.x},z={self.z}] rendered")
-      self.__dirty = False
+  # Only changes the tile, lighting is updated by the world's LightEngine
+  def set_tile(self, x: int, y: int, z: int, tile_id: int):
+    if x < 0 or x >= 16 or y < 0 or y >= CHUNK_HEIGHT or z < 0 or z >= 16:
+      return
+    self.sections.set(x, y, z, tile_id)
+    # Placed water is a source, the FluidSimulator sets the level of water it moves
+    self.fluid.set(x, y, z, 0)
+    if TICKABLE_IDS[tile_id]:
+      self.tickable_blocks.add((y * 16 + z) * 16 + x)
+    else:
+      self.tickable_blocks.discard((y * 16 + z) * 16 + x)
+    self.make_dirty()
+    self.__unsaved = True
+    self.__record_change((y * 16 + z) * 16 + x)
+    if DEBUG_PRINTS:
+      print(f"Chunk[x={self.x},z={self.z}] set tile {tile_id} ({x},{y},{z}) ({x + self.x * 16}, {y}, {z + self.z * 16})")
 
-    glCallList(self.__list + layer.value)
+  def set_fluid_level(self, x: int, y: int, z: int, level: int):
+    if self.fluid.get(x, y, z) == level:
+      return
+    self.fluid.set(x, y, z, level)
+    self.make_dirty()
+    self.__unsaved = True
+    self.__record_change((y * 16 + z) * 16 + x)
+
+  def __record_change(self, index: int):
+    changed_tiles = self.world.changed_tiles
+    if changed_tiles != None:
+      changed = changed_tiles.get((self.x, self.z))
+      if changed is None:
+        changed_tiles[(self.x, self.z)] = changed = set()
+      changed.add(index)
+
+  # Flow levels as a (CHUNK_HEIGHT, 16, 16) array for the mesher, None if the chunk has only sources
+  def get_fluid_array(self) -> np.ndarray | None:
+    if self.fluid.is_fill():
+      return None
+    return self.fluid.to_array()
 
-  def dispose(self):
-    glDeleteLists(self.__list, 2)
+  def get_tile(self, x: int, y: int, z: int):
+    if x < 0 or x >= 16 or y < 0 or y >= CHUNK_HEIGHT or z < 0 or z >= 16:
+      return 0
+    return self.sections.get(x, y, z)
 
 class World:
-  def __init__(self, game):
+  SEED = 1
+  # Chunks around the player's chunk that have to be loaded before the world is playable
+  SPAWN_RADIUS = 1
+  # Generation jobs in flight, kept low so a moving player isn't stuck behind far away requests
+  MAX_GENERATION_JOBS = 12
+  # Ticks between saves of the modified chunks
+  AUTOSAVE_INTERVAL = 60 * 30
+  # Light engine steps per tick, the rest stays queued for the next ticks
+  MAX_LIGHT_UPDATES_PER_TICK = 800
+  # Scheduled block ticks run per tick, the rest run late
+  MAX_SCHEDULED_TICKS_PER_TICK = 1000
+  # Whether block ticks, fluids and entities run here, rather than on a server sending the results
+  SIMULATED = True
+
+  def __init__(self, game, save_dir: str | None = None):
     self.game = game
-    self.x_chunks = 6
-    self.z_chunks = 6
-    self.chunks: list[Chunk] = [None] * (self.x_chunks * self.z_chunks)
+    self.storage = WorldStorage(save_dir) if save_dir != None else None
+    self.__ticks = 0
+    self.chunks: dict[tuple[int, int], Chunk] = {}
+    # Goes up whenever tiles change or chunks are loaded or unloaded, for caching things worked out from tiles
+    self.tile_version = 0
+    self.light_engine = LightEngine(self)
+    self.tick_scheduler = TickScheduler(self)
+    self.fluids = FluidSimulator(self)
+    self.entities = Entities(self)
     self.game.player = Player(self)
-    self.border_clist = glGenLists(1)
-    self.border_clist_dirty = True
-    self.noise = PerlinNoise(octaves=2, seed=1)
-
-    for x in range(0, self.x_chunks):
-      for z in range(0, self.z_chunks):
-        self.chunks[x * self.z_chunks + z] = Chunk(self, x, z)
-
-    self.__generate_spawn_water()
-
-    for chunk in self.chunks:
-      chunk.rebuild_layers(game.texture_manager)
-
-  def __generate_spawn_water(self):
-    for x in range(0, 8):
-      for z in range(0, 8):
-        self.set_tile(x, 15, z, 7)
-        self.set_tile(x, 14, z, 6)
-
-    for x in range(0, 7):
-      for z in range(0, 7):
-        self.set_tile(x, 14, z, 7)
-        self.set_tile(x, 13, z, 6)
-    
-    for x in range(0, 5):
-      for z in range(0, 6):
-        self.set_tile(x, 13, z, 7)
-        self.set_tile(x, 12, z, 6)
-    
+    self.jobs = ChunkJobs()
+    # Told about chunks being added, changed and removed with on_chunk_added, on_chunk_dirty and
+    # on_chunk_removed, like a WorldRenderer keeping meshes for them
+    self.listeners = []
+    # Local indices of the tiles changed per chunk while this is a dict, for sending changes somewhere.
+    # Whoever set it empties it, nothing is recorded while it is None.
+    self.changed_tiles: dict[tuple[int, int], set[int]] | None = None
+    self.__spawn_ready = False
+    # Chunk the player was in and render distance when the loaded chunks were last updated
+    self.center: tuple[int, int] | None = None
+    self.render_distance = 0
+    self.__centers: list[tuple[int, int]] = []
+    self.__missing_chunks: list[tuple[int, int]] = []
+    self.update_loaded_chunks()
+
+  def get_player_chunk(self) -> tuple[int, int]:
+    return (math.floor(self.game.player.x) // 16, math.floor(self.game.player.z) // 16)
+
+  # Chunks are loaded one further than the render distance so every rendered chunk has all its
+  # neighbours for meshing, and unloaded one further again so walking along a border doesn't thrash
+  def get_load_distance(self) -> int:
+    return self.render_distance + 1
+
+  def distance_sq(self, key: tuple[int, int]) -> int:
+    return (key[0] - self.center[0]) ** 2 + (key[1] - self.center[1]) ** 2
+
+  # Chunks the world is kept loaded around, the player's first. A server adds the ones its clients are in.
+  def get_load_centers(self) -> list[tuple[int, int]]:
+    return [self.get_player_chunk()]
+
+  def __load_distance_sq(self, key: tuple[int, int]) -> int:
+    return min((key[0] - cx) ** 2 + (key[1] - cz) ** 2 for cx, cz in self.__centers)
+
+  def update_loaded_chunks(self):
+    centers = self.get_load_centers()
+    render_distance = self.game.settings.render_distance
+
+    if centers != self.__centers or render_distance != self.render_distance:
+      self.__centers = centers
+      self.center = centers[0]
+      self.render_distance = render_distance
+      load_distance = self.get_load_distance()
+
+      for key in [key for key in self.chunks if self.__load_distance_sq(key) > (load_distance + 1) ** 2]:
+        self.unload_chunk(key)
+
+      for key in self.jobs.generating_keys():
+        if self.__load_distance_sq(key) > load_distance ** 2:
+          self.jobs.cancel_generate(key)
+
+      missing = set()
+      for cx, cz in centers:
+        for x in range(cx - load_distance, cx + load_distance + 1):
+          for z in range(cz - load_distance, cz + load_distance + 1):
+            if (x - cx) ** 2 + (z - cz) ** 2 <= load_distance ** 2 and (x, z) not in self.chunks:
+              missing.add((x, z))
+      self.__missing_chunks = sorted(missing, key=self.__load_distance_sq, reverse=True)
+
+    # Nearest first, popping from the end of the list
+    while len(self.__missing_chunks) > 0 and self.jobs.generating_count < World.MAX_GENERATION_JOBS:
+      key = self.__missing_chunks.pop()
+      if key in self.chunks or self.jobs.is_generating(key):
+        continue
+
+      # Still waiting to be written, the copy in the region file would be stale
+      data = self.storage.get_pending_chunk(key) if self.storage != None else None
+      if data != None:
+        blocks, fluid = split_chunk_data(data)
+        self.add_chunk(key[0], key[1], blocks, calculate_light(blocks), fluid)
+      else:
+        self.jobs.generate(key, World.SEED, self.storage.save_dir if self.storage != None else None)
+
+  def get_spawn_chunks(self):
+    cx, cz = self.get_player_chunk()
+    return [(x, z) for x in range(cx - World.SPAWN_RADIUS, cx + World.SPAWN_RADIUS + 1) for z in range(cz - World.SPAWN_RADIUS, cz + World.SPAWN_RADIUS + 1)]
+
+  # Whether the chunks around the player are loaded, a WorldRenderer also waits for them to be meshed
+  def is_spawn_ready(self) -> bool:
+    if not self.__spawn_ready:
+      self.__spawn_ready = all(self.get_chunk(x, z) != None for x, z in self.get_spawn_chunks())
+    return self.__spawn_ready
+
+  def is_chunk_loaded_at(self, x: float, z: float) -> bool:
+    return self.get_chunk(math.floor(x) // 16, math.floor(z) // 16) != None
+
+  # Waits for every requested chunk to generate, for when the world is needed straight away
+  def wait_for_generation(self):
+    while len(self.__missing_chunks) > 0 or self.jobs.generating_count > 0:
+      self.__add_generated_chunks(self.jobs.poll_generated(wait=True))
+      self.update_loaded_chunks()
+    while self.light_engine.pending_count > 0:
+      self.light_engine.process(World.MAX_LIGHT_UPDATES_PER_TICK)
+
+  def add_chunk(self, x: int, z: int, blocks: bytes, light: bytes, fluid: bytes | None = None):
+    chunk = Chunk(self, x, z, blocks, light, fluid)
+    self.chunks[(x, z)] = chunk
+    self.light_engine.add_chunk(chunk)
+    if self.SIMULATED:
+      self.tick_scheduler.add_chunk(chunk)
+      self.fluids.add_chunk(chunk)
+    self.tile_version += 1
+    for listener in self.listeners:
+      listener.on_chunk_added(chunk)
+
+  def unload_chunk(self, key: tuple[int, int]):
+    chunk = self.chunks.pop(key, None)
+    if chunk is None:
+      return
+    self.save_chunk(chunk)
+    self.tile_version += 1
+    for listener in self.listeners:
+      listener.on_chunk_removed(chunk)
+
+  def __add_generated_chunks(self, generated):
+    # Generation gives the same blocks for the same seed every time, so freshly generated chunks
+    # aren't saved, only the ones changed since (see save_chunk). The rest are generated again on load.
+    for (x, z), (blocks, light, fluid) in generated:
+      self.add_chunk(x, z, blocks, light, fluid)
+
+  # Hands a snapshot of the chunk's blocks to the storage thread if they changed since the last save
+  def save_chunk(self, chunk: Chunk):
+    if self.storage == None or not chunk.unsaved:
+      return
+    chunk.sections.compact()
+    chunk.fluid.compact()
+    self.storage.save_chunk((chunk.x, chunk.z), join_chunk_data(chunk.sections.to_bytes(), None if chunk.fluid.is_fill() else chunk.fluid.to_bytes()))
+    chunk.mark_saved()
+
+  def save_modified_chunks(self):
+    for chunk in self.chunks.values():
+      self.save_chunk(chunk)
+
+  # Loads chunks around the player and adds the ones that finished generating. Meshing is up to
+  # whoever draws the world, see WorldRenderer.process_jobs.
+  def process_jobs(self):
+    self.update_loaded_chunks()
+    self.__add_generated_chunks(self.jobs.poll_generated())
+
+  def make_all_dirty(self):
+    for chunk in self.chunks.values():
+      chunk.make_dirty()
+
   def get_chunk(self, x: int, z: int):
-    if x < 0 or x >= self.x_chunks or z < 0 or z >= self.z_chunks:
-      return None
-    return self.chunks[x * self.z_chunks + z]
+    return self.chunks.get((x, z))
 
   def set_tile(self, x: int, y: int, z: int, tile_id: int):
-    cx = x // 16
-    cz = z // 16
-    if cx < 0 or cx >= self.x_chunks or cz < 0 or cz >= self.z_chunks or y < 0 or y >= CHUNK_HEIGHT:
+    cx = x >> 4
+    cz = z >> 4
+    chunk = self.chunks.get((cx, cz))
+    if chunk is None or y < 0 or y >= CHUNK_HEIGHT:
+      return
+    lx = x & 15
+    lz = z & 15
+    old_tile = chunk.get_tile(lx, y, lz)
+    if old_tile == tile_id:
       return
-    self.chunks[cx * self.z_chunks + cz].set_tile(x % 16, y, z % 16, tile_id)
-    if (x % 16) == 0:
-      chunknb = self.get_chunk(cx - 1, cz)
-      if chunknb != None:
-        chunknb.make_dirty()
-
-    if (x % 16) == 15:
-      chunknb = self.get_chunk(cx + 1, cz)
-      if chunknb != None:
-        chunknb.make_dirty()
-
-    if (z % 16) == 0:
-      chunknb = self.get_chunk(cx, cz - 1)
-      if chunknb != None:
-        chunknb.make_dirty()
-    
-    if (z % 16) == 15:
-      chunknb = self.get_chunk(cx, cz + 1)
-      if chunknb != None:
-        chunknb.make_dirty()
-
-  def is_lighted(self, x, y, z):
-    cx = x // 16
-    cz = z // 16
-    if cx < 0 or cx >= self.x_chunks or cz < 0 or cz >= self.z_chunks or y < 0 or y >= CHUNK_HEIGHT:
-      return True
-    return self.chunks[cx * self.z_chunks + cz].is_lighted(x % 16, y, z % 16)
+
+    chunk.set_tile(lx, y, lz, tile_id)
+    self.tile_version += 1
+    self.light_engine.on_tile_changed(x, y, z, old_tile, tile_id)
+    if self.SIMULATED:
+      self.__schedule_ticks_around(x, y, z, tile_id)
+      self.fluids.on_tile_changed(x, y, z)
+    if 0 < lx < 15 and 0 < lz < 15:
+      return
+
+    # A border tile is drawn against by the neighbouring chunk, which only needs rebuilding if it has
+    # a tile next to it. The light engine dirties the chunks whose lighting changed.
+    for ox, oz, nx, nz in ((-1, 0, 15, lz), (1, 0, 0, lz), (0, -1, lx, 15), (0, 1, lx, 0)):
+      if (ox == -1 and lx != 0) or (ox == 1 and lx != 15) or (oz == -1 and lz != 0) or (oz == 1 and lz != 15):
+        continue
+      neighbour = self.chunks.get((cx + ox, cz + oz))
+      if neighbour is None or neighbour.dirty:
+        continue
+      if neighbour.references_neighbour_tile(nx, y, nz):
+        neighbour.make_dirty()
+
+  # Water the FluidSimulator moved in or out of (x, y, z). Like set_tile, except the simulator
+  # follows up on the water itself and dirties the chunks next door once per step.
+  def set_fluid_tile(self, x: int, y: int, z: int, tile_id: int, level: int):
+    chunk = self.chunks.get((x >> 4, z >> 4))
+    if chunk is None or y < 0 or y >= CHUNK_HEIGHT:
+      return
+    lx = x & 15
+    lz = z & 15
+    old_tile = chunk.get_tile(lx, y, lz)
+    if old_tile != tile_id:
+      chunk.set_tile(lx, y, lz, tile_id)
+      self.light_engine.on_tile_changed(x, y, z, old_tile, tile_id)
+      self.__schedule_ticks_around(x, y, z, tile_id)
+    chunk.set_fluid_level(lx, y, lz, level)
+    self.tile_version += 1
+
+  # The changed tile and its neighbours get a tick if they are tickable, so blocks like sand only
+  # do something when the tiles around them change
+  def __schedule_ticks_around(self, x: int, y: int, z: int, tile_id: int):
+    if TICKABLE_IDS[tile_id]:
+      self.tick_scheduler.schedule(x, y, z, BLOCK_TYPES[tile_id].tick_delay)
+    chunks = self.chunks
+    for nx, ny, nz in ((x, y - 1, z), (x, y + 1, z), (x, y, z - 1), (x, y, z + 1), (x - 1, y, z), (x + 1, y, z)):
+      chunk = chunks.get((nx >> 4, nz >> 4))
+      if chunk is None or len(chunk.tickable_blocks) == 0 or ny < 0 or ny >= CHUNK_HEIGHT:
+        continue
+      neighbour_tile = chunk.sections.get(nx & 15, ny, nz & 15)
+      if TICKABLE_IDS[neighbour_tile]:
+        self.tick_scheduler.schedule(nx, ny, nz, BLOCK_TYPES[neighbour_tile].tick_delay)
+
+  # The chunk's blocks and light plus a one block border from the neighbouring chunks, as used by
+  # the mesher. Anything outside the world is air in full skylight.
+  def get_neighbourhood(self, cx: int, cz: int):
+    blocks = np.zeros((CHUNK_HEIGHT + 2, 18, 18), dtype=np.uint8)
+    light = np.full((CHUNK_HEIGHT + 2, 18, 18), FULL_SKY_LIGHT, dtype=np.uint8)
+
+    for ox, oz in ((0, 0), (-1, 0), (1, 0), (0, -1), (0, 1)):
+      chunk = self.get_chunk(cx + ox, cz + oz)
+      if chunk == None:
+        continue
+      dst_x, src_x = NEIGHBOUR_SLICES[ox]
+      dst_z, src_z = NEIGHBOUR_SLICES[oz]
+      for i in range(SECTION_COUNT):
+        section = chunk.sections.get_section_array(i)
+        if section is not None:
+          blocks[i * 16 + 1:i * 16 + 17, dst_z, dst_x] = section[:, src_z, src_x]
+        section_light = chunk.light.get_section_array(i)
+        if section_light is not None:
+          light[i * 16 + 1:i * 16 + 17, dst_z, dst_x] = section_light[:, src_z, src_x]
+
+    return blocks, light
 
   def get_tile(self, x: int, y: int, z: int):
-    cx = x // 16
-    cz = z // 16
-    if cx < 0 or cx >= self.x_chunks or cz < 0 or cz >= self.z_chunks or y < 0 or y >= CHUNK_HEIGHT:
+    chunk = self.chunks.get((x >> 4, z >> 4))
+    if chunk is None or y < 0 or y >= CHUNK_HEIGHT:
       return 0
-    return self.chunks[cx * self.z_chunks + cz].get_tile(x % 16, y, z % 16)
+    return chunk.sections.get(x & 15, y, z & 15)
+
+  # Tiles at arrays of coordinates, looked up a section at a time
+  def get_tiles(self, xs: np.ndarray, ys: np.ndarray, zs: np.ndarray) -> np.ndarray:
+    tiles = np.zeros(len(xs), dtype=np.uint8)
+    inside = np.flatnonzero((ys >= 0) & (ys < CHUNK_HEIGHT))
+    if len(inside) == 0:
+      return tiles
+    xs = xs[inside]
+    ys = ys[inside]
+    zs = zs[inside]
+    # One integer per section, chunk coordinates are well within 2^24 either way
+    keys, groups = np.unique((((xs >> 4) + (1 << 23)) << 28) | (((zs >> 4) + (1 << 23)) << 4) | (ys >> 4), return_inverse=True)
+    order = np.argsort(groups, kind="stable")
+    bounds = np.searchsorted(groups[order], np.arange(len(keys) + 1))
+    for i, key in enumerate(keys.tolist()):
+      sy = key & 15
+      chunk = self.chunks.get(((key >> 28) - (1 << 23), ((key >> 4) & ((1 << 24) - 1)) - (1 << 23)))
+      if chunk is None:
+        continue
+      section = chunk.sections.get_section_array(sy)
+      if section is None:
+        continue
+      group = order[bounds[i]:bounds[i + 1]]
+      tiles[inside[group]] = section[ys[group] & 15, zs[group] & 15, xs[group] & 15]
+    return tiles
+
+  # For looking up many tiles that are close to each other, see TileCursor
+  def cursor(self) -> TileCursor:
+    return TileCursor(self)
 
   def tick(self):
-    chunk_to_update = random.randint(-15, len(self.chunks) - 1)
-    if chunk_to_update >= 0:
-      self.chunks[chunk_to_update].tick()
-
-  def render(self):
-    glEnable(GL_FOG)
-    glFogi(GL_FOG_MODE, GL_EXP)
-    glFogfv(GL_FOG_COLOR, [0.239, 0.686, 0.807, 1])
-    
-    camera_pos = self.game.get_camera_pos()
-    if self.get_tile(int(camera_pos[0]), int(camera_pos[1]), int(camera_pos[2])) == 7:
-      glFogf(GL_FOG_DENSITY, 0.5)
-    else:
-      glFogf(GL_FOG_DENSITY, 0.07 if self.game.settings.fog_distance == 1 else 0.04 if self.game.settings.fog_distance == 2 else 0.007)
-    RenderLayers['SOLID'].begin()
-
-    if self.border_clist_dirty:
-      glNewList(self.border_clist, GL_COMPILE)
-      
-      vertex_drawer = VertexDrawer()
-      
-      vertex_drawer.begin(GL_QUADS)
-      vertex_drawer.vertex_uv_color(0, 70, 64, 0, 1, 1.0, 0.0, 0.0, 1.0)
-      vertex_drawer.vertex_uv_color(0, 70, 0, 0, 0, 0.0, 1.0, 0.0, 1.0)
-      vertex_drawer.vertex_uv_color(64, 70, 0, 1, 0, 0.0, 0.0, 1.0, 1.0)
-      vertex_drawer.vertex_uv_color(64, 70, 64, 1, 1, 1.0, 0.0, 1.0, 1.0)
-      
-      vertex_drawer.flush()
-      
-      glEndList()
-
-      self.border_clist_dirty = False
-
-    for chunk in self.chunks:
-      chunk.render(layer=RenderLayers['SOLID'], texture_manager=self.game.texture_manager)
-    
-    if self.game.show_debug:
-      for chunk in self.chunks:
-        chunk.render_debug()
-
-    RenderLayers['SOLID'].end()
-
-    if self.game.show_debug:
-      self.game.texture_manager.get("prof.png").bind()  
-      glCallList(self.border_clist)
-      glPushMatrix()
-      glDisable(GL_CULL_FACE)
-      glTranslatef(16, 69, 16)
-      glRotatef(90, 1, 0, 0)
-      glRotatef(180, 0, 1, 0)
-      self.game.font.draw_text("BRUH", 0, 0, 0xFFFFFF, 0, shadow=False)
-      glPopMatrix()
-      glEnable(GL_CULL_FACE)
-      self.game.texture_manager.get("grass.png").bind()
-    
-    RenderLayers['TRANSLUCENT'].begin()
-    # glDisable(GL_CULL_FACE)
-    for chunk in self.chunks:
-      chunk.render(layer=RenderLayers['TRANSLUCENT'], texture_manager=self.game.texture_manager)
-    RenderLayers['TRANSLUCENT'].end()
-    # glEnable(GL_CULL_FACE)
-    glDisable(GL_FOG)
+    self.__ticks += 1
+    if self.__ticks % World.AUTOSAVE_INTERVAL == 0:
+      self.save_modified_chunks()
+    with PROFILER.scope("light"):
+      self.light_engine.process(World.MAX_LIGHT_UPDATES_PER_TICK)
+    if self.SIMULATED:
+      with PROFILER.scope("scheduled ticks"):
+        self.tick_scheduler.process(World.MAX_SCHEDULED_TICKS_PER_TICK)
+      with PROFILER.scope("fluids"):
+        self.fluids.tick()
+      with PROFILER.scope("entities"):
+        self.entities.tick()
 
   def dispose(self):
-    glDeleteLists(self.border_clist, 1)
-    for chunk in self.chunks:
-      chunk.dispose()
-
-  def get_cubes(self, aabb):
-    boxes: list[AABB] = []
-
-    x0 = utils.clamp(int(aabb.x0), 0, self.x_chunks * 16)
-    y0 = utils.clamp(int(aabb.y0), 0, utils.MAX_SIGNED_INT32)
-    z0 = utils.clamp(int(aabb.z0), 0, self.z_chunks * 16)
-    x1 = utils.clamp(int(aabb.x1 + 1), 0, self.x_chunks * 16)
-    y1 = utils.clamp(int(aabb.y1 + 1), 0, CHUNK_HEIGHT)
-    z1 = utils.clamp(int(aabb.z1 + 1), 0, self.z_chunks * 16)
-
-    for x in range(x0, x1):
-      for y in range(y0, y1):
-        for z in range(z0, z1):
-          tile_id = self.get_tile(x, y, z)
-          if tile_id != 0 and tile_id != 7:
-            boxes.append(AABB(x, y, z, x + 1, y + 1, z + 1))
-
-    return boxes
\ No newline at end of file
+    self.jobs.shutdown()
+    self.light_engine.clear()
+    self.tick_scheduler.clear()
+    self.fluids.clear()
+    if self.storage != None:
+      self.save_modified_chunks()
+      self.storage.close()
+    for chunk in self.chunks.values():
+      for listener in self.listeners:
+        listener.on_chunk_removed(chunk)
+    self.chunks.clear()
+    self.listeners.clear()
+
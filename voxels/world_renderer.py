@@ -0,0 +1,360 @@
+import math
+import time
+from OpenGL.GL import *
+from constants import *
+from render_layers import RenderLayers
+from render_utils import VertexDrawer, VertexBuffer
+from sections import SECTION_COUNT
+from culling import Frustum, get_fog_end, get_box_distances
+from visibility import find_reachable_sections, ALL_CONNECTED
+from profiler import PROFILER
+import numpy as np
+
+# GL side of a chunk: its vertex buffers, the draw ranges of every section and how its sections
+# connect, as of the last mesh uploaded for it
+class RenderChunk:
+  def __init__(self, x: int, z: int):
+    self.x = x
+    self.z = z
+    self.__buffers = [VertexBuffer(), VertexBuffer()]
+    self.__batches = [[], []]
+    self.face_counts = [0, 0]
+    self.quad_counts = [0, 0]
+    # Per section, which faces can be seen from which. Unknown until meshed, so everything is open.
+    self.connectivity = [ALL_CONNECTED] * SECTION_COUNT
+
+  def upload_meshes(self, meshes):
+    for layer in (RenderLayers['SOLID'], RenderLayers['TRANSLUCENT']):
+      mesh = meshes[layer.value]
+      self.__buffers[layer.value].upload(mesh.vertices)
+      self.__batches[layer.value] = mesh.batches
+      self.face_counts[layer.value] = mesh.face_count
+      self.quad_counts[layer.value] = mesh.quad_count
+
+    self.connectivity = meshes[2]
+
+  def render_debug(self, vertex_drawer = VertexDrawer()):
+    clx0 = self.x * 16
+    clz0 = self.z * 16
+    clx1 = clx0 + 16
+    clz1 = clz0 + 16
+
+    vertex_drawer.begin(GL_LINES)
+    vertex_drawer.color(1.0, 0.0, 0.0, 1.0)
+
+    vertex_drawer.vertex(clx0, 0, clz0)
+    vertex_drawer.vertex(clx0, CHUNK_HEIGHT, clz0)
+
+    vertex_drawer.vertex(clx1, 0, clz0)
+    vertex_drawer.vertex(clx1, CHUNK_HEIGHT, clz0)
+
+    vertex_drawer.vertex(clx0, 0, clz1)
+    vertex_drawer.vertex(clx0, CHUNK_HEIGHT, clz1)
+
+    vertex_drawer.vertex(clx1, 0, clz1)
+    vertex_drawer.vertex(clx1, CHUNK_HEIGHT, clz1)
+
+    for y in range(0, int(CHUNK_HEIGHT / 8)):
+      vertex_drawer.color(1.0, 1.0, 0.0, 1.0)
+      vertex_drawer.vertex(clx0, y * 8, clz0)
+      vertex_drawer.vertex(clx1, y * 8, clz0)
+      vertex_drawer.vertex(clx0, y * 8, clz0)
+      vertex_drawer.vertex(clx0, y * 8, clz1)
+      vertex_drawer.vertex(clx0, y * 8, clz0)
+      vertex_drawer.vertex(clx0, y * 8, clz1)
+
+    vertex_drawer.flush()
+
+  # Draws the given sections, sorted bottom to top. Batches are grouped by texture so each tile texture
+  # is bound once, and batches of a texture in neighbouring sections are next to each other in the
+  # buffer so they're drawn together. Returns the number of draw calls.
+  def render(self, layer, texture_manager, sections: list[int]) -> int:
+    buffer = self.__buffers[layer.value]
+    batches = self.__batches[layer.value]
+    ranges: dict[int, list[list[int]]] = {}
+    for section in sections:
+      for txr_idx, first, count in batches[section]:
+        txr_ranges = ranges.setdefault(txr_idx, [])
+        if len(txr_ranges) > 0 and txr_ranges[-1][0] + txr_ranges[-1][1] == first:
+          txr_ranges[-1][1] += count
+        else:
+          txr_ranges.append([first, count])
+
+    tile_texture_bound = False
+    draw_calls = 0
+    for txr_idx, txr_ranges in ranges.items():
+      if txr_idx != -1:
+        texture_manager.get(f"grass.png#{txr_idx}").bind()
+        tile_texture_bound = True
+      for first, count in txr_ranges:
+        buffer.draw(GL_QUADS, first, count)
+        draw_calls += 1
+
+    if tile_texture_bound:
+      texture_manager.get("grass.png").bind()
+    return draw_calls
+
+  def dispose(self):
+    for buffer in self.__buffers:
+      buffer.dispose()
+
+# Draws a World. The world knows nothing about rendering, the renderer listens to it for chunks being
+# added, changed and removed and keeps meshes for them, built in the world's job pool.
+class WorldRenderer:
+  MAX_CHUNK_UPLOADS_PER_FRAME = 4
+  MAX_MESH_JOBS_PER_FRAME = 8
+  # Seconds between visibility searches caused by chunk changes, moving to another section searches straight away
+  REACHABLE_UPDATE_INTERVAL = 0.25
+
+  def __init__(self, world, game):
+    self.world = world
+    self.game = game
+    self.__render_chunks: dict[tuple[int, int], RenderChunk] = {}
+    # Chunks changed since they were last handed to a mesh job
+    self.__dirty_keys: set[tuple[int, int]] = set()
+    self.__pending_uploads = []
+    self.__spawn_ready = False
+    self.border_buffer = VertexBuffer()
+    self.border_buffer_dirty = True
+    self.visible_chunks: list[RenderChunk] = []
+    self.culled_chunk_count = 0
+    self.visible_section_count = 0
+    # Draw calls of the chunks in the last frame
+    self.draw_calls = 0
+    # None until the first frame is culled, everything gets meshed until then
+    self.__visible_keys: set[tuple[int, int]] | None = None
+    self.__visible_sections: dict[tuple[int, int], list[int]] = {}
+    # Sections reachable from the camera's section, searched again when the camera enters another
+    # section or chunks are loaded, unloaded or meshed
+    self.__reachable_sections = np.zeros((0, 3), dtype=np.int32)
+    self.__reachable_start: tuple[int, int, int] | None = None
+    self.__reachable_distance = -1
+    self.__reachable_dirty = True
+    self.__reachable_time = 0.0
+
+    for chunk in world.chunks.values():
+      self.on_chunk_added(chunk)
+    world.listeners.append(self)
+
+  def on_chunk_added(self, chunk):
+    self.__dirty_keys.add((chunk.x, chunk.z))
+    self.__reachable_dirty = True
+
+  def on_chunk_dirty(self, chunk):
+    self.__dirty_keys.add((chunk.x, chunk.z))
+
+  def on_chunk_removed(self, chunk):
+    key = (chunk.x, chunk.z)
+    self.__dirty_keys.discard(key)
+    render_chunk = self.__render_chunks.pop(key, None)
+    if render_chunk != None:
+      render_chunk.dispose()
+    self.__reachable_dirty = True
+
+  def is_meshed(self, x: int, z: int) -> bool:
+    return (x, z) in self.__render_chunks
+
+  def is_spawn_ready(self) -> bool:
+    if not self.__spawn_ready:
+      self.__spawn_ready = self.world.is_spawn_ready() and all(self.is_meshed(x, z) for x, z in self.world.get_spawn_chunks())
+    return self.__spawn_ready
+
+  # Chunks generated and chunks meshed, out of the chunks within render distance
+  def get_loading_progress(self):
+    generated = 0
+    meshed = 0
+    total = 0
+    cx, cz = self.world.center
+    render_distance = self.world.render_distance
+    for x in range(cx - render_distance, cx + render_distance + 1):
+      for z in range(cz - render_distance, cz + render_distance + 1):
+        if (x - cx) ** 2 + (z - cz) ** 2 > render_distance ** 2:
+          continue
+        total += 1
+        if self.world.get_chunk(x, z) != None:
+          generated += 1
+          meshed += 1 if self.is_meshed(x, z) else 0
+    return generated, meshed, total
+
+  # Quads drawn and block faces they were merged from, over every chunk and layer
+  def get_quad_counts(self):
+    quads = 0
+    faces = 0
+    for render_chunk in self.__render_chunks.values():
+      quads += sum(render_chunk.quad_counts)
+      faces += sum(render_chunk.face_counts)
+    return quads, faces
+
+  def get_fog_density(self) -> float:
+    camera_pos = self.game.get_camera_pos()
+    if self.world.get_tile(int(camera_pos[0]), int(camera_pos[1]), int(camera_pos[2])) == 7:
+      return 0.5
+    return 0.07 if self.game.settings.fog_distance == 1 else 0.04 if self.game.settings.fog_distance == 2 else 0.007
+
+  def __get_render_connectivity(self, cx: int, cz: int) -> list[int] | None:
+    if self.world.get_chunk(cx, cz) is None:
+      return None
+    center = self.world.center
+    if (cx - center[0]) ** 2 + (cz - center[1]) ** 2 > self.world.render_distance ** 2:
+      return None
+    render_chunk = self.__render_chunks.get((cx, cz))
+    return render_chunk.connectivity if render_chunk != None else [ALL_CONNECTED] * SECTION_COUNT
+
+  def update_reachable_sections(self):
+    camera_pos = self.game.get_camera_pos()
+    start = (math.floor(camera_pos[0]) // 16, math.floor(camera_pos[1]) // 16, math.floor(camera_pos[2]) // 16)
+    now = time.perf_counter()
+    if self.world.render_distance != self.__reachable_distance:
+      self.__reachable_distance = self.world.render_distance
+      self.__reachable_dirty = True
+    if start == self.__reachable_start and (not self.__reachable_dirty or now - self.__reachable_time < WorldRenderer.REACHABLE_UPDATE_INTERVAL):
+      return
+
+    self.__reachable_start = start
+    self.__reachable_dirty = False
+    self.__reachable_time = now
+    self.__reachable_sections = np.array(find_reachable_sections(start, self.__get_render_connectivity), dtype=np.int32).reshape(-1, 3)
+
+  # Keeps the sections reachable from the camera that are inside the view frustum of the current GL
+  # matrices and closer than the fog hides, and the chunks they belong to
+  def update_visible_chunks(self):
+    self.update_reachable_sections()
+    sections = self.__reachable_sections
+    mins = sections * 16.0
+    maxs = mins + 16
+
+    frustum = Frustum(glGetFloatv(GL_PROJECTION_MATRIX), glGetFloatv(GL_MODELVIEW_MATRIX))
+    visible = frustum.get_visible_boxes(mins, maxs)
+    visible &= get_box_distances(self.game.get_camera_pos(), mins, maxs) <= get_fog_end(self.get_fog_density())
+
+    self.__visible_sections = {}
+    for cx, sy, cz in sections[visible].tolist():
+      self.__visible_sections.setdefault((cx, cz), []).append(sy)
+    for section_list in self.__visible_sections.values():
+      section_list.sort()
+
+    self.visible_chunks = [self.__render_chunks[key] for key in self.__visible_sections if key in self.__render_chunks]
+    self.visible_section_count = int(visible.sum())
+    # Only chunks with a mesh could have been drawn, the ones loaded around the edge are never meshed
+    self.culled_chunk_count = len(self.__render_chunks) - len(self.visible_chunks)
+    self.__visible_keys = set(self.__visible_sections.keys())
+
+  # Culled chunks aren't rebuilt, except the ones around the player which can come into view with a quick turn
+  def __should_mesh(self, key: tuple[int, int]) -> bool:
+    if self.__visible_keys == None or key in self.__visible_keys:
+      return True
+    cx, cz = self.world.get_player_chunk()
+    return abs(key[0] - cx) <= self.world.SPAWN_RADIUS and abs(key[1] - cz) <= self.world.SPAWN_RADIUS
+
+  def __neighbours_loaded(self, key: tuple[int, int]) -> bool:
+    for ox, oz in ((-1, 0), (1, 0), (0, -1), (0, 1)):
+      if self.world.get_chunk(key[0] + ox, key[1] + oz) == None:
+        return False
+    return True
+
+  # Lets the world load and generate chunks, queues mesh jobs for dirty chunks and uploads a few
+  # finished meshes. Only the uploads touch GL, everything else happens in the worker pool.
+  def process_jobs(self):
+    world = self.world
+    world.process_jobs()
+    jobs = world.jobs
+
+    greedy = self.game.settings.greedy_meshing
+    mesh_jobs = 0
+    for key in sorted(self.__dirty_keys, key=world.distance_sq):
+      if mesh_jobs >= WorldRenderer.MAX_MESH_JOBS_PER_FRAME:
+        break
+      if jobs.is_meshing(key) or not self.__should_mesh(key) or not self.__neighbours_loaded(key):
+        continue
+      mesh_jobs += 1
+      chunk = world.get_chunk(key[0], key[1])
+      blocks, light = world.get_neighbourhood(key[0], key[1])
+      self.__dirty_keys.discard(key)
+      chunk.clear_dirty()
+      jobs.mesh(key, blocks, light, chunk.get_fluid_array(), greedy)
+    PROFILER.count("mesh jobs", mesh_jobs)
+
+    self.__pending_uploads.extend(jobs.poll_meshed())
+
+    uploads = self.__pending_uploads[:WorldRenderer.MAX_CHUNK_UPLOADS_PER_FRAME]
+    del self.__pending_uploads[:WorldRenderer.MAX_CHUNK_UPLOADS_PER_FRAME]
+    for key, meshes in uploads:
+      if world.get_chunk(key[0], key[1]) == None:
+        continue
+      with PROFILER.scope("chunk upload"):
+        render_chunk = self.__render_chunks.get(key)
+        if render_chunk == None:
+          render_chunk = RenderChunk(key[0], key[1])
+          self.__render_chunks[key] = render_chunk
+        render_chunk.upload_meshes(meshes)
+      PROFILER.count("chunk updates")
+      self.__reachable_dirty = True
+
+  def render(self):
+    # Meshing goes by the previous frame's culling, so chunks unloaded by process_jobs are never drawn
+    with PROFILER.scope("chunk jobs"):
+      self.process_jobs()
+    with PROFILER.scope("culling"):
+      self.update_visible_chunks()
+
+    glEnable(GL_FOG)
+    glFogi(GL_FOG_MODE, GL_EXP)
+    glFogfv(GL_FOG_COLOR, [0.239, 0.686, 0.807, 1])
+    glFogf(GL_FOG_DENSITY, self.get_fog_density())
+    RenderLayers['SOLID'].begin()
+
+    if self.border_buffer_dirty:
+      vertex_drawer = VertexDrawer()
+
+      vertex_drawer.begin(GL_QUADS)
+      vertex_drawer.vertex_uv_color(0, 70, 64, 0, 1, 1.0, 0.0, 0.0, 1.0)
+      vertex_drawer.vertex_uv_color(0, 70, 0, 0, 0, 0.0, 1.0, 0.0, 1.0)
+      vertex_drawer.vertex_uv_color(64, 70, 0, 1, 0, 0.0, 0.0, 1.0, 1.0)
+      vertex_drawer.vertex_uv_color(64, 70, 64, 1, 1, 1.0, 0.0, 1.0, 1.0)
+
+      self.border_buffer.upload(vertex_drawer.build())
+      self.border_buffer_dirty = False
+
+    draw_calls = 0
+    for render_chunk in self.visible_chunks:
+      draw_calls += render_chunk.render(layer=RenderLayers['SOLID'], texture_manager=self.game.texture_manager, sections=self.__visible_sections[(render_chunk.x, render_chunk.z)])
+
+    if self.game.show_debug:
+      for render_chunk in self.visible_chunks:
+        render_chunk.render_debug()
+
+    RenderLayers['SOLID'].end()
+
+    if self.game.show_debug:
+      self.game.texture_manager.get("prof.png").bind()
+      self.border_buffer.draw(GL_QUADS)
+      glPushMatrix()
+      glDisable(GL_CULL_FACE)
+      glTranslatef(16, 69, 16)
+      glRotatef(90, 1, 0, 0)
+      glRotatef(180, 0, 1, 0)
+      self.game.font.draw_text("BRUH", 0, 0, 0xFFFFFF, 0, shadow=False)
+      self.game.sprite_batch.flush()
+      glPopMatrix()
+      glEnable(GL_CULL_FACE)
+      self.game.texture_manager.get("grass.png").bind()
+
+    RenderLayers['TRANSLUCENT'].begin()
+    # glDisable(GL_CULL_FACE)
+    for render_chunk in self.visible_chunks:
+      draw_calls += render_chunk.render(layer=RenderLayers['TRANSLUCENT'], texture_manager=self.game.texture_manager, sections=self.__visible_sections[(render_chunk.x, render_chunk.z)])
+    RenderLayers['TRANSLUCENT'].end()
+    self.draw_calls = draw_calls
+    # glEnable(GL_CULL_FACE)
+    glDisable(GL_FOG)
+
+  # Frees the GL buffers and stops listening, the world itself is disposed separately
+  def dispose(self):
+    if self in self.world.listeners:
+      self.world.listeners.remove(self)
+    self.border_buffer.dispose()
+    for render_chunk in self.__render_chunks.values():
+      render_chunk.dispose()
+    self.__render_chunks.clear()
+    self.__dirty_keys.clear()
+    self.visible_chunks.clear()